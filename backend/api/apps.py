@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the receivers)
+        from http_client import configure_http_client
+        configure_http_client(getattr(settings, 'HTTP_CLIENT', {}))
@@ -0,0 +1,52 @@
+import datetime
+from django.core.management.base import BaseCommand
+from geocoding import GeocodeCache
+from weather_archive import MonthlyArchiveCache, fetch_monthly_archive
+from api.models import Region
+
+
+class Command(BaseCommand):
+    help = 'Fill the on-disk historical weather archive (used by WeatherService) for every region'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years', type=int, default=5, help='How many years back to cover (default 5)')
+
+    def handle(self, *args, **options):
+        archive = MonthlyArchiveCache()
+        geocode_cache = GeocodeCache()
+        
+        # Every complete month of the last N years
+        today = datetime.date.today()
+        months = []
+        year, month = today.year - options['years'], today.month
+        while (year, month) <= (today.year, today.month):
+            if MonthlyArchiveCache.is_complete(year, month, today):
+                months.append((year, month))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        
+        stored = 0
+        missing = []
+        for region in Region.objects.all():
+            if region.latitude is not None and region.longitude is not None:
+                coordinates = (region.latitude, region.longitude)
+            else:
+                coordinates = geocode_cache.get(region.name)
+            if coordinates is None:
+                missing.append(region.name)
+                continue
+            
+            # One archive call per region, from its oldest month not cached yet
+            cached = archive.cached_months(*coordinates)
+            todo = [key for key in months if key not in cached]
+            if not todo:
+                continue
+            fetched = fetch_monthly_archive(*coordinates, todo[0], todo[-1], timeout=60)
+            if not fetched:
+                missing.append(region.name)
+                continue
+            archive.put_many(*coordinates, fetched)
+            stored += len(fetched)
+        
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} region-months in {archive.path}'))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'No archive data for: {", ".join(missing)}'))
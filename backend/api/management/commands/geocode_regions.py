@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from geocoding import GeocodeCache, geocode
+from api.models import Region
+
+
+class Command(BaseCommand):
+    help = 'Fill in the latitude/longitude of regions that have none (weather is then fetched by coordinates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Geocode every region again, ignoring stored coordinates and the geocode cache')
+
+    def handle(self, *args, **options):
+        regions = Region.objects.all()
+        if not options['force']:
+            regions = regions.filter(latitude__isnull=True) | regions.filter(longitude__isnull=True)
+        
+        # The same cache file the FastAPI WeatherService reads
+        geocode_cache = GeocodeCache()
+        located = []
+        missing = []
+        for region in regions:
+            coordinates = geocode(region.name) if options['force'] else geocode_cache.get(region.name)
+            if coordinates is None:
+                missing.append(region.name)
+                continue
+            region.latitude, region.longitude = coordinates
+            located.append(region)
+        
+        Region.objects.bulk_update(located, ['latitude', 'longitude'])
+        # Share every region's coordinates (including ones set by hand) with WeatherService
+        geocode_cache.update({
+            name: (latitude, longitude)
+            for name, latitude, longitude in Region.objects.filter(latitude__isnull=False, longitude__isnull=False)
+            .values_list('name', 'latitude', 'longitude')
+        })
+        
+        self.stdout.write(self.style.SUCCESS(f'Geocoded {len(located)} regions'))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'No coordinates found for: {", ".join(missing)}'))
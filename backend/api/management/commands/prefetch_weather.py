@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from api.services.weather_prefetch import prefetch_config, prefetch_region_weather
+
+
+class Command(BaseCommand):
+    help = 'Refresh current weather and forecasts for every region (run from cron, or with --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, refreshing every WEATHER_PREFETCH INTERVAL_SECONDS')
+        parser.add_argument('--interval', type=int, help='Seconds between refreshes with --loop')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or prefetch_config()['INTERVAL_SECONDS']
+        while True:
+            started = time.monotonic()
+            written, failed = prefetch_region_weather()
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {written} weather rows in {time.monotonic() - started:.1f}s'
+            ))
+            if failed:
+                self.stdout.write(self.style.WARNING(f'No weather for: {", ".join(failed)}'))
+            if not options['loop']:
+                return
+            time.sleep(max(0, interval - (time.monotonic() - started)))
@@ -96,13 +96,16 @@ class Command(BaseCommand):
             )
             
         # Also create a summary record for the "season" which the engine uses
-        WeatherData.objects.create(
+        # (it takes over today's row: one row per location and day)
+        WeatherData.objects.update_or_create(
             location="Mitidja",
             date=date.today(),
-            rainfall_mm=500 + random.uniform(-100, 100), # Seasonal total
-            temperature_avg=18,
-            humidity_avg=65,
-            sunshine_hours=8
+            defaults={
+                'rainfall_mm': 500 + random.uniform(-100, 100), # Seasonal total
+                'temperature_avg': 18,
+                'humidity_avg': 65,
+                'sunshine_hours': 8
+            }
         )
 
         self.stdout.write(self.style.SUCCESS(f'Successfully seeded {Crop.objects.count()} crops and market data.'))
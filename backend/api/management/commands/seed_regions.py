@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from api.models import Region
+from api.services.engine_config import classify_region
 
 # Algerian regions (Wilayas) with typical soil types
 ALGERIAN_REGIONS = [
@@ -64,11 +65,16 @@ class Command(BaseCommand):
                 name=region_data['name'],
                 defaults={
                     'name_ar': region_data['name_ar'],
-                    'soil_type': region_data['soil_type']
+                    'soil_type': region_data['soil_type'],
+                    'climate_class': classify_region(region_data['name'])
                 }
             )
             if created:
                 created_count += 1
+            elif not region.climate_class:
+                # Regions seeded before climate classes existed
+                region.climate_class = classify_region(region.name)
+                region.save(update_fields=['climate_class'])
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully created {created_count} regions. Total regions: {Region.objects.count()}')
@@ -1,6 +1,7 @@
 import pandas as pd
 from django.core.management.base import BaseCommand
 from api.models import Region, Crop
+from api.services.engine_config import classify_region
 import os
 
 class Command(BaseCommand):
@@ -19,7 +20,8 @@ class Command(BaseCommand):
             for _, row in df_regions.iterrows():
                 Region.objects.create(
                     name=row['region'],
-                    soil_type=row['soil_type']
+                    soil_type=row['soil_type'],
+                    climate_class=classify_region(row['region'])
                 )
             
             self.stdout.write(self.style.SUCCESS(f'Regions: {Region.objects.count()} total (from CSV)'))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:58
+
+from django.db import migrations, models
+
+
+# Frozen copy of engine_config's wilaya lists as of this migration
+DESERT_REGIONS = ('Biskra', 'Adrar', 'Tamanrasset', 'Illizi', 'Béchar', 'Tindouf', 'El Oued', 'Ouargla', 'Ghardaïa', 'Laghouat')
+SEMI_DESERT_REGIONS = ('Djelfa', 'M\'Sila', 'El Bayadh', 'Naâma', 'Aïn Salah')
+
+
+def classify_existing_regions(apps, schema_editor):
+    Region = apps.get_model('api', 'Region')
+    for region in Region.objects.all():
+        name = region.name.lower()
+        if any(desert.lower() in name for desert in DESERT_REGIONS):
+            region.climate_class = 'desert'
+        elif any(semi.lower() in name for semi in SEMI_DESERT_REGIONS):
+            region.climate_class = 'semi_desert'
+        else:
+            region.climate_class = 'tell'
+        region.save(update_fields=['climate_class'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_farm_intended_crop'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='region',
+            name='climate_class',
+            field=models.CharField(blank=True, choices=[('desert', 'Desert'), ('semi_desert', 'Semi-desert'), ('tell', 'Tell')], db_index=True, max_length=20),
+        ),
+        migrations.RunPython(classify_existing_regions, migrations.RunPython.noop),
+    ]
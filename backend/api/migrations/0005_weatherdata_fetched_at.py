@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_region_climate_class'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherdata',
+            name='fetched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='weatherdata',
+            index=models.Index(fields=['location', 'date'], name='api_weather_locatio_869fca_idx'),
+        ),
+    ]
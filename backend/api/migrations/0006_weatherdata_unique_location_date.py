@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:07
+
+from django.db import migrations, models
+
+
+def drop_duplicate_weather_rows(apps, schema_editor):
+    # Keep the newest row of each (location, date)
+    WeatherData = apps.get_model('api', 'WeatherData')
+    seen = set()
+    duplicates = []
+    for row_id, location, date in WeatherData.objects.order_by('-id').values_list('id', 'location', 'date'):
+        if (location, date) in seen:
+            duplicates.append(row_id)
+        else:
+            seen.add((location, date))
+    WeatherData.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_weatherdata_fetched_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='weatherdata',
+            name='api_weather_locatio_869fca_idx',
+        ),
+        migrations.RunPython(drop_duplicate_weather_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='weatherdata',
+            constraint=models.UniqueConstraint(fields=('location', 'date'), name='unique_weather_location_date'),
+        ),
+    ]
@@ -3,9 +3,17 @@ from django.contrib.auth.models import User
 
 class Region(models.Model):
     """Algerian regions (Wilayas) with their typical soil types"""
+    CLIMATE_CLASSES = [
+        ('desert', 'Desert'),
+        ('semi_desert', 'Semi-desert'),
+        ('tell', 'Tell'),  # Northern coastal and inland plains
+    ]
+    
     name = models.CharField(max_length=100, unique=True)
     name_ar = models.CharField(max_length=100, blank=True)  # Arabic name
     soil_type = models.CharField(max_length=50)  # Typical soil type for this region
+    # Set by seed_regions/update_from_csv (engine_config.classify_region); drives the climate constraints in scoring
+    climate_class = models.CharField(max_length=20, choices=CLIMATE_CLASSES, blank=True, db_index=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     
@@ -57,6 +65,12 @@ class WeatherData(models.Model):
     temperature_avg = models.FloatField()
     humidity_avg = models.FloatField()
     sunshine_hours = models.FloatField()
+    # When the weather API returned these values (None for stored/default rows); see services/weather_cache.py
+    fetched_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        # One row per location and day, so refreshes can upsert (see services/weather_prefetch.py)
+        constraints = [models.UniqueConstraint(fields=['location', 'date'], name='unique_weather_location_date')]
 
 class MarketData(models.Model):
     crop = models.ForeignKey(Crop, on_delete=models.CASCADE)
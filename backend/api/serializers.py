@@ -93,4 +93,5 @@ class RecommendationSerializer(serializers.Serializer):
     final_score = serializers.FloatField()
     confidence = serializers.CharField(required=False)
     advice = serializers.ListField(child=AdviceItemSerializer(), required=False)
+    advice_source = serializers.CharField(required=False)  # 'ai' or 'rule_based'
     details = serializers.DictField()
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+
+# Identifies this process in the job ids it hands out (see advice_job_elsewhere)
+_worker_id = uuid.uuid4().hex[:8]
+
+
+def _reset_worker_id_after_fork():
+    # Workers forked from a preloading server each need their own id
+    global _worker_id
+    _worker_id = uuid.uuid4().hex[:8]
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_worker_id_after_fork)
+
+
+def _job_key(job_id):
+    return f"advice-job:{job_id}"
+
+
+def _job_ttl():
+    return getattr(settings, 'ADVICE_JOB_TTL_SECONDS', 600)
+
+
+def start_advice_job(engine, user_id):
+    """
+    Generate an engine's deferred advice on a background thread.
+
+    Progress is kept in the Django cache under the returned job id, one crop
+    at a time, so any worker sharing the cache can serve it (with the default
+    per-process cache, only the worker that started the job can; see
+    advice_job_elsewhere).
+    """
+    job_id = f"{uuid.uuid4().hex}.{_worker_id}"
+    job = {
+        'user_id': user_id,
+        'status': 'running',
+        'pending': [list(key) for key, _, _ in engine.deferred_advice],
+        'recommendations': {},
+        'intended_crop': None,
+        'started_at': time.time(),
+    }
+    cache.set(_job_key(job_id), job, _job_ttl())
+    threading.Thread(target=_run_advice_job, args=(job_id, job, engine), name=f'advice-job-{job_id[:8]}', daemon=True).start()
+    return job_id
+
+
+def _run_advice_job(job_id, job, engine):
+    try:
+        for (section, crop_name), advice in engine.iter_deferred_advice():
+            if section == 'intended_crop':
+                job['intended_crop'] = {'crop': crop_name, 'advice': advice}
+            else:
+                job['recommendations'][crop_name] = advice
+            job['pending'].remove([section, crop_name])
+            cache.set(_job_key(job_id), job, _job_ttl())
+        job['status'] = 'done'
+    except Exception as e:
+        print(f"Advice job {job_id} failed: {e}")
+        job['status'] = 'failed'
+    finally:
+        cache.set(_job_key(job_id), job, _job_ttl())
+        connections.close_all()
+
+
+def get_advice_job(job_id, user_id):
+    """The job's current state, or None if it is unknown, expired or someone else's"""
+    job = cache.get(_job_key(job_id))
+    if job is None or job['user_id'] != user_id:
+        return None
+    return job
+
+
+def advice_job_elsewhere(job_id):
+    """
+    True when job_id can't be found because another process started it and the
+    default cache is per-process (LocMemCache), as opposed to it having expired
+    """
+    return isinstance(caches['default'], LocMemCache) and job_id.rpartition('.')[2] != _worker_id
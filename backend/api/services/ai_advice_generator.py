@@ -1,6 +1,9 @@
 import os
 import json
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 from typing import Dict, List, Optional
 
 try:
@@ -12,6 +15,7 @@ except ImportError:
 # Get API key from environment - try loading from .env file first
 from pathlib import Path
 from dotenv import load_dotenv
+from .engine_config import DESERT, ENGINE_CONFIG
 
 # Load .env file if it exists
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -21,6 +25,7 @@ load_dotenv(dotenv_path=env_path, override=True)
 # Get API key from environment
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
 OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')  # Use cheaper model by default
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get('OPENAI_TIMEOUT_SECONDS', 30))  # Per API call
 
 # Debug: Print status (only if key is set to avoid exposing keys)
 if OPENAI_API_KEY:
@@ -112,7 +117,7 @@ class AIAdviceGenerator:
         self.client = None
         if OPENAI_AVAILABLE and OPENAI_API_KEY:
             try:
-                self.client = OpenAI(api_key=OPENAI_API_KEY)
+                self.client = OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT_SECONDS)
                 self.ai_enabled = True
                 print(f"✅ AI Advice Generator initialized with OpenAI (language: {language})")
             except Exception as e:
@@ -126,10 +131,15 @@ class AIAdviceGenerator:
             self.ai_enabled = False
     
     def generate_crop_advice(self, crop_name: str, farm_data: Dict, analysis_scores: Dict, 
-                             weather_data: Dict, market_data: Dict, is_recommended: bool) -> List[Dict]:
+                             weather_data: Dict, market_data: Dict, is_recommended: bool,
+                             use_ai: bool = True) -> List[Dict]:
         """
         Generate AI-powered advice for a specific crop
+        use_ai=False skips OpenAI and returns rule-based advice directly
         """
+        if not use_ai:
+            return self._generate_rule_based(crop_name, farm_data, analysis_scores, 
+                                            weather_data, market_data, is_recommended)
         if self.ai_enabled:
             try:
                 print(f"🤖 Generating AI advice for {crop_name} (recommended: {is_recommended})")
@@ -148,6 +158,50 @@ class AIAdviceGenerator:
             return self._generate_rule_based(crop_name, farm_data, analysis_scores, 
                                             weather_data, market_data, is_recommended)
     
+    def generate_advice_batch(self, requests: List[tuple], max_workers: int = 4,
+                              deadline_seconds: float = 20.0) -> List[List[Dict]]:
+        """
+        Generate advice for several crops concurrently.
+        Each request is a tuple of generate_crop_advice arguments; the advice lists
+        come back in the same order. AI calls run on at most max_workers threads,
+        and any crop still waiting when deadline_seconds (one budget for the whole
+        batch) runs out gets rule-based advice instead.
+        """
+        results = [None] * len(requests)
+        for index, advice in self.iter_advice_batch(requests, max_workers, deadline_seconds):
+            results[index] = advice
+        return results
+    
+    def iter_advice_batch(self, requests: List[tuple], max_workers: int = 4,
+                          deadline_seconds: float = 20.0):
+        """
+        Same as generate_advice_batch, but yields (request index, advice) pairs
+        as soon as each crop's advice is ready
+        """
+        # Rule-based advice is local and fast; anything that may call the API goes through
+        # the executor, even a single request on a single worker, so the deadline always holds
+        if not self.ai_enabled:
+            for index, request in enumerate(requests):
+                yield index, self.generate_crop_advice(*request)
+            return
+        
+        started = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(requests))), thread_name_prefix='ai-advice')
+        futures = {executor.submit(self.generate_crop_advice, *request): index for index, request in enumerate(requests)}
+        pending = set(futures.values())
+        try:
+            for future in as_completed(futures, timeout=deadline_seconds):
+                pending.discard(futures[future])
+                yield futures[future], future.result()
+        except FuturesTimeout:
+            for index in sorted(pending):
+                print(f"⏱️  AI advice for {requests[index][0]} missed the {deadline_seconds:.0f}s deadline, using rule-based advice")
+                yield index, self._generate_rule_based(*requests[index])
+        finally:
+            # Late calls are abandoned, not awaited (the client's own timeout ends them)
+            executor.shutdown(wait=False, cancel_futures=True)
+        print(f"AI advice for {len(requests)} crops in {time.monotonic() - started:.1f}s ({max_workers} workers)")
+    
     def _generate_language_prompt(self, crop_name: str, farm_data: Dict, analysis_scores: Dict,
                                   weather_data: Dict, market_data: Dict, is_recommended: bool,
                                   location: str, is_desert: bool, soil_type: str, temp: float, rainfall: float) -> str:
@@ -394,7 +448,9 @@ Be specific, practical, and focus on actionable advice. Write ALL content in cle
         """
         # Prepare context for AI (always in English first)
         location = farm_data.get('location', 'Unknown')
-        is_desert = any(desert.lower() in location.lower() for desert in ['biskra', 'adrar', 'tamanrasset', 'illizi', 'béchar', 'tindouf', 'el oued', 'ouargla', 'ghardaïa', 'laghouat'])
+        # The engine passes the farm's Region climate class; older callers only send a location
+        climate_class = farm_data.get('climate_class') or ENGINE_CONFIG.climate_class(location)
+        is_desert = climate_class == DESERT
         soil_type = farm_data.get('soil_type', 'Unknown')
         temp = weather_data.get('temperature_avg', 20)
         rainfall = weather_data.get('rainfall_mm', 0)
@@ -1178,3 +1234,28 @@ Return the translated JSON with the same structure."""
         
         return explanation
 
+
+# One generator (and OpenAI client, with its connection pool) per language per process
+_generators = {}
+_generators_lock = threading.Lock()
+
+
+def _reset_generators_after_fork():
+    # A forked worker must not share the parent's HTTP connections
+    global _generators_lock
+    _generators.clear()
+    _generators_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_generators_after_fork)
+
+
+def get_advice_generator(language='en'):
+    """The process-wide AIAdviceGenerator for a language (generators hold no per-request state)"""
+    generator = _generators.get(language)
+    if generator is None:
+        with _generators_lock:
+            generator = _generators.get(language)
+            if generator is None:
+                generator = _generators[language] = AIAdviceGenerator(language=language)
+    return generator
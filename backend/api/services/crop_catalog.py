@@ -0,0 +1,54 @@
+import threading
+import time
+from django.conf import settings
+
+
+class CropCatalog:
+    """
+    In-process name -> Crop map for the recommendation engine.
+
+    The whole (small) Crop table is loaded in one query on first use and
+    dropped whenever a Crop is saved or deleted in this process (see
+    api/signals.py). Writes made by other processes are picked up once
+    CROP_CATALOG_TTL_SECONDS has passed.
+    """
+
+    def __init__(self):
+        self._crops = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from api.models import Crop
+        crops = {}
+        for crop in Crop.objects.order_by('id'):
+            # Names aren't unique in the schema; the oldest row wins
+            crops.setdefault(crop.name, crop)
+        return crops
+
+    def _current(self):
+        ttl = getattr(settings, 'CROP_CATALOG_TTL_SECONDS', 300)
+        crops = self._crops
+        if crops is None or time.monotonic() - self._loaded_at > ttl:
+            with self._lock:
+                if self._crops is crops:
+                    self._crops = self._load()
+                    self._loaded_at = time.monotonic()
+                crops = self._crops
+        return crops
+
+    def get(self, name):
+        """The Crop called name, or None"""
+        return self._current().get(name)
+
+    def get_many(self, names):
+        """name -> Crop for the names that exist, in the order given"""
+        crops = self._current()
+        return {name: crops[name] for name in names if name in crops}
+
+    def invalidate(self):
+        with self._lock:
+            self._crops = None
+
+
+crop_catalog = CropCatalog()
@@ -0,0 +1,114 @@
+from types import MappingProxyType
+
+# Region.climate_class values
+DESERT = 'desert'
+SEMI_DESERT = 'semi_desert'
+TELL = 'tell'
+
+# Desert/semi-desert regions (strict climate constraints)
+DESERT_REGIONS = ('Biskra', 'Adrar', 'Tamanrasset', 'Illizi', 'Béchar', 'Tindouf', 'El Oued', 'Ouargla', 'Ghardaïa', 'Laghouat')
+SEMI_DESERT_REGIONS = ('Djelfa', 'M\'Sila', 'El Bayadh', 'Naâma', 'Aïn Salah')
+
+# Crop-specific climate requirements (strict)
+CROP_CLIMATE_REQUIREMENTS = {
+    'Strawberry': {
+        'max_temp': 25,  # Cannot tolerate high temperatures
+        'min_rainfall': 400,  # Needs adequate water
+        'max_temp_avg': 22,  # Optimal temperature
+        'soil_preferred': ['Loam', 'Silt'],  # Not suitable for sand
+        'desert_suitable': False  # Not suitable for desert
+    },
+    'Lettuce': {
+        'max_temp': 25,
+        'min_rainfall': 200,
+        'max_temp_avg': 20,
+        'soil_preferred': ['Loam', 'Clay', 'Silt'],
+        'desert_suitable': False
+    },
+    'Tomato': {
+        'max_temp': 35,
+        'min_rainfall': 300,
+        'max_temp_avg': 28,
+        'soil_preferred': ['Loam', 'Clay'],
+        'desert_suitable': True  # Can work with irrigation
+    },
+    'Wheat': {
+        'max_temp': 30,
+        'min_rainfall': 300,
+        'max_temp_avg': 20,
+        'soil_preferred': ['Loam', 'Clay'],
+        'desert_suitable': False
+    }
+}
+
+
+class ClimateRequirement:
+    """One crop's climate requirements, in the shape the scoring kernel reads them"""
+    __slots__ = ('has_requirements', 'desert_suitable', 'max_temp', 'min_rainfall', 'soil_preferred')
+
+    def __init__(self, requirements):
+        self.has_requirements = bool(requirements)
+        self.desert_suitable = requirements.get('desert_suitable', False)
+        self.max_temp = requirements.get('max_temp', 35)
+        self.min_rainfall = requirements.get('min_rainfall', 200)
+        self.soil_preferred = frozenset(requirements.get('soil_preferred', ()))
+
+    def soil_penalty(self, soil_texture):
+        """Penalty for a soil texture the crop doesn't prefer"""
+        if self.soil_preferred and soil_texture not in self.soil_preferred:
+            # Heavy penalty for sand if not preferred, moderate for other non-preferred soils
+            return 40 if soil_texture == 'Sand' else 20
+        return 0
+
+
+class EngineConfig:
+    """
+    Read-only tables for SmartProductionPlanningEngine, built once per process
+    (ENGINE_CONFIG) instead of on every request
+    """
+
+    def __init__(self, desert_regions, semi_desert_regions, crop_climate_requirements):
+        self.desert_regions = frozenset(desert_regions)
+        self.semi_desert_regions = frozenset(semi_desert_regions)
+        self.crop_climate_requirements = MappingProxyType({
+            crop_name: ClimateRequirement(requirements)
+            for crop_name, requirements in crop_climate_requirements.items()
+        })
+        self.default_requirement = ClimateRequirement({})
+        # Lowercased region name -> climate class; desert wins if a name matches both
+        self._climate_classes = {}
+        self._desert_lower = tuple(region.lower() for region in self.desert_regions)
+        self._semi_desert_lower = tuple(region.lower() for region in self.semi_desert_regions)
+        for region in semi_desert_regions:
+            self.climate_class(region)
+        for region in desert_regions:
+            self.climate_class(region)
+
+    def climate_class(self, region_name):
+        """
+        DESERT, SEMI_DESERT or None for a region (or any location string naming one).
+        Known names are a dict hit; others are scanned once and remembered.
+        """
+        region_lower = region_name.lower() if region_name else ''
+        climate_class = self._climate_classes.get(region_lower, False)
+        if climate_class is False:
+            if any(desert in region_lower for desert in self._desert_lower):
+                climate_class = DESERT
+            elif any(semi in region_lower for semi in self._semi_desert_lower):
+                climate_class = SEMI_DESERT
+            else:
+                climate_class = None
+            if len(self._climate_classes) < 1024:  # farm locations are free text; keep the index bounded
+                self._climate_classes[region_lower] = climate_class
+        return climate_class
+
+    def climate_requirement(self, crop_name):
+        return self.crop_climate_requirements.get(crop_name, self.default_requirement)
+
+
+ENGINE_CONFIG = EngineConfig(DESERT_REGIONS, SEMI_DESERT_REGIONS, CROP_CLIMATE_REQUIREMENTS)
+
+
+def classify_region(region_name):
+    """Climate class to store on a Region: DESERT, SEMI_DESERT, or TELL for every other wilaya"""
+    return ENGINE_CONFIG.climate_class(region_name) or TELL
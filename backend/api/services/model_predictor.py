@@ -1,32 +1,97 @@
-import joblib
-import pandas as pd
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
+import numpy as np
+from django.conf import settings
+from model_store import ModelStore, artifact_source
+from prediction_grid import PredictionGrid
 
 # Get the backend directory (parent of api)
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 MODEL_PATH = BASE_DIR / 'models' / 'agri_advisor_v5.pkl'
+GRID_DIR = BASE_DIR / 'models' / 'agri_advisor_v5_grid'
+
+def _quantize(value, width):
+    """Cache-key bucket of value: the nearest multiple of width (width <= 0 keeps it exact)"""
+    if not width or width <= 0:
+        return float(value)
+    return round(round(float(value) / width) * width, 6)
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL for model predictions.
+    Each ModelPredictor owns one, so entries never outlive the model snapshot that produced them.
+    """
+    
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(value)
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
 
 class ModelPredictor:
     """Service to load and use the trained XGBoost model for predictions"""
     
-    def __init__(self):
-        self.models = None
-        self.load_model()
-    
-    def load_model(self):
-        """Load the trained model from pickle file"""
-        if MODEL_PATH.exists():
-            try:
-                self.models = joblib.load(str(MODEL_PATH))
-                print(f"Model loaded successfully from {MODEL_PATH}")
-            except Exception as e:
-                print(f"Error loading model: {e}")
-                self.models = None
-        else:
-            print(f"Model file not found: {MODEL_PATH}")
-            self.models = None
+    def __init__(self, snapshot=None):
+        # Each predictor is bound to one immutable model snapshot for its whole life;
+        # a reload builds a new predictor (and with it a fresh prediction cache)
+        self.snapshot = snapshot
+        self.models = snapshot.artifacts if snapshot else None
+        self.encoder = snapshot.encoder if snapshot else None
+        self.model_version = snapshot.version if snapshot else None
+        
+        cache_config = getattr(settings, 'PREDICTION_CACHE', {})
+        self.cache = PredictionCache(cache_config.get('MAX_ENTRIES', 4096), cache_config.get('TTL_SECONDS', 6 * 60 * 60))
+        self.area_bucket = cache_config.get('AREA_BUCKET_HA', 0.5)
+        self.temperature_bucket = cache_config.get('TEMPERATURE_BUCKET_C', 0.5)
+        self.rainfall_bucket = cache_config.get('RAINFALL_BUCKET_MM', 5.0)
+        
+        # Precomputed predictions for this model, if a matching grid was built (see prediction_grid.py)
+        self.grid = None
+        self.grid_stamp = None
+        if snapshot and getattr(settings, 'PREDICTION_GRID_ENABLED', True):
+            # Stamp first: a grid replaced while loading is then seen as changed next time
+            self.grid_stamp = PredictionGrid.stamp(GRID_DIR)
+            self.grid = PredictionGrid.load(GRID_DIR, snapshot)
     
     def predict_crop(self, crop_name, region_name, soil_type, farm_size_ha, temperature_c, rainfall_mm, year=None, month=None):
         """
@@ -36,58 +101,130 @@ class ModelPredictor:
         Returns:
             dict with 'risk', 'price', 'yield' or None if prediction fails
         """
+        predictions = self.predict_crops(
+            [crop_name], region_name, soil_type, farm_size_ha, temperature_c, rainfall_mm, year, month
+        )
+        return predictions.get(crop_name)
+    
+    def predict_crops(self, crops, region_name, soil_type, farm_size_ha, temperature_c, rainfall_mm, year=None, month=None):
+        """
+        Predict risk, price, and yield for several crops sharing the same farm inputs
+        Builds one feature matrix (one row per crop) so each model runs only once
+        
+        Returns:
+            dict mapping crop name -> {'risk', 'price', 'yield'}
+            Crops unknown to the model (or a failed prediction) are left out
+        """
+        return self.predict_batch(
+            [(crops, region_name, soil_type, farm_size_ha, temperature_c, rainfall_mm)], year, month
+        )[0]
+    
+    def predict_batch(self, inputs, year=None, month=None):
+        """
+        predict_crops for several farms at once. inputs is a list of
+        (crops, region_name, soil_type, farm_size_ha, temperature_c, rainfall_mm);
+        farms with the same (bucketed) inputs are predicted once, and the rows
+        the cache and grid can't answer are stacked into one feature matrix
+        
+        Returns:
+            one predict_crops result dict per input, in order
+        """
         if not self.models:
-            return None
+            return [{} for _ in inputs]
         
-        try:
-            # Use current date if not provided
-            if year is None:
-                year = datetime.now().year
-            if month is None:
-                month = datetime.now().month
-            
-            # Use the same logic as score() function from main.py
-            df = pd.DataFrame(0, index=[0], columns=self.models['feature_cols'])
-            df['year'] = year
-            df['month'] = month
-            df['planted_area'] = farm_size_ha
-            df['temperature_c'] = temperature_c
-            df['rainfall_mm'] = rainfall_mm
-            
-            # Set one-hot encoded features (same as score() function)
-            region_col = f"region_{region_name}"
-            soil_col = f"soil_type_{soil_type}"
-            crop_col = f"crop_{crop_name}"
-            
-            # Check if columns exist in model features
-            if region_col in self.models['feature_cols']:
-                df[region_col] = 1
-            if soil_col in self.models['feature_cols']:
-                df[soil_col] = 1
-            if crop_col not in self.models['feature_cols']:
-                print(f"ERROR: Crop '{crop_name}' not found in model features")
-                return None
-            df[crop_col] = 1
+        encoder = self.encoder
+        
+        # Use current date if not provided
+        if year is None:
+            year = datetime.now().year
+        if month is None:
+            month = datetime.now().month
+        
+        results = []
+        by_input_key = {}  # input_key -> predictions shared by every farm with exactly those inputs
+        pending = []       # (predictions, input_key, cache_key, crops) left for the models
+        for crops, region_name, soil_type, farm_size_ha, temperature_c, rainfall_mm in inputs:
+            # The model always sees the raw inputs; only the cache key is bucketed, so nearby farms share entries
+            input_key = (region_name, soil_type, year, month, float(farm_size_ha), float(temperature_c), float(rainfall_mm))
+            cache_key = (region_name, soil_type, year, month, _quantize(farm_size_ha, self.area_bucket),
+                         _quantize(temperature_c, self.temperature_bucket), _quantize(rainfall_mm, self.rainfall_bucket))
             
-            # Scale numerical features
-            cols = self.models['numerical_cols']
+            predictions = by_input_key.setdefault(input_key, {})
+            results.append((predictions, crops))
             
-            # Predict risk (probability of oversupply) - same as score()
-            X_cls = df.copy()
-            X_cls[cols] = self.models['scaler_cls'].transform(X_cls[cols])
-            risk_prob = self.models['rfc'].predict_proba(X_cls)[:, 1][0]
-            risk_percent = risk_prob * 100  # Convert to percentage
+            # Serve what we can from the cache; keep only uncached crops the model knows about
+            known_crops = []
+            for crop_name in dict.fromkeys(crops):
+                if crop_name in predictions:
+                    continue
+                if not encoder.has_crop(crop_name):
+                    print(f"ERROR: Crop '{crop_name}' not found in model features")
+                    continue
+                cached = self.cache.get((crop_name,) + cache_key)
+                if cached is not None:
+                    predictions[crop_name] = cached
+                else:
+                    known_crops.append(crop_name)
+                    # Placeholder so a later farm with the same inputs doesn't queue it again
+                    predictions[crop_name] = None
             
-            # Predict price - same as score()
-            # Model predicts price per ton, need to convert to price per kg
-            X_reg = df.copy()
-            X_reg[cols] = self.models['scaler_price'].transform(X_reg[cols])
-            price_per_ton = self.models['lr_price'].predict(X_reg)[0]
-            price_per_kg = price_per_ton / 1000  # Convert from DA/ton to DA/kg
+            if not known_crops:
+                continue
             
-            # Predict yield - same as score()
-            X_reg[cols] = self.models['scaler_yield'].transform(X_reg[cols])
-            yield_per_ha = self.models['lr_yield'].predict(X_reg)[0]
+            # Inside the grid the answer is a cell lookup; outside it (or where the grid
+            # failed its tolerance check), run the models
+            try:
+                grid_hit = None
+                if self.grid is not None:
+                    grid_hit = self.grid.lookup(known_crops, *input_key)
+            except Exception as e:
+                print(f"Error in grid lookup for {len(known_crops)} crops: {e}")
+                continue
+            if grid_hit is not None:
+                self._store_predictions(predictions, cache_key, known_crops, *grid_hit)
+            else:
+                pending.append((predictions, input_key, cache_key, known_crops))
+        
+        if pending:
+            try:
+                # Same features as score() in main.py, one row per (farm, crop)
+                if len(pending) == 1:
+                    _, input_key, _, known_crops = pending[0]
+                    X = encoder.encode(known_crops, *input_key)
+                else:
+                    # encode() reuses one buffer, so each farm's block is copied out before stacking
+                    X = np.concatenate([
+                        encoder.encode(known_crops, *input_key).copy() for _, input_key, _, known_crops in pending
+                    ])
+                
+                # Risk (probability of oversupply), price per ton and yield per ha - same as score()
+                # Model predicts price per ton, converted to price per kg below
+                risk_probs, prices_per_ton, yields_per_ha = self.snapshot.predict(X)
+            except Exception as e:
+                print(f"Error in batch prediction for {sum(len(known_crops) for *_, known_crops in pending)} crops: {e}")
+                import traceback
+                traceback.print_exc()
+            else:
+                offset = 0
+                for predictions, _, cache_key, known_crops in pending:
+                    end = offset + len(known_crops)
+                    self._store_predictions(predictions, cache_key, known_crops, risk_probs[offset:end],
+                                            prices_per_ton[offset:end], yields_per_ha[offset:end])
+                    offset = end
+        
+        # Farms sharing inputs each get their own copies
+        return [
+            {crop_name: dict(predictions[crop_name]) for crop_name in dict.fromkeys(crops) if predictions.get(crop_name)}
+            for predictions, crops in results
+        ]
+    
+    def _store_predictions(self, predictions, cache_key, known_crops, risk_probs, prices_per_ton, yields_per_ha):
+        """Convert model outputs into prediction dicts, in predictions and in the cache"""
+        region_name, soil_type = cache_key[0], cache_key[1]
+        for crop_name, risk_prob, price_per_ton, yield_per_ha in zip(known_crops, risk_probs, prices_per_ton, yields_per_ha):
+            risk_percent = float(risk_prob) * 100  # Convert to percentage
+            price_per_kg = float(price_per_ton) / 1000  # Convert from DA/ton to DA/kg
+            yield_per_ha = float(yield_per_ha)
             
             # Debug output
             print(f"Model prediction for {crop_name} ({region_name}, {soil_type}): risk={risk_percent:.2f}%, price={price_per_kg:.2f} DA/kg, yield={yield_per_ha:.2f} tons/ha")
@@ -97,29 +234,22 @@ class ModelPredictor:
                 print(f"WARNING: Model predicted negative yield: {yield_per_ha}, using absolute value")
                 yield_per_ha = abs(yield_per_ha)
             
-            return {
+            predictions[crop_name] = {
                 'risk': risk_percent,
                 'price': price_per_kg,  # Already converted to DA/kg
                 'yield': yield_per_ha
             }
-            
-        except Exception as e:
-            print(f"Error in prediction for {crop_name}: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+            self.cache.set((crop_name,) + cache_key, predictions[crop_name])
+    
+    def cache_stats(self):
+        """Prediction cache counters plus the version of the model they belong to"""
+        return {**self.cache.stats(), 'model_version': self.model_version}
     
     def get_available_crops(self):
         """Get list of crops available in the model"""
         if not self.models:
             return []
-        
-        crops = []
-        for col in self.models['feature_cols']:
-            if col.startswith('crop_'):
-                crop_name = col.replace('crop_', '')
-                crops.append(crop_name)
-        return crops
+        return self.encoder.known_crops()
     
     def get_soil_crop_pool(self):
         """Get soil-crop mapping from model"""
@@ -133,13 +263,51 @@ class ModelPredictor:
             return {}
         return self.models.get('weather_ranges', {})
 
-# Global instance
+# Process-wide artifact holder; a daemon thread swaps in new snapshots when the file changes
+# settings.MODEL_ARTIFACT_FORMAT picks the native boosters ('native'), the pickle ('pickle'),
+# or the native export when one exists next to the pickle ('auto')
+_inference_engine = getattr(settings, 'MODEL_INFERENCE_ENGINE', 'xgboost')
+_model_store = ModelStore(
+    *artifact_source(MODEL_PATH, artifact_format=getattr(settings, 'MODEL_ARTIFACT_FORMAT', 'auto'),
+                     engine=_inference_engine),
+    engine=_inference_engine,
+)
 _model_predictor = None
+_model_predictor_lock = threading.Lock()
+
+def _reset_predictor_after_fork():
+    # A forked worker rebuilds its predictor (and cache locks) from the inherited snapshot
+    global _model_predictor, _model_predictor_lock
+    _model_predictor = None
+    _model_predictor_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_predictor_after_fork)
+
+def get_model_store():
+    """The process-wide ModelStore, with its reload watcher running"""
+    _model_store.watch(getattr(settings, 'MODEL_RELOAD_INTERVAL_SECONDS', 30))
+    return _model_store
 
 def get_model_predictor():
-    """Get or create the global model predictor instance"""
+    """
+    Get the predictor for the current model snapshot.
+    Callers should hold on to the returned object for the whole request so every
+    prediction in it comes from the same model version.
+    A prediction grid written after the predictor was built (it is rebuilt in
+    the background after training) gets a new predictor too.
+    """
     global _model_predictor
-    if _model_predictor is None:
-        _model_predictor = ModelPredictor()
-    return _model_predictor
+    snapshot = get_model_store().current()
+    grid_stamp = PredictionGrid.stamp(GRID_DIR) if getattr(settings, 'PREDICTION_GRID_ENABLED', True) else None
+
+    def stale(predictor):
+        return predictor is None or predictor.snapshot is not snapshot or predictor.grid_stamp != grid_stamp
 
+    predictor = _model_predictor
+    if stale(predictor):
+        with _model_predictor_lock:
+            if stale(_model_predictor):
+                _model_predictor = ModelPredictor(snapshot)
+            predictor = _model_predictor
+    return predictor
@@ -1,407 +1,130 @@
 import random
 from datetime import datetime, timedelta
 from collections import defaultdict
-from .ai_advice_generator import AIAdviceGenerator
+import numpy as np
+from django.conf import settings
+from . import scoring
+from .ai_advice_generator import get_advice_generator
+from .crop_catalog import crop_catalog
+from .engine_config import DESERT, ENGINE_CONFIG, SEMI_DESERT
 from .model_predictor import get_model_predictor
 
+# Defaults for settings.AI_ADVICE
+AI_ADVICE_DEFAULTS = {
+    'MAX_WORKERS': 4,          # concurrent OpenAI calls per request (1 = one after another)
+    'DEADLINE_SECONDS': 20.0,  # budget for all crops' advice; late crops get rule-based advice
+    'TOP_K': 3,                # best-ranked crops that get OpenAI advice (plus the intended crop)
+}
+
+
+class MockMarketData:
+    """Model predictions standing in for market data in the rule-based advice"""
+    def __init__(self, price, risk):
+        self.price_per_kg = price
+        self.demand_index = 1.0 - (risk / 100)
+        self.supply_volume_tons = 1000
+
+
+class ScoringContext:
+    """
+    Per-request scoring state shared by get_recommendations() and analyze_intended_crop():
+    the soil sample, model predictions and per-crop scores, which only depend on
+    the farm, weather and model snapshot the engine was built with
+    """
+    
+    def __init__(self, soil_data):
+        self.soil_data = soil_data
+        self.predictions = {}   # crop name -> model prediction (None when the model has none)
+        self.soil_scores = {}   # crop id -> soil score against soil_data
+
+
 class SmartProductionPlanningEngine:
     def __init__(self, farm, weather_forecast, market_data, language='en'):
         self.farm = farm
         self.weather = weather_forecast
         self.market = market_data
         self.language = language  # Store language for AI advice generation
-        self.ai_advice_generator = AIAdviceGenerator(language=language)
-        self.advice_categories = {
-            'critical': [],  # Must address immediately
-            'warning': [],   # Should address soon
-            'recommendation': [],  # Best practices
-            'opportunity': [],  # Potential benefits
-            'info': []  # General information
-        }
-        
-        # Define desert/semi-desert regions (strict climate constraints)
-        self.desert_regions = ['Biskra', 'Adrar', 'Tamanrasset', 'Illizi', 'Béchar', 'Tindouf', 'El Oued', 'Ouargla', 'Ghardaïa', 'Laghouat']
-        self.semi_desert_regions = ['Djelfa', 'M\'Sila', 'El Bayadh', 'Naâma', 'Aïn Salah']
-        
-        # Crop-specific climate requirements (strict)
-        self.crop_climate_requirements = {
-            'Strawberry': {
-                'max_temp': 25,  # Cannot tolerate high temperatures
-                'min_rainfall': 400,  # Needs adequate water
-                'max_temp_avg': 22,  # Optimal temperature
-                'soil_preferred': ['Loam', 'Silt'],  # Not suitable for sand
-                'desert_suitable': False  # Not suitable for desert
-            },
-            'Lettuce': {
-                'max_temp': 25,
-                'min_rainfall': 200,
-                'max_temp_avg': 20,
-                'soil_preferred': ['Loam', 'Clay', 'Silt'],
-                'desert_suitable': False
-            },
-            'Tomato': {
-                'max_temp': 35,
-                'min_rainfall': 300,
-                'max_temp_avg': 28,
-                'soil_preferred': ['Loam', 'Clay'],
-                'desert_suitable': True  # Can work with irrigation
-            },
-            'Wheat': {
-                'max_temp': 30,
-                'min_rainfall': 300,
-                'max_temp_avg': 20,
-                'soil_preferred': ['Loam', 'Clay'],
-                'desert_suitable': False
-            }
-        }
+        # Pin one model snapshot for the whole request (a hot reload may swap it meanwhile)
+        self.model_predictor = get_model_predictor()
+        self.model_version = self.model_predictor.model_version
+        # Shared per language (process-wide, with its OpenAI client)
+        self.ai_advice_generator = get_advice_generator(language)
+        # ((section, crop name), generate_crop_advice args, _supplement_advice args)
+        # for advice postponed with defer_advice=True
+        self.deferred_advice = []
+        # Built on first use by _scoring_context()
+        self.scoring_context = None
 
-    def calculate_soil_score(self, crop, soil_data):
+    def calculate_soil_scores(self, crops, soil_data):
         """
-        Enhanced Soil Suitability Scoring with multiple factors
+        Enhanced Soil Suitability Scoring with multiple factors, for several crops at once
         Includes regional climate constraints
         """
-        score = 100.0
-        
-        # Check regional climate constraints FIRST (strict validation)
-        location = self.farm.location if hasattr(self.farm, 'location') else ''
-        region_name = location if isinstance(location, str) else getattr(self.farm.region, 'name', '') if self.farm.region else ''
-        
-        # Apply strict climate penalties for unsuitable regions
-        climate_penalty = self._check_climate_constraints(crop, region_name, soil_data.texture)
-        if climate_penalty > 0:
-            score -= climate_penalty  # Apply heavy penalty for unsuitable climate
-        
-        # 1. pH Analysis (40% of soil score)
-        ideal_ph_center = (crop.ideal_ph_min + crop.ideal_ph_max) / 2
-        ph_range = crop.ideal_ph_max - crop.ideal_ph_min
-        ph_diff = abs(soil_data.ph_level - ideal_ph_center)
-        
-        if soil_data.ph_level < crop.ideal_ph_min:
-            # Too acidic
-            ph_penalty = min(40, (crop.ideal_ph_min - soil_data.ph_level) * 15)
-            score -= ph_penalty
-        elif soil_data.ph_level > crop.ideal_ph_max:
-            # Too alkaline
-            ph_penalty = min(40, (soil_data.ph_level - crop.ideal_ph_max) * 15)
-            score -= ph_penalty
-        else:
-            # Within range - bonus for being close to center
-            if ph_diff < ph_range * 0.2:
-                score += 5  # Optimal pH bonus
-        
-        # 2. Texture Compatibility (30% of soil score)
-        texture_score = self._analyze_texture_compatibility(crop, soil_data.texture)
-        score = (score * 0.7) + (texture_score * 0.3)
-        
-        # 3. Water Retention Analysis (20% of soil score)
-        water_retention_score = self._analyze_water_retention(crop, soil_data.texture)
-        score = (score * 0.8) + (water_retention_score * 0.2)
-        
-        # 4. Nutrient Availability (10% of soil score - if soil data available)
-        if hasattr(soil_data, 'nitrogen') and soil_data.nitrogen:
-            nutrient_score = self._analyze_nutrients(crop, soil_data)
-            score = (score * 0.9) + (nutrient_score * 0.1)
-        
-        return max(0, min(100, score))
+        columns = scoring.crop_arrays(crops)
+        return scoring.soil_scores(columns, soil_data, self._climate_penalties(crops, columns, soil_data.texture))
     
-    def _check_climate_constraints(self, crop, region_name, soil_texture):
-        """
-        Check if crop is suitable for region's climate
-        Returns penalty score (0-100) for unsuitable conditions
-        """
-        penalty = 0
-        region_lower = region_name.lower() if region_name else ''
-        
-        # Check if region is desert/semi-desert
-        is_desert = any(desert.lower() in region_lower for desert in self.desert_regions)
-        is_semi_desert = any(semi.lower() in region_lower for semi in self.semi_desert_regions)
-        
-        # Get crop requirements
-        crop_reqs = self.crop_climate_requirements.get(crop.name, {})
-        
-        if not crop_reqs:
-            # For crops without specific requirements, apply general desert rules
-            if is_desert:
-                # High water requirement crops are not suitable for desert
-                if crop.water_requirement_mm > 400:
-                    penalty += 50  # Heavy penalty
-                if soil_texture == 'Sand' and crop.water_requirement_mm > 300:
-                    penalty += 30  # Additional penalty for sand + high water
-            return penalty
-        
-        # Check desert suitability
-        if (is_desert or is_semi_desert) and not crop_reqs.get('desert_suitable', False):
-            penalty += 60  # Heavy penalty for non-desert crops in desert
-        
-        # Check temperature constraints
-        if self.weather.temperature_avg > crop_reqs.get('max_temp', 35):
-            temp_excess = self.weather.temperature_avg - crop_reqs.get('max_temp', 35)
-            penalty += min(40, temp_excess * 5)  # 5 points per degree over max
-        
-        # Check rainfall constraints
-        if self.weather.rainfall_mm < crop_reqs.get('min_rainfall', 200):
-            rainfall_deficit = crop_reqs.get('min_rainfall', 200) - self.weather.rainfall_mm
-            penalty += min(50, rainfall_deficit / 10)  # Penalty for insufficient rainfall
-        
-        # Check soil type constraints
-        preferred_soils = crop_reqs.get('soil_preferred', [])
-        if preferred_soils and soil_texture not in preferred_soils:
-            if soil_texture == 'Sand' and 'Sand' not in preferred_soils:
-                penalty += 40  # Heavy penalty for sand if not preferred
-            else:
-                penalty += 20  # Moderate penalty for non-preferred soil
-        
-        return penalty
-
-    def _analyze_texture_compatibility(self, crop, soil_texture):
-        """Analyze soil texture compatibility with crop"""
-        # Texture preferences by crop water needs
-        texture_suitability = {
-            'Loam': {'high_water': 100, 'medium_water': 100, 'low_water': 95},
-            'Clay': {'high_water': 90, 'medium_water': 85, 'low_water': 70},
-            'Silt': {'high_water': 95, 'medium_water': 90, 'low_water': 85},
-            'Sand': {'high_water': 60, 'medium_water': 75, 'low_water': 90}
-        }
-        
-        water_category = 'high_water' if crop.water_requirement_mm > 500 else \
-                        'low_water' if crop.water_requirement_mm < 300 else 'medium_water'
-        
-        return texture_suitability.get(soil_texture, {}).get(water_category, 70)
-
-    def _analyze_water_retention(self, crop, soil_texture):
-        """Analyze water retention capacity"""
-        retention_capacity = {
-            'Clay': 0.9,
-            'Loam': 0.8,
-            'Silt': 0.75,
-            'Sand': 0.4
-        }
-        
-        retention = retention_capacity.get(soil_texture, 0.6)
-        water_need_ratio = crop.water_requirement_mm / 600  # Normalize to 600mm
-        
-        if retention >= water_need_ratio * 0.8:
-            return 100
-        elif retention >= water_need_ratio * 0.6:
-            return 80
-        elif retention >= water_need_ratio * 0.4:
-            return 60
-        else:
-            return 40
-
-    def _analyze_nutrients(self, crop, soil_data):
-        """Analyze nutrient availability"""
-        # Simplified nutrient analysis
-        score = 70  # Base score
-        
-        # Nitrogen (ideal: 1.5-2.5%)
-        if 1.5 <= soil_data.nitrogen <= 2.5:
-            score += 10
-        elif soil_data.nitrogen < 1.0:
-            score -= 15
-        
-        # Phosphorus (ideal: 0.8-1.2%)
-        if 0.8 <= soil_data.phosphorus <= 1.2:
-            score += 10
-        elif soil_data.phosphorus < 0.5:
-            score -= 10
-        
-        # Potassium (ideal: 1.0-1.5%)
-        if 1.0 <= soil_data.potassium <= 1.5:
-            score += 10
-        
-        return max(0, min(100, score))
-
-    def calculate_yield_score(self, crop):
+    def _farm_climate_class(self):
         """
-        Enhanced Weather Yield Prediction with multiple factors
+        The farm's climate class: the one stored on its Region (load the farm with
+        select_related('region')), else classified from the free-text location
         """
-        scores = []
-        
-        # 1. Rainfall Analysis (40% weight)
-        rainfall_score = self._analyze_rainfall(crop)
-        scores.append(('rainfall', rainfall_score, 0.4))
-        
-        # 2. Temperature Analysis (30% weight)
-        temp_score = self._analyze_temperature(crop)
-        scores.append(('temperature', temp_score, 0.3))
-        
-        # 3. Growing Season Length (20% weight)
-        season_score = self._analyze_growing_season(crop)
-        scores.append(('season', season_score, 0.2))
-        
-        # 4. Humidity & Sunshine (10% weight)
-        climate_score = self._analyze_climate(crop)
-        scores.append(('climate', climate_score, 0.1))
-        
-        # Weighted average
-        total_score = sum(score * weight for _, score, weight in scores)
-        return max(0, min(100, total_score))
-
-    def _analyze_rainfall(self, crop):
-        """Detailed rainfall analysis"""
-        rainfall = self.weather.rainfall_mm
-        required = crop.water_requirement_mm
-        ratio = rainfall / required if required > 0 else 0
-        
-        if 0.9 <= ratio <= 1.1:
-            return 100  # Perfect match
-        elif 0.8 <= ratio <= 1.2:
-            return 90  # Good match
-        elif 0.7 <= ratio <= 1.3:
-            return 75  # Acceptable
-        elif 0.6 <= ratio <= 1.4:
-            return 60  # Moderate deviation
-        elif 0.5 <= ratio <= 1.5:
-            return 45  # Significant deviation
-        elif ratio < 0.5:
-            return max(20, 30 - (0.5 - ratio) * 40)  # Very low rainfall
-        else:
-            return max(20, 30 - (ratio - 1.5) * 20)  # Very high rainfall
-
-    def _analyze_temperature(self, crop):
-        """Temperature suitability analysis"""
-        temp = self.weather.temperature_avg
-        
-        # Optimal temperature ranges by crop type (simplified)
-        # Most crops prefer 18-25°C
-        optimal_min, optimal_max = 18, 25
-        
-        if optimal_min <= temp <= optimal_max:
-            return 100
-        elif 15 <= temp < optimal_min or optimal_max < temp <= 28:
-            return 85
-        elif 12 <= temp < 15 or 28 < temp <= 32:
-            return 65
-        elif 10 <= temp < 12 or 32 < temp <= 35:
-            return 45
-        else:
-            return 25
-
-    def _analyze_growing_season(self, crop):
-        """Analyze if growing season length is adequate"""
-        # Simplified: assume 180 days available growing season
-        available_days = 180
-        required_days = crop.growing_days
-        
-        if required_days <= available_days * 0.9:
-            return 100
-        elif required_days <= available_days:
-            return 85
-        elif required_days <= available_days * 1.1:
-            return 70
-        else:
-            return 50
-
-    def _analyze_climate(self, crop):
-        """Analyze humidity and sunshine"""
-        humidity = self.weather.humidity_avg
-        sunshine = self.weather.sunshine_hours
-        
-        # Optimal: 60-70% humidity, 8+ hours sunshine
-        humidity_score = 100 - abs(humidity - 65) * 2
-        sunshine_score = min(100, sunshine * 10)
-        
-        return (humidity_score * 0.5 + sunshine_score * 0.5)
-
-    def calculate_risk_score(self, crop_market_data):
+        region = getattr(self.farm, 'region', None)
+        if region is not None and region.climate_class:
+            return region.climate_class
+        return ENGINE_CONFIG.climate_class(self.farm.location)
+    
+    def _climate_penalties(self, crops, columns, soil_texture):
         """
-        Enhanced Market Risk Analysis with STRICT oversupply prevention
-        PRIORITIZE avoiding oversupply to help farmers make better decisions
+        Penalty (0-100) per crop for the region's climate, from ENGINE_CONFIG's crop
+        climate requirements (crops without requirements only get the general desert rules)
         """
-        # 1. Supply/Demand Ratio (60% weight - INCREASED for oversupply prevention)
-        supply_demand_ratio = crop_market_data.supply_volume_tons / (crop_market_data.demand_index * 1000) if crop_market_data.demand_index > 0 else 2.0
-        
-        # STRICT oversupply penalties
-        if supply_demand_ratio > 1.5:
-            base_risk = 95  # CRITICAL oversupply
-        elif supply_demand_ratio > 1.3:
-            base_risk = 85  # High oversupply
-        elif supply_demand_ratio > 1.2:
-            base_risk = 75  # Moderate oversupply
-        elif supply_demand_ratio > 1.0:
-            base_risk = 55  # Slight oversupply - still penalized
-        elif supply_demand_ratio > 0.8:
-            base_risk = 25  # Balanced
-        else:
-            base_risk = 10  # Under-supply (low risk)
-        
-        # 2. Price Volatility Indicator (25% weight)
-        # High price + high supply = risk of price crash
-        price_volatility_risk = 0
-        if crop_market_data.price_per_kg > 100 and supply_demand_ratio > 1.0:
-            price_volatility_risk = 30
-        elif crop_market_data.price_per_kg > 80 and supply_demand_ratio > 1.1:
-            price_volatility_risk = 20
-        
-        # 3. Demand Trend (15% weight)
-        demand_risk = 0
-        if crop_market_data.demand_index < 0.8:
-            demand_risk = 25
-        elif crop_market_data.demand_index < 0.9:
-            demand_risk = 15
-        
-        # 4. Prevent lettuce oversupply (common issue - extra penalty)
-        lettuce_penalty = 0
-        if crop_market_data.crop.name.lower() == 'lettuce':
-            if supply_demand_ratio > 1.1:
-                lettuce_penalty = 20  # Extra penalty for lettuce oversupply
-            elif supply_demand_ratio > 1.0:
-                lettuce_penalty = 10  # Moderate penalty
-        
-        # Weighted combination (risk weight increased for oversupply prevention)
-        total_risk = (base_risk * 0.6) + (price_volatility_risk * 0.25) + (demand_risk * 0.15) + lettuce_penalty
-        return min(100, max(0, total_risk))
-
-    def calculate_profitability(self, crop, yield_score, market_data):
+        climate_class = self._farm_climate_class()
+        requirements = [ENGINE_CONFIG.climate_requirement(crop.name) for crop in crops]
+        
+        return scoring.climate_penalties(
+            columns['water_requirement_mm'],
+            has_requirements=np.array([req.has_requirements for req in requirements], dtype=bool),
+            desert_suitable=np.array([req.desert_suitable for req in requirements], dtype=bool),
+            max_temp=np.array([req.max_temp for req in requirements], dtype=float),
+            min_rainfall=np.array([req.min_rainfall for req in requirements], dtype=float),
+            soil_penalty=np.array([req.soil_penalty(soil_texture) for req in requirements], dtype=float),
+            is_desert=climate_class == DESERT,
+            is_semi_desert=climate_class == SEMI_DESERT,
+            soil_texture=soil_texture,
+            temperature=self.weather.temperature_avg,
+            rainfall=self.weather.rainfall_mm,
+        )
+    
+    def _score_market_rows(self, market_rows, soil_data, weights):
         """
-        Enhanced Profitability Model with ROI calculation
+        Score columns (see scoring.score_market_rows) for crops without model
+        predictions, from their market rows and the weather
         """
-        # Expected yield adjusted by yield score
-        expected_yield = crop.base_yield_per_ha * (yield_score / 100.0)
-        
-        # Revenue calculation
-        revenue_per_ha = expected_yield * market_data.price_per_kg * 1000  # tons to kg
-        
-        # Cost calculation (more realistic)
-        base_cost = 50000  # Base cost per ha
-        # Adjust cost based on crop requirements
-        if crop.water_requirement_mm > 500:
-            base_cost += 10000  # Irrigation costs
-        if crop.growing_days > 150:
-            base_cost += 5000  # Longer season = more labor
-        
-        total_cost = base_cost
-        profit_per_ha = revenue_per_ha - total_cost
-        
-        # ROI calculation
-        roi = (profit_per_ha / total_cost) * 100 if total_cost > 0 else 0
-        
-        # Normalize to 0-100 score
-        # ROI > 200% = 100, ROI > 100% = 80, ROI > 50% = 60, etc.
-        if roi >= 200:
-            profit_score = 100
-        elif roi >= 150:
-            profit_score = 90
-        elif roi >= 100:
-            profit_score = 80
-        elif roi >= 50:
-            profit_score = 65
-        elif roi >= 25:
-            profit_score = 50
-        elif roi >= 0:
-            profit_score = 35
-        else:
-            profit_score = max(0, 20 + roi)  # Negative ROI
-        
-        return profit_score, profit_per_ha, roi
+        crops = [m_data.crop for m_data in market_rows]
+        return scoring.score_market_rows(
+            scoring.crop_arrays(crops),
+            self.calculate_soil_scores(crops, soil_data),
+            self.weather,
+            price_per_kg=np.array([m_data.price_per_kg for m_data in market_rows], dtype=float),
+            demand_index=np.array([m_data.demand_index for m_data in market_rows], dtype=float),
+            supply_volume_tons=np.array([m_data.supply_volume_tons for m_data in market_rows], dtype=float),
+            # Prevent lettuce oversupply (common issue - extra penalty)
+            is_lettuce=np.array([crop.name.lower() == 'lettuce' for crop in crops], dtype=bool),
+            farm_size=self.farm.size_hectares,
+            weights=weights,
+        )
 
-    def get_recommendations(self):
+    def _scoring_context(self):
+        """The request's ScoringContext, loading the latest soil sample the first time"""
+        if self.scoring_context is None:
+            self.use_soil_sample(self.farm.soil_samples.last())
+        return self.scoring_context
+    
+    def use_soil_sample(self, soil_data):
         """
-        Enhanced Final Decision with confidence scoring using model predictions
+        Start the scoring context from an already-loaded soil sample (None: the
+        farm's declared soil type with typical nutrient levels)
         """
-        results = []
-        soil_data = self.farm.soil_samples.last()
         if not soil_data:
             class MockSoil:
                 def __init__(self, texture):
@@ -412,9 +135,167 @@ class SmartProductionPlanningEngine:
                     self.potassium = 1.0
             
             soil_data = MockSoil(self.farm.soil_type)
+        self.scoring_context = ScoringContext(soil_data)
+    
+    def _model_crops(self):
+        """Crops get_recommendations() and analyze_intended_crop() can ask the model about"""
+        soil_crop_pool = self.model_predictor.get_soil_crop_pool()
+        texture = self._scoring_context().soil_data.texture
+        crop_names = list(soil_crop_pool.get(texture, self.model_predictor.get_available_crops()))
+        if self.farm.intended_crop_id is not None and self.farm.intended_crop:
+            crop_names.append(self.farm.intended_crop.name)
+        return crop_names
+    
+    def _prediction_input(self, crop_names):
+        """ModelPredictor.predict_batch input for crop_names on this farm"""
+        return (
+            crop_names,
+            self.farm.location,
+            self._scoring_context().soil_data.texture,
+            self.farm.size_hectares,
+            self.weather.temperature_avg,
+            self.weather.rainfall_mm,
+        )
+    
+    def _predict_crops(self, crop_names):
+        """
+        Model predictions for crop_names (crops without one are left out); only
+        crops this request hasn't predicted yet go to the model, in one batch
+        """
+        context = self._scoring_context()
+        missing = [crop_name for crop_name in crop_names if crop_name not in context.predictions]
+        if missing:
+            predictions = self.model_predictor.predict_crops(*self._prediction_input(missing))
+            for crop_name in missing:
+                context.predictions[crop_name] = predictions.get(crop_name)
+        return {crop_name: context.predictions[crop_name] for crop_name in crop_names if context.predictions[crop_name]}
+    
+    @staticmethod
+    def predict_many(engines):
+        """
+        Make the model predictions of several engines (one per farm) up front, with
+        one batched model call per model snapshot instead of one per farm
+        """
+        by_predictor = defaultdict(list)
+        for engine in engines:
+            if engine.model_predictor and engine.model_predictor.models:
+                by_predictor[id(engine.model_predictor)].append((engine, engine._model_crops()))
+        for group in by_predictor.values():
+            model_predictor = group[0][0].model_predictor
+            results = model_predictor.predict_batch([engine._prediction_input(crop_names) for engine, crop_names in group])
+            for (engine, crop_names), predictions in zip(group, results):
+                context = engine._scoring_context()
+                for crop_name in crop_names:
+                    context.predictions[crop_name] = predictions.get(crop_name)
+    
+    def _soil_scores(self, crops):
+        """Soil scores against the request's soil sample, computed once per crop"""
+        context = self._scoring_context()
+        missing = list({crop.id: crop for crop in crops if crop.id not in context.soil_scores}.values())
+        if missing:
+            scores = self.calculate_soil_scores(missing, context.soil_data)
+            context.soil_scores.update(zip((crop.id for crop in missing), scores.tolist()))
+        return np.array([context.soil_scores[crop.id] for crop in crops], dtype=float)
+    
+    def _score_predictions(self, scored, weights, penalize):
+        """
+        Score columns (see scoring.score_model_predictions) for (crop, model
+        prediction) pairs, one row per pair
+        """
+        crops = [crop for crop, _ in scored]
+        return scoring.score_model_predictions(
+            scoring.crop_arrays(crops),
+            self._soil_scores(crops),
+            model_yield_per_ha=np.array([prediction.get('yield', 0) for _, prediction in scored], dtype=float),
+            model_price=np.array([prediction.get('price', 0) for _, prediction in scored], dtype=float),
+            model_risk=np.array([prediction.get('risk', 0) for _, prediction in scored], dtype=float),
+            farm_size=self.farm.size_hectares,
+            weights=weights,
+            penalize=penalize,
+        )
+    
+    def _advice_options(self):
+        """generate_advice_batch/iter_advice_batch keyword arguments from settings.AI_ADVICE"""
+        advice_config = {**AI_ADVICE_DEFAULTS, **getattr(settings, 'AI_ADVICE', {})}
+        return {'max_workers': advice_config['MAX_WORKERS'], 'deadline_seconds': advice_config['DEADLINE_SECONDS']}
+    
+    def _supplement_advice(self, structured_advice, crop, soil_score, yield_score, risk_score, profit_score,
+                           soil_data, market, recommended_area_ha, roi, profit_per_ha):
+        """If AI didn't generate enough advice, supplement with rule-based (skipping duplicate titles)"""
+        if len(structured_advice) < 3:
+            rule_based_advice = self.generate_structured_advice(
+                crop, soil_score, yield_score, risk_score, profit_score,
+                soil_data, market, recommended_area_ha, roi, profit_per_ha
+            )
+            # Merge advice, avoiding duplicates
+            existing_titles = {a.get('title', '') for a in structured_advice if isinstance(a, dict)}
+            for item in rule_based_advice:
+                if isinstance(item, dict) and item.get('title') not in existing_titles:
+                    structured_advice.append(item)
+        return structured_advice
+    
+    def generate_ai_advice(self, crop_name):
+        """
+        OpenAI advice for one recommended crop, generated on demand (for crops that
+        were given rule-based advice in get_recommendations). Only that crop is
+        predicted and scored. None if the crop isn't among this farm's recommendations.
+        """
+        model_predictor = self.model_predictor
+        if not model_predictor or not model_predictor.models:
+            return None
+        soil_data = self._scoring_context().soil_data
+        suitable_crops = model_predictor.get_soil_crop_pool().get(soil_data.texture, model_predictor.get_available_crops())
+        if crop_name not in suitable_crops:
+            return None
+        
+        # Same checks and scoring as get_recommendations, for this crop alone
+        crop = crop_catalog.get(crop_name)
+        if crop is None:
+            return None
+        prediction = self._predict_crops([crop_name]).get(crop_name)
+        if not prediction or prediction.get('yield', 0) <= 0:
+            return None
+        scored = [(crop, prediction)]
+        scores = scoring.rows(self._score_predictions(scored, scoring.RANKING_WEIGHTS, penalize=True), 1)[0]
+        _, advice_request, advice_input = self._recommendation_entry(crop, prediction, scores, soil_data)
+        # Through the batch path so the AI call gets the same deadline as any other
+        advice = self.ai_advice_generator.generate_advice_batch([advice_request], **self._advice_options())[0]
+        return self._supplement_advice(advice, *advice_input)
+    
+    def iter_deferred_advice(self):
+        """
+        Generate the advice left out by get_recommendations(defer_advice=True) and
+        analyze_intended_crop(defer_advice=True), yielding ((section, crop name), advice)
+        as each crop finishes. section is 'recommendations' or 'intended_crop'.
+        """
+        entries, self.deferred_advice = self.deferred_advice, []
+        requests = [request for _, request, _ in entries]
+        for index, advice in self.ai_advice_generator.iter_advice_batch(requests, **self._advice_options()):
+            key, _, inputs = entries[index]
+            yield key, self._supplement_advice(advice, *inputs)
+    
+    def _ai_advice_crops(self, results):
+        """Names of the crops that get OpenAI advice: the top AI_ADVICE['TOP_K'] by final_score plus the intended crop"""
+        top_k = {**AI_ADVICE_DEFAULTS, **getattr(settings, 'AI_ADVICE', {})}['TOP_K']
+        ranked = sorted(results, key=lambda x: x['final_score'], reverse=True)
+        ai_crops = {result['crop'] for result in ranked[:top_k]}
+        if self.farm.intended_crop_id is not None and self.farm.intended_crop:
+            ai_crops.add(self.farm.intended_crop.name)
+        return ai_crops
+    
+    def get_recommendations(self, defer_advice=False, ai_crops=None):
+        """
+        Enhanced Final Decision with confidence scoring using model predictions
+        With defer_advice, the ranked scores come back with empty advice lists and
+        the advice is generated later through iter_deferred_advice()
+        ai_crops overrides which crops get OpenAI advice (default: _ai_advice_crops);
+        every other crop gets rule-based advice, marked by 'advice_source'
+        """
+        results = []
+        soil_data = self._scoring_context().soil_data
 
         # Use model predictor for all predictions
-        model_predictor = get_model_predictor()
+        model_predictor = self.model_predictor
         if not model_predictor or not model_predictor.models:
             print("WARNING: Model not available, falling back to database")
             # Fallback to database if model not available
@@ -429,349 +310,201 @@ class SmartProductionPlanningEngine:
         # Get crops suitable for this soil type
         suitable_crops = soil_crop_pool.get(soil_data.texture, available_crops)
         
-        # Get crop objects from database for soil score calculation
-        from api.models import Crop as CropModel
+        # Crop rows for soil score calculation, from the in-process catalog (no per-crop queries)
+        crops_by_name = crop_catalog.get_many(suitable_crops)
         
-        # Analyze all suitable crops using model predictions
+        # Score every suitable crop in one batched model call
+        predictions = self._predict_crops(suitable_crops)
+        
+        # Crops the model can score
+        scored = []
         for crop_name in suitable_crops:
-            try:
-                crop = CropModel.objects.get(name=crop_name)
-            except CropModel.DoesNotExist:
+            crop = crops_by_name.get(crop_name)
+            if crop is None:
                 continue
             
             # Get model predictions
-            prediction = model_predictor.predict_crop(
-                crop_name=crop_name,
-                region_name=self.farm.location,
-                soil_type=soil_data.texture,
-                farm_size_ha=self.farm.size_hectares,
-                temperature_c=self.weather.temperature_avg,
-                rainfall_mm=self.weather.rainfall_mm
-            )
+            prediction = predictions.get(crop_name)
             
             if not prediction:
                 continue
             
-            # Extract model predictions
-            model_risk = prediction.get('risk', 0)  # Oversupply risk percentage
-            model_price = prediction.get('price', 0)  # Price per kg
-            model_yield_per_ha = prediction.get('yield', 0)  # Yield per hectare in tons
-            
             # Ensure yield is valid
+            model_yield_per_ha = prediction.get('yield', 0)  # Yield per hectare in tons
             if model_yield_per_ha <= 0:
                 print(f"ERROR: Invalid yield prediction {model_yield_per_ha} for {crop_name}, skipping")
                 continue
-            
-            # Calculate scores based on model predictions
-            soil_score = self.calculate_soil_score(crop, soil_data)
-            
-            # Yield score based on model prediction vs crop base yield
-            if crop.base_yield_per_ha > 0:
-                yield_ratio = model_yield_per_ha / crop.base_yield_per_ha
-                yield_score = min(100, max(0, yield_ratio * 100))
-            else:
-                yield_score = 50
-            
-            # Risk score from model (already in percentage)
-            risk_score = model_risk
-            
-            # Profitability from model predictions
-            # model_price is already in DA/kg (converted from DA/ton in model_predictor)
-            # model_yield_per_ha is in tons/ha, need to convert to kg/ha
-            revenue_per_ha = model_yield_per_ha * 1000 * model_price  # tons to kg, then multiply by price per kg
-            base_cost = 50000
-            if crop.water_requirement_mm > 500:
-                base_cost += 10000
-            if crop.growing_days > 150:
-                base_cost += 5000
-            profit_per_ha = revenue_per_ha - base_cost
-            roi = (profit_per_ha / base_cost) * 100 if base_cost > 0 else 0
-            
-            # Profit score
-            if roi >= 200:
-                profit_score = 100
-            elif roi >= 150:
-                profit_score = 90
-            elif roi >= 100:
-                profit_score = 80
-            elif roi >= 50:
-                profit_score = 65
-            elif roi >= 25:
-                profit_score = 50
-            elif roi >= 0:
-                profit_score = 35
-            else:
-                profit_score = max(0, 20 + roi)
-            
-            # Enhanced weighted scoring with dynamic weights
-            weights = {
-                'soil': 0.25,
-                'yield': 0.25,
-                'profit': 0.25,
-                'risk': 0.25
-            }
-            
-            # Apply strict penalties for unsuitable conditions
-            if soil_score < 40:
-                final_score = (
-                    weights['soil'] * soil_score * 0.5 +
-                    weights['yield'] * yield_score +
-                    weights['profit'] * profit_score -
-                    weights['risk'] * risk_score * 1.5
-                )
-            elif risk_score > 70:
-                final_score = (
-                    weights['soil'] * soil_score +
-                    weights['yield'] * yield_score +
-                    weights['profit'] * profit_score -
-                    weights['risk'] * risk_score * 1.8
-                )
-            else:
-                final_score = (
-                    weights['soil'] * soil_score +
-                    weights['yield'] * yield_score +
-                    weights['profit'] * profit_score -
-                    weights['risk'] * risk_score
-                )
-            
-            # Calculate confidence level
-            confidence = self._calculate_confidence(soil_score, yield_score, profit_score, risk_score)
-
-            # Enhanced weighted scoring with dynamic weights
-            # PRIORITIZE avoiding oversupply and unsuitable conditions
-            # Risk weight INCREASED to prevent oversupply
-            weights = {
-                'soil': 0.25,  # Reduced slightly
-                'yield': 0.25,
-                'profit': 0.25,  # Reduced slightly
-                'risk': 0.25  # INCREASED - prioritize avoiding oversupply
-            }
-            
-            # Apply strict penalties for unsuitable conditions
-            # If soil score is very low (<40), heavily penalize
-            if soil_score < 40:
-                final_score = (
-                    weights['soil'] * soil_score * 0.5 +  # Heavy penalty
-                    weights['yield'] * yield_score +
-                    weights['profit'] * profit_score -
-                    weights['risk'] * risk_score * 1.5  # Risk penalty amplified
-                )
-            # If risk is very high (>70), heavily penalize
-            elif risk_score > 70:
-                final_score = (
-                    weights['soil'] * soil_score +
-                    weights['yield'] * yield_score +
-                    weights['profit'] * profit_score -
-                    weights['risk'] * risk_score * 1.8  # Very heavy risk penalty
-                )
+            scored.append((crop, prediction))
+        
+        # Score them all at once. Weighted soil/yield/profit/risk, with strict penalties
+        # for poor soil and high oversupply risk (see scoring.final_scores)
+        score_rows = scoring.rows(self._score_predictions(scored, scoring.RANKING_WEIGHTS, penalize=True), len(scored))
+        
+        # Analyze all suitable crops using model predictions
+        advice_requests = []  # generate_crop_advice arguments, one per result
+        advice_inputs = []    # what the rule-based supplement needs, one per result
+        for (crop, prediction), scores in zip(scored, score_rows):
+            result, advice_request, advice_input = self._recommendation_entry(crop, prediction, scores, soil_data)
+            results.append(result)
+            advice_requests.append(advice_request)
+            advice_inputs.append(advice_input)
+        
+        # Only the best-ranked crops (and the farmer's intended crop) get OpenAI advice;
+        # the long tail gets rule-based advice now and AI advice on demand (CropAdviceView)
+        if ai_crops is None:
+            ai_crops = self._ai_advice_crops(results)
+        ai_entries = []
+        for result, request, inputs in zip(results, advice_requests, advice_inputs):
+            if result['crop'] in ai_crops:
+                result['advice_source'] = 'ai'
+                ai_entries.append((result, request, inputs))
             else:
-                final_score = (
-                    weights['soil'] * soil_score +
-                    weights['yield'] * yield_score +
-                    weights['profit'] * profit_score -
-                    weights['risk'] * risk_score
+                result['advice_source'] = 'rule_based'
+                result['advice'] = self._supplement_advice(
+                    self.ai_advice_generator.generate_crop_advice(*request, use_ai=False), *inputs
                 )
-            
-            # Calculate confidence level
-            confidence = self._calculate_confidence(soil_score, yield_score, profit_score, risk_score)
-            
-            # Calculate recommended planting area (more intelligent)
-            recommended_area_ha = self._calculate_optimal_area(
-                final_score, self.farm.size_hectares, risk_score, profit_per_ha
-            )
-            
-            # Calculate expected values from model predictions
-            expected_yield_tons = recommended_area_ha * model_yield_per_ha
-            # model_price is already in DA/kg, expected_yield_tons is in tons
-            expected_revenue = expected_yield_tons * 1000 * model_price  # tons to kg, then multiply by price per kg
-            expected_profit = expected_revenue - (recommended_area_ha * base_cost)
-            
-            # Generate AI-powered advice (with fallback to rule-based)
-            farm_data = {
-                'location': self.farm.location,
-                'size_hectares': self.farm.size_hectares,
-                'soil_type': soil_data.texture,
-                'ph_level': soil_data.ph_level
-            }
-            
-            analysis_scores = {
-                'soil': soil_score,
-                'yield': yield_score,
-                'profit': profit_score,
-                'risk': risk_score,
-                'final_score': final_score,
-                'roi': roi,
-                'profit_per_ha': profit_per_ha,
-                'ideal_ph': (crop.ideal_ph_min + crop.ideal_ph_max) / 2,
-                'water_requirement': crop.water_requirement_mm
-            }
-            
-            weather_data_dict = {
-                'rainfall_mm': self.weather.rainfall_mm,
-                'temperature_avg': self.weather.temperature_avg,
-                'humidity_avg': self.weather.humidity_avg
-            }
-            
-            # Use model predictions for market data
-            market_data_dict = {
-                'price_per_kg': model_price,
-                'demand_index': 1.0 - (model_risk / 100),  # Convert risk to demand index
-                'supply_volume_tons': 0  # Not used from model
-            }
-            
-            is_recommended = final_score >= 60
-            structured_advice = self.ai_advice_generator.generate_crop_advice(
-                crop.name,
-                farm_data,
-                analysis_scores,
-                weather_data_dict,
-                market_data_dict,
-                is_recommended
+        
+        if defer_advice:
+            # Scores go out now; iter_deferred_advice() produces the AI advice afterwards
+            for result, request, inputs in ai_entries:
+                self.deferred_advice.append((('recommendations', result['crop']), request, inputs))
+        else:
+            # Generate AI-powered advice for all gated crops at once (concurrent, with a
+            # deadline; crops that miss it get rule-based advice)
+            advice_lists = self.ai_advice_generator.generate_advice_batch(
+                [request for _, request, _ in ai_entries], **self._advice_options()
             )
-            
-            # If AI didn't generate enough advice, supplement with rule-based
-            if len(structured_advice) < 3:
-                # Create mock market data for rule-based advice
-                class MockMarketData:
-                    def __init__(self, price, risk):
-                        self.price_per_kg = price
-                        self.demand_index = 1.0 - (risk / 100)
-                        self.supply_volume_tons = 1000
-                
-                mock_market = MockMarketData(model_price, model_risk)
-                rule_based_advice = self.generate_structured_advice(
-                    crop, soil_score, yield_score, risk_score, profit_score, 
-                    soil_data, mock_market, recommended_area_ha, roi, profit_per_ha
-                )
-                # Merge advice, avoiding duplicates
-                existing_titles = {a.get('title', '') for a in structured_advice if isinstance(a, dict)}
-                for item in rule_based_advice:
-                    if isinstance(item, dict) and item.get('title') not in existing_titles:
-                        structured_advice.append(item)
-
-            results.append({
-                "crop": crop.name,
-                "final_score": round(final_score, 1),
-                "confidence": confidence,
-                "advice": structured_advice,
-                "details": {
-                    "price_forecast": round(model_price, 2),  # From model
-                    "yield_per_ha": round(model_yield_per_ha, 2),  # From model (tons/ha)
-                    "oversupply_risk": round(risk_score, 1),  # From model
-                    # Keep these for other parts of the UI
-                    "soil_suitability": round(soil_score, 1),
-                    "yield_forecast": round(yield_score, 1),
-                    "profitability": round(profit_score, 1),
-                    "roi_percent": round(roi, 1),
-                    "profit_per_ha": round(profit_per_ha, 0),
-                    "recommended_area_ha": round(recommended_area_ha, 2),
-                    "expected_yield_tons": round(expected_yield_tons, 2),
-                    "expected_revenue_da": round(expected_revenue, 2),
-                    "expected_profit_da": round(expected_profit, 2)
-                }
-            })
+            for (result, _, inputs), structured_advice in zip(ai_entries, advice_lists):
+                result['advice'] = self._supplement_advice(structured_advice, *inputs)
             
         # Sort by final score
         results.sort(key=lambda x: x['final_score'], reverse=True)
         return results
     
+    def _recommendation_entry(self, crop, prediction, scores, soil_data):
+        """
+        (result, generate_crop_advice arguments, rule-based supplement inputs) for
+        one model-scored crop; result's advice is left empty
+        """
+        # Extract model predictions
+        model_risk = prediction.get('risk', 0)  # Oversupply risk percentage
+        model_price = prediction.get('price', 0)  # Price per kg
+        model_yield_per_ha = prediction.get('yield', 0)  # Yield per hectare in tons
+        
+        soil_score = scores['soil']
+        yield_score = scores['yield']
+        profit_score = scores['profit']
+        risk_score = scores['risk']  # From model (already in percentage)
+        profit_per_ha = scores['profit_per_ha']
+        roi = scores['roi']
+        final_score = scores['final_score']
+        confidence = scores['confidence']
+        recommended_area_ha = scores['recommended_area_ha']
+        expected_yield_tons = scores['expected_yield_tons']
+        expected_revenue = scores['expected_revenue']
+        expected_profit = scores['expected_profit']
+        
+        # Generate AI-powered advice (with fallback to rule-based)
+        farm_data = {
+            'location': self.farm.location,
+            'climate_class': self._farm_climate_class(),
+            'size_hectares': self.farm.size_hectares,
+            'soil_type': soil_data.texture,
+            'ph_level': soil_data.ph_level
+        }
+        
+        analysis_scores = {
+            'soil': soil_score,
+            'yield': yield_score,
+            'profit': profit_score,
+            'risk': risk_score,
+            'final_score': final_score,
+            'roi': roi,
+            'profit_per_ha': profit_per_ha,
+            'ideal_ph': (crop.ideal_ph_min + crop.ideal_ph_max) / 2,
+            'water_requirement': crop.water_requirement_mm
+        }
+        
+        weather_data_dict = {
+            'rainfall_mm': self.weather.rainfall_mm,
+            'temperature_avg': self.weather.temperature_avg,
+            'humidity_avg': self.weather.humidity_avg
+        }
+        
+        # Use model predictions for market data
+        market_data_dict = {
+            'price_per_kg': model_price,
+            'demand_index': 1.0 - (model_risk / 100),  # Convert risk to demand index
+            'supply_volume_tons': 0  # Not used from model
+        }
+        
+        is_recommended = final_score >= 60
+        advice_request = (
+            crop.name,
+            farm_data,
+            analysis_scores,
+            weather_data_dict,
+            market_data_dict,
+            is_recommended
+        )
+        advice_input = (
+            crop, soil_score, yield_score, risk_score, profit_score,
+            soil_data, MockMarketData(model_price, model_risk), recommended_area_ha, roi, profit_per_ha
+        )
+
+        result = {
+            "crop": crop.name,
+            "final_score": round(final_score, 1),
+            "confidence": confidence,
+            "advice": [],  # filled in by get_recommendations (or later, by the advice job, when deferred)
+            "details": {
+                "price_forecast": round(model_price, 2),  # From model
+                "yield_per_ha": round(model_yield_per_ha, 2),  # From model (tons/ha)
+                "oversupply_risk": round(risk_score, 1),  # From model
+                # Keep these for other parts of the UI
+                "soil_suitability": round(soil_score, 1),
+                "yield_forecast": round(yield_score, 1),
+                "profitability": round(profit_score, 1),
+                "roi_percent": round(roi, 1),
+                "profit_per_ha": round(profit_per_ha, 0),
+                "recommended_area_ha": round(recommended_area_ha, 2),
+                "expected_yield_tons": round(expected_yield_tons, 2),
+                "expected_revenue_da": round(expected_revenue, 2),
+                "expected_profit_da": round(expected_profit, 2)
+            }
+        }
+        return result, advice_request, advice_input
+    
     def _get_recommendations_from_db(self, soil_data):
         """Fallback method using database if model not available"""
         results = []
-        for m_data in self.market:
+        market_rows = list(self.market)
+        score_rows = scoring.rows(self._score_market_rows(market_rows, soil_data, scoring.RANKING_WEIGHTS), len(market_rows))
+        for m_data, scores in zip(market_rows, score_rows):
             crop = m_data.crop
-            soil_score = self.calculate_soil_score(crop, soil_data)
-            yield_score = self.calculate_yield_score(crop)
-            risk_score = self.calculate_risk_score(m_data)
-            profit_score, profit_per_ha, roi = self.calculate_profitability(crop, yield_score, m_data)
-            
-            weights = {'soil': 0.25, 'yield': 0.25, 'profit': 0.25, 'risk': 0.25}
-            final_score = (
-                weights['soil'] * soil_score +
-                weights['yield'] * yield_score +
-                weights['profit'] * profit_score -
-                weights['risk'] * risk_score
-            )
-            
-            confidence = self._calculate_confidence(soil_score, yield_score, profit_score, risk_score)
-            recommended_area_ha = self._calculate_optimal_area(
-                final_score, self.farm.size_hectares, risk_score, profit_per_ha
-            )
-            expected_yield_tons = recommended_area_ha * crop.base_yield_per_ha * (yield_score / 100.0)
-            expected_revenue = expected_yield_tons * 1000 * m_data.price_per_kg
-            expected_profit = expected_revenue - (recommended_area_ha * 50000)
-            
             results.append({
                 "crop": crop.name,
-                "final_score": round(final_score, 1),
-                "confidence": confidence,
+                "final_score": round(scores['final_score'], 1),
+                "confidence": scores['confidence'],
                 "advice": [],
                 "details": {
-                    "soil_suitability": round(soil_score, 1),
-                    "yield_forecast": round(yield_score, 1),
-                    "profitability": round(profit_score, 1),
-                    "oversupply_risk": round(risk_score, 1),
-                    "roi_percent": round(roi, 1),
-                    "profit_per_ha": round(profit_per_ha, 0),
+                    "soil_suitability": round(scores['soil'], 1),
+                    "yield_forecast": round(scores['yield'], 1),
+                    "profitability": round(scores['profit'], 1),
+                    "oversupply_risk": round(scores['risk'], 1),
+                    "roi_percent": round(scores['roi'], 1),
+                    "profit_per_ha": round(scores['profit_per_ha'], 0),
                     "price_forecast": round(m_data.price_per_kg, 2),
-                    "recommended_area_ha": round(recommended_area_ha, 2),
-                    "expected_yield_tons": round(expected_yield_tons, 2),
-                    "expected_revenue_da": round(expected_revenue, 2),
-                    "expected_profit_da": round(expected_profit, 2)
+                    "recommended_area_ha": round(scores['recommended_area_ha'], 2),
+                    "expected_yield_tons": round(scores['expected_yield_tons'], 2),
+                    "expected_revenue_da": round(scores['expected_revenue'], 2),
+                    "expected_profit_da": round(scores['expected_profit'], 2)
                 }
             })
         
         results.sort(key=lambda x: x['final_score'], reverse=True)
         return results
 
-    def _calculate_confidence(self, soil_score, yield_score, profit_score, risk_score):
-        """Calculate confidence level in recommendation"""
-        # High confidence if all factors are consistent
-        scores = [soil_score, yield_score, profit_score]
-        score_variance = sum((s - sum(scores)/len(scores))**2 for s in scores) / len(scores)
-        
-        avg_score = sum(scores) / len(scores)
-        risk_penalty = risk_score * 0.3
-        
-        if avg_score >= 80 and risk_score < 30 and score_variance < 400:
-            return "high"
-        elif avg_score >= 65 and risk_score < 50:
-            return "medium"
-        else:
-            return "low"
-
-    def _calculate_optimal_area(self, final_score, farm_size, risk_score, profit_per_ha):
-        """Intelligently calculate optimal planting area"""
-        # Base recommendation: 70% of farm for top crops
-        base_percentage = 0.7
-        
-        # Adjust based on score
-        if final_score >= 80:
-            percentage = base_percentage * 1.0
-        elif final_score >= 70:
-            percentage = base_percentage * 0.85
-        elif final_score >= 60:
-            percentage = base_percentage * 0.70
-        elif final_score >= 50:
-            percentage = base_percentage * 0.50
-        else:
-            percentage = base_percentage * 0.30
-        
-        # Risk adjustment
-        if risk_score > 70:
-            percentage *= 0.5  # Reduce by 50% if high risk
-        elif risk_score > 50:
-            percentage *= 0.75  # Reduce by 25% if moderate risk
-        
-        # Profitability adjustment
-        if profit_per_ha > 200000:
-            percentage = min(0.9, percentage * 1.1)  # Increase if very profitable
-        elif profit_per_ha < 50000:
-            percentage *= 0.8  # Decrease if low profit
-        
-        recommended = farm_size * percentage * (final_score / 100)
-        return max(0.1, min(farm_size * 0.9, recommended))  # Between 0.1ha and 90% of farm
-
     def generate_structured_advice(self, crop, soil_score, yield_score, risk_score, profit_score,
                                    soil_data, market_data, recommended_area_ha, roi, profit_per_ha):
         """
@@ -939,28 +672,20 @@ class SmartProductionPlanningEngine:
         }
         return priorities.get(category, 5)
 
-    def analyze_intended_crop(self, intended_crop, market_data):
+    def analyze_intended_crop(self, intended_crop, market_data, defer_advice=False, use_ai=True):
         """
         Analyze the crop the farmer wants to plant
         Returns analysis and suggests alternatives if not recommended
+        With defer_advice, 'advice' is left empty for iter_deferred_advice() to fill;
+        use_ai=False gives it rule-based advice
         """
-        # Get soil data
-        soil_data = self.farm.soil_samples.last()
-        if not soil_data:
-            class MockSoil:
-                def __init__(self, texture):
-                    self.texture = texture
-                    self.ph_level = 6.5
-                    self.nitrogen = 1.5
-                    self.phosphorus = 0.8
-                    self.potassium = 1.0
-            
-            soil_data = MockSoil(self.farm.soil_type)
+        # Get soil data (shared with get_recommendations through the scoring context)
+        soil_data = self._scoring_context().soil_data
         
         # Find market data for intended crop (needed for AI advice generation)
         crop_market_data = None
         for m_data in market_data:
-            if m_data.crop.id == intended_crop.id:
+            if m_data.crop_id == intended_crop.id:
                 crop_market_data = m_data
                 break
         
@@ -974,29 +699,19 @@ class SmartProductionPlanningEngine:
             }
         
         # Use model predictions for intended crop
-        model_predictor = get_model_predictor()
+        model_predictor = self.model_predictor
         if not model_predictor or not model_predictor.models:
             # Fallback to database if model not available
             # Calculate scores for intended crop (fallback)
-            soil_score = self.calculate_soil_score(intended_crop, soil_data)
-            yield_score = self.calculate_yield_score(intended_crop)
-            risk_score = self.calculate_risk_score(crop_market_data)
-            profit_score, profit_per_ha, roi = self.calculate_profitability(intended_crop, yield_score, crop_market_data)
+            scores = scoring.rows(self._score_market_rows([crop_market_data], soil_data, scoring.INTENDED_CROP_WEIGHTS), 1)[0]
             
             # Use fallback values
-            model_risk = risk_score
+            model_risk = scores['risk']
             model_price = crop_market_data.price_per_kg
-            model_yield_per_ha = intended_crop.base_yield_per_ha * (yield_score / 100.0)
+            model_yield_per_ha = intended_crop.base_yield_per_ha * (scores['yield'] / 100.0)
         else:
-            # Get model predictions
-            prediction = model_predictor.predict_crop(
-                crop_name=intended_crop.name,
-                region_name=self.farm.location,
-                soil_type=soil_data.texture,
-                farm_size_ha=self.farm.size_hectares,
-                temperature_c=self.weather.temperature_avg,
-                rainfall_mm=self.weather.rainfall_mm
-            )
+            # Get model predictions (already made if get_recommendations ranked this crop)
+            prediction = self._predict_crops([intended_crop.name]).get(intended_crop.name)
             
             if not prediction:
                 return {
@@ -1012,70 +727,32 @@ class SmartProductionPlanningEngine:
             model_price = prediction.get('price', 0)  # Price per kg
             model_yield_per_ha = prediction.get('yield', 0)  # Yield per hectare in tons
             
-            # Calculate scores for final_score calculation (still needed for recommendation logic)
-            soil_score = self.calculate_soil_score(intended_crop, soil_data)
-            
-            # Yield score based on model prediction
-            if intended_crop.base_yield_per_ha > 0:
-                yield_ratio = model_yield_per_ha / intended_crop.base_yield_per_ha
-                yield_score = min(100, max(0, yield_ratio * 100))
-            else:
-                yield_score = 50
-            
-            # Profitability from model predictions
-            # model_price is already in DA/kg (converted from DA/ton in model_predictor)
-            # model_yield_per_ha is in tons/ha, need to convert to kg/ha
-            revenue_per_ha = model_yield_per_ha * 1000 * model_price  # tons to kg, then multiply by price per kg
-            base_cost = 50000
-            if intended_crop.water_requirement_mm > 500:
-                base_cost += 10000
-            if intended_crop.growing_days > 150:
-                base_cost += 5000
-            profit_per_ha = revenue_per_ha - base_cost
-            roi = (profit_per_ha / base_cost) * 100 if base_cost > 0 else 0
-            
-            # Profit score for final_score calculation
-            if roi >= 200:
-                profit_score = 100
-            elif roi >= 150:
-                profit_score = 90
-            elif roi >= 100:
-                profit_score = 80
-            elif roi >= 50:
-                profit_score = 65
-            elif roi >= 25:
-                profit_score = 50
-            elif roi >= 0:
-                profit_score = 35
-            else:
-                profit_score = max(0, 20 + roi)
-            
-            risk_score = model_risk
-        
-        # Calculate final score
-        weights = {'soil': 0.30, 'yield': 0.25, 'profit': 0.30, 'risk': 0.15}
-        final_score = (
-            weights['soil'] * soil_score +
-            weights['yield'] * yield_score +
-            weights['profit'] * profit_score -
-            weights['risk'] * risk_score
-        )
+            # Scores for final_score calculation (still needed for recommendation logic)
+            scores = scoring.rows(
+                self._score_predictions([(intended_crop, prediction)], scoring.INTENDED_CROP_WEIGHTS, penalize=False), 1
+            )[0]
+        
+        soil_score = scores['soil']
+        yield_score = scores['yield']
+        profit_score = scores['profit']
+        risk_score = scores['risk']
+        profit_per_ha = scores['profit_per_ha']
+        roi = scores['roi']
+        final_score = scores['final_score']
+        confidence = scores['confidence']
+        # Planting area for the intended crop
+        recommended_area_ha = scores['recommended_area_ha']
         
         # Determine if recommended based on oversupply risk threshold
         # Crop is recommended if oversupply risk is below threshold (e.g., 50%)
         # It doesn't need to be the best option, just needs low risk
         OVERSUPPLY_RISK_THRESHOLD = 50  # Percentage threshold
         is_recommended = model_risk < OVERSUPPLY_RISK_THRESHOLD
-        confidence = self._calculate_confidence(soil_score, yield_score, profit_score, risk_score)
-        
-        # Generate advice for intended crop
-        recommended_area_ha = self._calculate_optimal_area(
-            final_score, self.farm.size_hectares, risk_score, profit_per_ha
-        )
         
         # Use AI to generate detailed, contextual advice about why this crop is good/bad
         farm_data = {
             'location': self.farm.location,
+            'climate_class': self._farm_climate_class(),
             'size_hectares': self.farm.size_hectares,
             'soil_type': soil_data.texture,
             'ph_level': soil_data.ph_level
@@ -1111,7 +788,7 @@ class SmartProductionPlanningEngine:
         }
         
         # Generate AI-powered advice
-        advice = self.ai_advice_generator.generate_crop_advice(
+        advice_request = (
             intended_crop.name,
             farm_data,
             analysis_scores,
@@ -1119,25 +796,24 @@ class SmartProductionPlanningEngine:
             market_data_dict,
             is_recommended
         )
-        
-        # If AI didn't generate enough advice, supplement with rule-based
-        if len(advice) < 3:
-            rule_based_advice = self.generate_structured_advice(
-                intended_crop, soil_score, yield_score, risk_score, profit_score,
-                soil_data, crop_market_data, recommended_area_ha, roi, profit_per_ha
+        advice_inputs = (
+            intended_crop, soil_score, yield_score, risk_score, profit_score,
+            soil_data, crop_market_data, recommended_area_ha, roi, profit_per_ha
+        )
+        if defer_advice:
+            advice = []
+            self.deferred_advice.append((('intended_crop', intended_crop.name), advice_request, advice_inputs))
+        else:
+            advice = self._supplement_advice(
+                self.ai_advice_generator.generate_crop_advice(*advice_request, use_ai=use_ai), *advice_inputs
             )
-            # Merge advice, avoiding duplicates
-            existing_titles = {a.get('title', '') for a in advice if isinstance(a, dict)}
-            for item in rule_based_advice:
-                if isinstance(item, dict) and item.get('title') not in existing_titles:
-                    advice.append(item)
         
         # Get alternative recommendations using model predictions
         alternatives = []
         
         if not is_recommended or final_score < 70:
             # Use model to predict alternatives
-            model_predictor = get_model_predictor()
+            model_predictor = self.model_predictor
             if model_predictor and model_predictor.models:
                 # Get available crops from model
                 available_crops = model_predictor.get_available_crops()
@@ -1151,7 +827,7 @@ class SmartProductionPlanningEngine:
                 temp = self.weather.temperature_avg
                 rain = self.weather.rainfall_mm
                 
-                candidate_crops = []
+                alternative_names = []
                 for crop_name in suitable_crops:
                     if crop_name == intended_crop.name:
                         continue
@@ -1160,60 +836,37 @@ class SmartProductionPlanningEngine:
                     wr = weather_ranges.get(crop_name)
                     if wr and not (wr['T_min'] <= temp <= wr['T_max'] and wr['R_min'] <= rain <= wr['R_max']):
                         continue
-                    
-                    # Predict using model
-                    prediction = model_predictor.predict_crop(
-                        crop_name=crop_name,
-                        region_name=self.farm.location,
-                        soil_type=soil_data.texture,
-                        farm_size_ha=self.farm.size_hectares,
-                        temperature_c=temp,
-                        rainfall_mm=rain
-                    )
-                    
-                    if prediction:
-                        # Calculate score from model predictions
-                        model_risk = prediction['risk']
-                        model_price = prediction['price']
-                        model_yield = prediction['yield']
-                        
-                        # Convert to scores (0-100)
-                        risk_score_alt = model_risk  # Already in percentage
-                        price_score = min(100, (model_price / 200) * 100) if model_price > 0 else 0
-                        yield_score_alt = min(100, (model_yield / 50) * 100) if model_yield > 0 else 0
-                        
-                        # Use same soil score calculation
-                        from api.models import Crop as CropModel
-                        try:
-                            alt_crop_obj = CropModel.objects.get(name=crop_name)
-                            soil_score_alt = self.calculate_soil_score(alt_crop_obj, soil_data)
-                        except:
-                            soil_score_alt = 70  # Default if crop not in DB
-                        
-                        # Calculate profit score
-                        profit_per_ha_alt = (model_yield * model_price * 1000) - 50000
-                        roi_alt = (profit_per_ha_alt / 50000) * 100 if profit_per_ha_alt > 0 else 0
-                        profit_score_alt = min(100, max(0, 20 + roi_alt))
-                        
-                        # Calculate final score
-                        weights = {'soil': 0.30, 'yield': 0.25, 'profit': 0.30, 'risk': 0.15}
-                        alt_final_score = (
-                            weights['soil'] * soil_score_alt +
-                            weights['yield'] * yield_score_alt +
-                            weights['profit'] * profit_score_alt -
-                            weights['risk'] * risk_score_alt
-                        )
-                        
-                        if alt_final_score > final_score:
-                            candidate_crops.append({
-                                'crop': crop_name,
-                                'score': alt_final_score,
-                                'risk': model_risk,
-                                'price': model_price,
-                                'yield': model_yield,
-                                'roi': roi_alt,
-                                'profit_per_ha': profit_per_ha_alt
-                            })
+                    alternative_names.append(crop_name)
+                
+                # Predict the weather-compatible alternatives get_recommendations hasn't, in one batched model call
+                alternative_predictions = self._predict_crops(alternative_names)
+                
+                alternative_crops = crop_catalog.get_many(alternative_names)
+                alternative_soil_scores = dict(zip(
+                    alternative_crops, self._soil_scores(list(alternative_crops.values())).tolist()
+                ))
+                candidate_names = [crop_name for crop_name in alternative_names if alternative_predictions.get(crop_name)]
+                candidate_predictions = [alternative_predictions[crop_name] for crop_name in candidate_names]
+                # Crops the model knows but the database doesn't get a neutral soil score
+                alternative_scores = scoring.rows(scoring.score_alternatives(
+                    np.array([alternative_soil_scores.get(crop_name, 70) for crop_name in candidate_names], dtype=float),
+                    np.array([prediction['yield'] for prediction in candidate_predictions], dtype=float),
+                    np.array([prediction['price'] for prediction in candidate_predictions], dtype=float),
+                    np.array([prediction['risk'] for prediction in candidate_predictions], dtype=float),
+                ), len(candidate_names))
+                candidate_crops = [
+                    {
+                        'crop': crop_name,
+                        'score': scores['final_score'],
+                        'risk': prediction['risk'],
+                        'price': prediction['price'],
+                        'yield': prediction['yield'],
+                        'roi': scores['roi'],
+                        'profit_per_ha': scores['profit_per_ha']
+                    }
+                    for crop_name, prediction, scores in zip(candidate_names, candidate_predictions, alternative_scores)
+                    if scores['final_score'] > final_score
+                ]
                 
                 # Sort by score and take top 3
                 candidate_crops.sort(key=lambda x: x['score'], reverse=True)
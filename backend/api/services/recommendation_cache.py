@@ -0,0 +1,58 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+
+# Cached recommendations are keyed by a fingerprint of everything they were computed
+# from, read from the database on every lookup: the farm row (and its region's
+# climate class), its latest soil sample, the Crop table and the market data. A write
+# from any process therefore changes the key, without relying on signals or on the
+# cache being shared. Model reloads change the model version, also in the key.
+SOIL_FIELDS = ('id', 'date_tested', 'ph_level', 'nitrogen', 'phosphorus', 'potassium',
+               'organic_matter', 'salinity', 'texture')
+CROP_FIELDS = ('id', 'name', 'ideal_ph_min', 'ideal_ph_max', 'water_requirement_mm',
+               'growing_days', 'base_yield_per_ha')
+
+
+def _data_markers(farm, market_data):
+    """
+    The database state a farm's recommendations depend on. market_data is the
+    (already evaluated) MarketData queryset the view hands the engine, if any
+    """
+    from api.models import Crop, MarketData
+    if market_data is None:
+        market_data = MarketData.objects.all()
+    region = farm.region if farm.region_id else None
+    return (
+        (farm.location, farm.region_id, getattr(region, 'climate_class', None), farm.size_hectares,
+         farm.soil_type, farm.intended_crop_id),
+        # The engine scores the last sample by pk (farm.soil_samples.last())
+        farm.soil_samples.values_list(*SOIL_FIELDS).last(),
+        tuple(Crop.objects.order_by('id').values_list(*CROP_FIELDS)),
+        tuple(sorted((m.id, m.crop_id, m.date, m.price_per_kg, m.demand_index, m.supply_volume_tons)
+                     for m in market_data)),
+    )
+
+
+def recommendation_cache_key(farm, weather, model_version, language, market_data=None):
+    """
+    Cache key for a farm's recommendations: a fingerprint of the farm, soil,
+    crop and market data (see _data_markers), the weather row, the model
+    version and the language
+    """
+    fingerprint = repr((
+        farm.id,
+        _data_markers(farm, market_data),
+        weather.id, str(weather.date), weather.rainfall_mm, weather.temperature_avg,
+        weather.humidity_avg, weather.sunshine_hours,
+        model_version,
+        language,
+    ))
+    return "recommendations:" + hashlib.sha256(fingerprint.encode()).hexdigest()
+
+
+def get_cached_recommendations(key):
+    return cache.get(key)
+
+
+def cache_recommendations(key, response_data):
+    cache.set(key, response_data, getattr(settings, 'RECOMMENDATION_CACHE_TTL_SECONDS', 900))
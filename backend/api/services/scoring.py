@@ -0,0 +1,382 @@
+import numpy as np
+
+# Soil texture -> suitability by crop water need (unknown textures score 70)
+TEXTURE_SUITABILITY = {
+    'Loam': {'high_water': 100, 'medium_water': 100, 'low_water': 95},
+    'Clay': {'high_water': 90, 'medium_water': 85, 'low_water': 70},
+    'Silt': {'high_water': 95, 'medium_water': 90, 'low_water': 85},
+    'Sand': {'high_water': 60, 'medium_water': 75, 'low_water': 90}
+}
+
+# Soil texture -> water retention capacity (unknown textures 0.6)
+RETENTION_CAPACITY = {
+    'Clay': 0.9,
+    'Loam': 0.8,
+    'Silt': 0.75,
+    'Sand': 0.4
+}
+
+# Final score weights (soil, yield, profit, risk)
+RANKING_WEIGHTS = {'soil': 0.25, 'yield': 0.25, 'profit': 0.25, 'risk': 0.25}
+INTENDED_CROP_WEIGHTS = {'soil': 0.30, 'yield': 0.25, 'profit': 0.30, 'risk': 0.15}
+
+BASE_COST_PER_HA = 50000
+
+
+def _select(conditions, choices, default):
+    """np.select (first true condition wins) from chained np.where, far cheaper on short arrays"""
+    result = default
+    for condition, choice in zip(reversed(conditions), reversed(choices)):
+        result = np.where(condition, choice, result)
+    return result
+
+
+def crop_arrays(crops):
+    """Column arrays of the Crop attributes the kernel reads, one row per crop"""
+    return {
+        'ideal_ph_min': np.array([crop.ideal_ph_min for crop in crops], dtype=float),
+        'ideal_ph_max': np.array([crop.ideal_ph_max for crop in crops], dtype=float),
+        'water_requirement_mm': np.array([crop.water_requirement_mm for crop in crops], dtype=float),
+        'growing_days': np.array([crop.growing_days for crop in crops], dtype=float),
+        'base_yield_per_ha': np.array([crop.base_yield_per_ha for crop in crops], dtype=float),
+    }
+
+
+def climate_penalties(water_requirement_mm, has_requirements, desert_suitable, max_temp, min_rainfall,
+                      soil_penalty, is_desert, is_semi_desert, soil_texture, temperature, rainfall):
+    """
+    Regional climate penalty per crop (0 = suitable). Crops with requirements are
+    checked against them; the others only get the general desert rules.
+    """
+    # Crops without specific requirements
+    general = np.zeros_like(water_requirement_mm)
+    if is_desert:
+        general = general + np.where(water_requirement_mm > 400, 50, 0)
+        if soil_texture == 'Sand':
+            general = general + np.where(water_requirement_mm > 300, 30, 0)
+
+    # Crops with requirements: desert, temperature, rainfall and soil checks in that order
+    specific = np.zeros_like(water_requirement_mm)
+    if is_desert or is_semi_desert:
+        specific = specific + np.where(desert_suitable, 0, 60)
+    specific = specific + np.where(temperature > max_temp, np.minimum(40, (temperature - max_temp) * 5), 0)
+    specific = specific + np.where(rainfall < min_rainfall, np.minimum(50, (min_rainfall - rainfall) / 10), 0)
+    specific = specific + soil_penalty
+
+    return np.where(has_requirements, specific, general)
+
+
+def nutrient_score(soil_data):
+    """Nutrient availability of a soil sample (the same for every crop)"""
+    score = 70  # Base score
+
+    # Nitrogen (ideal: 1.5-2.5%)
+    if 1.5 <= soil_data.nitrogen <= 2.5:
+        score += 10
+    elif soil_data.nitrogen < 1.0:
+        score -= 15
+
+    # Phosphorus (ideal: 0.8-1.2%)
+    if 0.8 <= soil_data.phosphorus <= 1.2:
+        score += 10
+    elif soil_data.phosphorus < 0.5:
+        score -= 10
+
+    # Potassium (ideal: 1.0-1.5%)
+    if 1.0 <= soil_data.potassium <= 1.5:
+        score += 10
+
+    return max(0, min(100, score))
+
+
+def soil_scores(crops, soil_data, climate_penalty):
+    """
+    Soil suitability per crop: climate penalty, pH (40%), texture (30%),
+    water retention (20%) and nutrients (10%, when the sample has them)
+    """
+    ph_min, ph_max = crops['ideal_ph_min'], crops['ideal_ph_max']
+    water = crops['water_requirement_mm']
+    ph = soil_data.ph_level
+
+    score = 100.0 - climate_penalty
+
+    # 1. pH: penalties outside the ideal range, a bonus close to its center
+    ph_diff = np.abs(ph - (ph_min + ph_max) / 2)
+    score = np.where(
+        ph < ph_min, score - np.minimum(40, (ph_min - ph) * 15),
+        np.where(ph > ph_max, score - np.minimum(40, (ph - ph_max) * 15),
+                 np.where(ph_diff < (ph_max - ph_min) * 0.2, score + 5, score))
+    )
+
+    # 2. Texture compatibility by water need
+    suitability = TEXTURE_SUITABILITY.get(soil_data.texture, {})
+    texture_score = _select(
+        [water > 500, water < 300],
+        [suitability.get('high_water', 70), suitability.get('low_water', 70)],
+        suitability.get('medium_water', 70)
+    )
+    score = (score * 0.7) + (texture_score * 0.3)
+
+    # 3. Water retention against the crop's need (normalized to 600mm)
+    retention = RETENTION_CAPACITY.get(soil_data.texture, 0.6)
+    water_need_ratio = water / 600
+    retention_score = _select(
+        [retention >= water_need_ratio * 0.8, retention >= water_need_ratio * 0.6, retention >= water_need_ratio * 0.4],
+        [100, 80, 60],
+        40
+    )
+    score = (score * 0.8) + (retention_score * 0.2)
+
+    # 4. Nutrients
+    if hasattr(soil_data, 'nitrogen') and soil_data.nitrogen:
+        score = (score * 0.9) + (nutrient_score(soil_data) * 0.1)
+
+    return np.maximum(0, np.minimum(100, score))
+
+
+def weather_yield_scores(crops, weather):
+    """
+    Yield outlook per crop from the weather alone: rainfall (40%), temperature (30%),
+    growing season (20%), humidity and sunshine (10%)
+    """
+    water = crops['water_requirement_mm']
+    growing_days = crops['growing_days']
+
+    # Rainfall against the crop's requirement
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(water > 0, weather.rainfall_mm / water, 0)
+    rainfall_score = _select(
+        [(0.9 <= ratio) & (ratio <= 1.1), (0.8 <= ratio) & (ratio <= 1.2), (0.7 <= ratio) & (ratio <= 1.3),
+         (0.6 <= ratio) & (ratio <= 1.4), (0.5 <= ratio) & (ratio <= 1.5), ratio < 0.5],
+        [100, 90, 75, 60, 45, np.maximum(20, 30 - (0.5 - ratio) * 40)],
+        np.maximum(20, 30 - (ratio - 1.5) * 20)
+    )
+
+    # Temperature (most crops prefer 18-25°C; the same for every crop)
+    temp = weather.temperature_avg
+    if 18 <= temp <= 25:
+        temp_score = 100
+    elif 15 <= temp < 18 or 25 < temp <= 28:
+        temp_score = 85
+    elif 12 <= temp < 15 or 28 < temp <= 32:
+        temp_score = 65
+    elif 10 <= temp < 12 or 32 < temp <= 35:
+        temp_score = 45
+    else:
+        temp_score = 25
+
+    # Growing season against 180 available days
+    available_days = 180
+    season_score = _select(
+        [growing_days <= available_days * 0.9, growing_days <= available_days, growing_days <= available_days * 1.1],
+        [100, 85, 70],
+        50
+    )
+
+    # Humidity (optimal 60-70%) and sunshine (8+ hours)
+    humidity_score = 100 - abs(weather.humidity_avg - 65) * 2
+    sunshine_score = min(100, weather.sunshine_hours * 10)
+    climate_score = (humidity_score * 0.5 + sunshine_score * 0.5)
+
+    total_score = rainfall_score * 0.4 + temp_score * 0.3 + season_score * 0.2 + climate_score * 0.1
+    return np.maximum(0, np.minimum(100, total_score))
+
+
+def model_yield_scores(crops, model_yield_per_ha):
+    """Yield score per crop from the model's yield against the crop's base yield"""
+    base_yield = crops['base_yield_per_ha']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        yield_ratio = model_yield_per_ha / base_yield
+    return np.where(base_yield > 0, np.minimum(100, np.maximum(0, yield_ratio * 100)), 50)
+
+
+def base_costs(crops):
+    """Cost per ha: the base, plus irrigation for thirsty crops and labor for long seasons"""
+    return (BASE_COST_PER_HA
+            + np.where(crops['water_requirement_mm'] > 500, 10000, 0)
+            + np.where(crops['growing_days'] > 150, 5000, 0))
+
+
+def profit_scores(roi):
+    """ROI (%) -> 0-100 profitability score"""
+    return _select(
+        [roi >= 200, roi >= 150, roi >= 100, roi >= 50, roi >= 25, roi >= 0],
+        [100, 90, 80, 65, 50, 35],
+        np.maximum(0, 20 + roi)  # Negative ROI
+    )
+
+
+def market_risk_scores(price_per_kg, demand_index, supply_volume_tons, is_lettuce):
+    """
+    Oversupply risk per market row: supply/demand (60%), price volatility (25%),
+    demand trend (15%), plus the extra lettuce penalty
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        supply_demand_ratio = np.where(demand_index > 0, supply_volume_tons / (demand_index * 1000), 2.0)
+
+    base_risk = _select(
+        [supply_demand_ratio > 1.5, supply_demand_ratio > 1.3, supply_demand_ratio > 1.2,
+         supply_demand_ratio > 1.0, supply_demand_ratio > 0.8],
+        [95, 85, 75, 55, 25],
+        10
+    )
+    price_volatility_risk = _select(
+        [(price_per_kg > 100) & (supply_demand_ratio > 1.0), (price_per_kg > 80) & (supply_demand_ratio > 1.1)],
+        [30, 20],
+        0
+    )
+    demand_risk = _select([demand_index < 0.8, demand_index < 0.9], [25, 15], 0)
+    lettuce_penalty = np.where(
+        is_lettuce, _select([supply_demand_ratio > 1.1, supply_demand_ratio > 1.0], [20, 10], 0), 0
+    )
+
+    total_risk = (base_risk * 0.6) + (price_volatility_risk * 0.25) + (demand_risk * 0.15) + lettuce_penalty
+    return np.minimum(100, np.maximum(0, total_risk))
+
+
+def final_scores(soil, yield_, profit, risk, weights, penalize=False):
+    """
+    Weighted final score. With penalize, poor soil (< 40) halves the soil term and
+    amplifies risk 1.5x, and high risk (> 70) amplifies it 1.8x.
+    """
+    plain = weights['soil'] * soil + weights['yield'] * yield_ + weights['profit'] * profit - weights['risk'] * risk
+    if not penalize:
+        return plain
+    return _select(
+        [soil < 40, risk > 70],
+        [weights['soil'] * soil * 0.5 + weights['yield'] * yield_ + weights['profit'] * profit - weights['risk'] * risk * 1.5,
+         weights['soil'] * soil + weights['yield'] * yield_ + weights['profit'] * profit - weights['risk'] * risk * 1.8],
+        plain
+    )
+
+
+def confidence_levels(soil, yield_, profit, risk):
+    """'high' / 'medium' / 'low' confidence from how strong and consistent the scores are"""
+    avg_score = (soil + yield_ + profit) / 3
+    score_variance = ((soil - avg_score) ** 2 + (yield_ - avg_score) ** 2 + (profit - avg_score) ** 2) / 3
+    return _select(
+        [(avg_score >= 80) & (risk < 30) & (score_variance < 400), (avg_score >= 65) & (risk < 50)],
+        ['high', 'medium'],
+        'low'
+    )
+
+
+def optimal_areas(final_score, farm_size, risk, profit_per_ha):
+    """Planting area per crop: a share of the farm by score, cut for risk, scaled by profit"""
+    # Base recommendation: 70% of farm for top crops
+    base_percentage = 0.7
+    percentage = _select(
+        [final_score >= 80, final_score >= 70, final_score >= 60, final_score >= 50],
+        [base_percentage * 1.0, base_percentage * 0.85, base_percentage * 0.70, base_percentage * 0.50],
+        base_percentage * 0.30
+    )
+    percentage = _select([risk > 70, risk > 50], [percentage * 0.5, percentage * 0.75], percentage)
+    percentage = _select(
+        [profit_per_ha > 200000, profit_per_ha < 50000],
+        [np.minimum(0.9, percentage * 1.1), percentage * 0.8],
+        percentage
+    )
+
+    recommended = farm_size * percentage * (final_score / 100)
+    return np.maximum(0.1, np.minimum(farm_size * 0.9, recommended))  # Between 0.1ha and 90% of farm
+
+
+def score_model_predictions(crops, soil, model_yield_per_ha, model_price, model_risk, farm_size, weights, penalize):
+    """
+    Every score column for crops scored from model predictions (yield in t/ha,
+    price in DA/kg, risk in %), given their soil scores
+    """
+    yield_score = model_yield_scores(crops, model_yield_per_ha)
+    base_cost = base_costs(crops)
+    revenue_per_ha = model_yield_per_ha * 1000 * model_price  # tons to kg, then multiply by price per kg
+    profit_per_ha = revenue_per_ha - base_cost
+    roi = (profit_per_ha / base_cost) * 100
+    profit_score = profit_scores(roi)
+    final_score = final_scores(soil, yield_score, profit_score, model_risk, weights, penalize)
+    recommended_area_ha = optimal_areas(final_score, farm_size, model_risk, profit_per_ha)
+    expected_yield_tons = recommended_area_ha * model_yield_per_ha
+    expected_revenue = expected_yield_tons * 1000 * model_price
+    return {
+        'soil': soil,
+        'yield': yield_score,
+        'profit': profit_score,
+        'risk': model_risk,
+        'base_cost': base_cost,
+        'profit_per_ha': profit_per_ha,
+        'roi': roi,
+        'final_score': final_score,
+        'confidence': confidence_levels(soil, yield_score, profit_score, model_risk),
+        'recommended_area_ha': recommended_area_ha,
+        'expected_yield_tons': expected_yield_tons,
+        'expected_revenue': expected_revenue,
+        'expected_profit': expected_revenue - (recommended_area_ha * base_cost),
+    }
+
+
+def score_market_rows(crops, soil, weather, price_per_kg, demand_index, supply_volume_tons, is_lettuce,
+                      farm_size, weights, penalize=False):
+    """
+    Every score column for crops scored from market data and the weather (no
+    model), given their soil scores
+    """
+    yield_score = weather_yield_scores(crops, weather)
+    risk_score = market_risk_scores(price_per_kg, demand_index, supply_volume_tons, is_lettuce)
+
+    # Expected yield adjusted by yield score
+    expected_yield = crops['base_yield_per_ha'] * (yield_score / 100.0)
+    revenue_per_ha = expected_yield * price_per_kg * 1000  # tons to kg
+    base_cost = base_costs(crops)
+    profit_per_ha = revenue_per_ha - base_cost
+    roi = (profit_per_ha / base_cost) * 100
+    profit_score = profit_scores(roi)
+
+    final_score = final_scores(soil, yield_score, profit_score, risk_score, weights, penalize)
+    recommended_area_ha = optimal_areas(final_score, farm_size, risk_score, profit_per_ha)
+    expected_yield_tons = recommended_area_ha * crops['base_yield_per_ha'] * (yield_score / 100.0)
+    expected_revenue = expected_yield_tons * 1000 * price_per_kg
+    return {
+        'soil': soil,
+        'yield': yield_score,
+        'profit': profit_score,
+        'risk': risk_score,
+        'base_cost': base_cost,
+        'profit_per_ha': profit_per_ha,
+        'roi': roi,
+        'final_score': final_score,
+        'confidence': confidence_levels(soil, yield_score, profit_score, risk_score),
+        'recommended_area_ha': recommended_area_ha,
+        'expected_yield_tons': expected_yield_tons,
+        'expected_revenue': expected_revenue,
+        'expected_profit': expected_revenue - (recommended_area_ha * BASE_COST_PER_HA),
+    }
+
+
+def score_alternatives(soil, model_yield_per_ha, model_price, model_risk, weights=INTENDED_CROP_WEIGHTS):
+    """
+    Score columns for alternatives to the farmer's intended crop, from model
+    predictions (yield in t/ha, price in DA/kg, risk in %) and soil scores.
+    A coarser scale than score_model_predictions: yield is rated against a flat
+    50 t/ha and profit straight from the ROI (no cut for a loss)
+    """
+    yield_score = np.where(model_yield_per_ha > 0, np.minimum(100, (model_yield_per_ha / 50) * 100), 0)
+    profit_per_ha = (model_yield_per_ha * model_price * 1000) - BASE_COST_PER_HA
+    roi = np.where(profit_per_ha > 0, (profit_per_ha / BASE_COST_PER_HA) * 100, 0)
+    profit_score = np.minimum(100, np.maximum(0, 20 + roi))
+    return {
+        'soil': soil,
+        'yield': yield_score,
+        'profit': profit_score,
+        'risk': model_risk,
+        'profit_per_ha': profit_per_ha,
+        'roi': roi,
+        'final_score': final_scores(soil, yield_score, profit_score, model_risk, weights),
+    }
+
+
+def rows(columns, count):
+    """Split score columns into count dicts of plain Python values"""
+    lists = {}
+    for name, column in columns.items():
+        column = np.asarray(column)
+        lists[name] = column.tolist() if column.ndim else [column.item()] * count
+    return [{name: values[i] for name, values in lists.items()} for i in range(count)]
@@ -0,0 +1,69 @@
+import time
+from datetime import datetime
+from django.conf import settings
+from .model_predictor import get_model_predictor
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def warm_up():
+    """
+    Load the model and push a synthetic batch of every crop through each
+    prediction path, so the first real request in this process doesn't pay
+    for artifact loading, XGBoost's lazy initialization, the grid's page
+    faults or the OpenAI client import.
+
+    Returns the timings in milliseconds. Synthetic predictions bypass the
+    prediction cache, so they never show up in real responses.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    step = time.perf_counter()
+    predictor = get_model_predictor()
+    timings['load_ms'] = _elapsed_ms(step)
+
+    snapshot = predictor.snapshot
+    if snapshot is not None:
+        crops = predictor.get_available_crops()
+        region, soil = next(iter(snapshot.get('region_soil_map', {}).items()), (None, None))
+        now = datetime.now()
+        inputs = (region, soil, now.year, now.month, 5.0, 25.0, 25.0)
+
+        step = time.perf_counter()
+        # Full batch plus a single row: both shapes the request path uses
+        snapshot.predict(predictor.encoder.encode(crops, *inputs))
+        snapshot.predict(predictor.encoder.encode(crops[:1], *inputs))
+        timings['predict_ms'] = _elapsed_ms(step)
+
+        if predictor.grid is not None:
+            step = time.perf_counter()
+            predictor.grid.lookup(crops, *inputs)
+            timings['grid_ms'] = _elapsed_ms(step)
+
+    step = time.perf_counter()
+    from .ai_advice_generator import get_advice_generator
+    get_advice_generator('en')
+    timings['advice_ms'] = _elapsed_ms(step)
+
+    timings['total_ms'] = _elapsed_ms(started)
+    print(f"Warm-up (model {predictor.model_version}): " + ", ".join(f"{k}={v}" for k, v in timings.items()))
+    return timings
+
+
+def warm_up_server():
+    """
+    warm_up() for a process about to serve requests, if MODEL_WARMUP_ON_STARTUP
+    is set. Called from core/wsgi.py and core/asgi.py only, so tests,
+    management commands and other imports of the project never pay for it.
+    """
+    if not getattr(settings, 'MODEL_WARMUP_ON_STARTUP', True):
+        return None
+    try:
+        return warm_up()
+    except Exception as e:
+        # A failed warm-up only costs latency; the first request retries the load
+        print(f"Model warm-up failed: {e}")
+        return None
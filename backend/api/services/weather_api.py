@@ -1,28 +1,44 @@
-import requests
 from datetime import datetime, timedelta
 from django.conf import settings
 import os
+from http_client import get_http_client
 
 # OpenWeatherMap API (free tier available)
 # You can get a free API key from https://openweathermap.org/api
 OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', 'your_api_key_here')
 OPENWEATHER_BASE_URL = 'https://api.openweathermap.org/data/2.5'
 
-def get_weather_data(location):
+# Open-Meteo forecast API (no key); takes comma-separated coordinate lists, one result per location
+OPEN_METEO_FORECAST_URL = 'https://api.open-meteo.com/v1/forecast'
+
+def _location_params(location, coordinates):
+    # Coordinates (see geocode_regions) skip OpenWeatherMap's name lookup and its ambiguity
+    if coordinates is not None:
+        return {'lat': coordinates[0], 'lon': coordinates[1]}
+    return {'q': location}
+
+def get_weather_data(location, coordinates=None):
     """
-    Fetch current weather data from OpenWeatherMap API based on location.
+    Fetch current weather data from OpenWeatherMap API based on location
+    (by coordinates, a (latitude, longitude) pair, when given).
     Returns weather data in the format expected by the recommendation engine.
     """
+    return fetch_weather_data(location, coordinates) or get_default_weather_data(location)
+
+def fetch_weather_data(location, coordinates=None):
+    """
+    Current weather from OpenWeatherMap, like get_weather_data(), but None
+    (instead of default values) when the API can't be reached
+    """
     try:
-        # First, get coordinates for the location (geocoding)
         geocode_url = f'{OPENWEATHER_BASE_URL}/weather'
         params = {
-            'q': location,
+            **_location_params(location, coordinates),
             'appid': OPENWEATHER_API_KEY,
             'units': 'metric'
         }
         
-        response = requests.get(geocode_url, params=params, timeout=10)
+        response = get_http_client().get(geocode_url, params=params, timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -62,13 +78,12 @@ def get_weather_data(location):
                 'sunshine_hours': sunshine_hours
             }
         else:
-            # If API fails, return default values
             print(f"Weather API error: {response.status_code}")
-            return get_default_weather_data(location)
+            return None
             
     except Exception as e:
         print(f"Error fetching weather data: {e}")
-        return get_default_weather_data(location)
+        return None
 
 def get_default_weather_data(location):
     """
@@ -84,7 +99,7 @@ def get_default_weather_data(location):
         'sunshine_hours': 8.0  # Average sunshine hours
     }
 
-def get_weather_forecast(location, days=7):
+def get_weather_forecast(location, days=7, coordinates=None):
     """
     Get weather forecast for the next N days.
     This would use the OpenWeatherMap forecast API.
@@ -92,13 +107,13 @@ def get_weather_forecast(location, days=7):
     try:
         forecast_url = f'{OPENWEATHER_BASE_URL}/forecast'
         params = {
-            'q': location,
+            **_location_params(location, coordinates),
             'appid': OPENWEATHER_API_KEY,
             'units': 'metric',
             'cnt': days * 8  # 8 forecasts per day (3-hour intervals)
         }
         
-        response = requests.get(forecast_url, params=params, timeout=10)
+        response = get_http_client().get(forecast_url, params=params, timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -111,3 +126,64 @@ def get_weather_forecast(location, days=7):
         print(f"Error fetching weather forecast: {e}")
         return []
 
+def fetch_open_meteo_many(coordinates, days=7):
+    """
+    Current conditions plus a daily forecast for many locations in one
+    Open-Meteo call. coordinates is a list of (latitude, longitude).
+    Returns one list per location (None where the call failed) of weather
+    dicts like get_weather_data's: today from the current conditions, then
+    one per forecast day after today.
+    """
+    if not coordinates:
+        return []
+    params = {
+        'latitude': ','.join(f'{lat:.4f}' for lat, _ in coordinates),
+        'longitude': ','.join(f'{lon:.4f}' for _, lon in coordinates),
+        'current': 'temperature_2m,relative_humidity_2m,rain,cloud_cover',
+        'daily': 'temperature_2m_mean,rain_sum,relative_humidity_2m_mean,sunshine_duration',
+        'forecast_days': days,
+        'timezone': 'auto',
+    }
+    try:
+        response = get_http_client().get(OPEN_METEO_FORECAST_URL, params=params, timeout=20)
+        if response.status_code != 200:
+            print(f"Open-Meteo forecast error: {response.status_code}")
+            return [None] * len(coordinates)
+        data = response.json()
+    except Exception as e:
+        print(f"Error fetching Open-Meteo forecast: {e}")
+        return [None] * len(coordinates)
+    
+    # A single location comes back as one object instead of a list
+    results = data if isinstance(data, list) else [data]
+    if len(results) != len(coordinates):
+        print(f"Open-Meteo forecast error: {len(results)} results for {len(coordinates)} locations")
+        return [None] * len(coordinates)
+    today = datetime.now().date()
+    forecasts = []
+    for result in results:
+        current = result.get('current', {})
+        cloud_coverage = current.get('cloud_cover') if current.get('cloud_cover') is not None else 50
+        days_data = [{
+            'date': today,
+            'rainfall_mm': current.get('rain') or 0,
+            'temperature_avg': current.get('temperature_2m', 20),
+            'humidity_avg': current.get('relative_humidity_2m', 60),
+            # Same cloud-cover estimate as get_weather_data
+            'sunshine_hours': max(0, 12 - (cloud_coverage / 10)),
+        }]
+        daily = result.get('daily', {})
+        for i, day in enumerate(daily.get('time', [])):
+            date = datetime.strptime(day, '%Y-%m-%d').date()
+            temperature = daily['temperature_2m_mean'][i]
+            if date <= today or temperature is None:
+                continue
+            days_data.append({
+                'date': date,
+                'rainfall_mm': daily['rain_sum'][i] or 0,
+                'temperature_avg': temperature,
+                'humidity_avg': daily['relative_humidity_2m_mean'][i] if daily['relative_humidity_2m_mean'][i] is not None else 60,
+                'sunshine_hours': (daily['sunshine_duration'][i] or 0) / 3600,  # seconds -> hours
+            })
+        forecasts.append(days_data)
+    return forecasts
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from ..models import WeatherData
+from . import weather_api
+
+# Defaults for settings.WEATHER_CACHE
+WEATHER_CACHE_DEFAULTS = {
+    'TTL_SECONDS': 30 * 60,     # fetched conditions count as fresh for this long
+    'LOCATION_TTL_SECONDS': {},  # per-location overrides: location -> seconds
+    'FAILURE_TTL_SECONDS': 60,   # after a failed fetch, its stand-in row is served this long
+}
+
+# One lock per location, so concurrent misses for it make a single API call
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _reset_locks_after_fork():
+    # A lock held by another thread at fork time would never be released in the child
+    global _locks_guard
+    _locks.clear()
+    _locks_guard = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+def _location_lock(location):
+    with _locks_guard:
+        return _locks.setdefault(location, threading.Lock())
+
+
+def _config():
+    return {**WEATHER_CACHE_DEFAULTS, **getattr(settings, 'WEATHER_CACHE', {})}
+
+
+def _ttl(location):
+    config = _config()
+    return config['LOCATION_TTL_SECONDS'].get(location, config['TTL_SECONDS'])
+
+
+def _cache_key(location):
+    return "weather:" + hashlib.sha256(location.encode()).hexdigest()
+
+
+def weather_location(farm):
+    """
+    Location a farm's weather is stored under: its Region's name (what
+    weather_prefetch refreshes), else its free-text location
+    """
+    region = getattr(farm, 'region', None)
+    return region.name if region is not None else farm.location
+
+
+def weather_coordinates(farm):
+    """(latitude, longitude) of the farm's Region once geocoded (geocode_regions), else None"""
+    region = getattr(farm, 'region', None)
+    if region is None or region.latitude is None or region.longitude is None:
+        return None
+    return region.latitude, region.longitude
+
+
+def get_weather(location, coordinates=None):
+    """
+    Current weather for a location, as a WeatherData row. Reads through the
+    Django cache, then a WeatherData row fetched within the location's TTL,
+    and only then calls the weather API (once per location at a time, by
+    coordinates when given) and upserts the result. If the API can't be reached,
+    the location's latest stored row up to today stands in (default values for
+    a location never seen), and is cached for FAILURE_TTL_SECONDS so requests
+    waiting on the lock reuse it instead of each retrying the API.
+    """
+    weather = _fresh_weather(location)
+    if weather is not None:
+        return weather
+    with _location_lock(location):
+        # Whoever held the lock before us may just have fetched it
+        weather = _fresh_weather(location)
+        if weather is not None:
+            return weather
+        return _fetch_weather(location, coordinates)
+
+
+def _fresh_weather(location):
+    weather = cache.get(_cache_key(location))
+    if weather is not None:
+        return weather
+
+    ttl = _ttl(location)
+    now = timezone.now()
+    weather = (WeatherData.objects
+               .filter(location=location, date=datetime.now().date(), fetched_at__gte=now - timedelta(seconds=ttl))
+               .order_by('-fetched_at')
+               .first())
+    if weather is not None:
+        # Only for what's left of its freshness
+        cache.set(_cache_key(location), weather, max(1, int(ttl - (now - weather.fetched_at).total_seconds())))
+    return weather
+
+
+def _fetch_weather(location, coordinates):
+    weather_data = weather_api.fetch_weather_data(location, coordinates)
+    if weather_data is not None:
+        weather = _store(location, weather_data, fetched_at=timezone.now())
+        cache.set(_cache_key(location), weather, _ttl(location))
+        return weather
+
+    # API unreachable: the latest row up to today stands in (prefetched forecast
+    # days are not current weather)
+    weather = (WeatherData.objects
+               .filter(location=location, date__lte=datetime.now().date())
+               .order_by('-date', '-id')
+               .first())
+    if weather is None:
+        weather = _store(location, weather_api.get_default_weather_data(location), fetched_at=None)
+    # Briefly, so the requests queued behind us share this outcome and the API is retried soon after
+    cache.set(_cache_key(location), weather, _config()['FAILURE_TTL_SECONDS'])
+    return weather
+
+
+def _store(location, weather_data, fetched_at):
+    # Create or update the location's WeatherData row for the day
+    weather, created = WeatherData.objects.update_or_create(
+        location=location,
+        date=weather_data['date'],
+        defaults={
+            'rainfall_mm': weather_data['rainfall_mm'],
+            'temperature_avg': weather_data['temperature_avg'],
+            'humidity_avg': weather_data['humidity_avg'],
+            'sunshine_hours': weather_data.get('sunshine_hours', 8.0),
+            'fetched_at': fetched_at,
+        }
+    )
+    return weather
+
+
+def store_weather_rows(rows):
+    """
+    Upsert (location, weather dict) pairs into WeatherData in one statement,
+    as freshly fetched, and drop the locations' cached rows
+    """
+    fetched_at = timezone.now()
+    WeatherData.objects.bulk_create(
+        [
+            WeatherData(
+                location=location,
+                date=weather_data['date'],
+                rainfall_mm=weather_data['rainfall_mm'],
+                temperature_avg=weather_data['temperature_avg'],
+                humidity_avg=weather_data['humidity_avg'],
+                sunshine_hours=weather_data.get('sunshine_hours', 8.0),
+                fetched_at=fetched_at,
+            )
+            for location, weather_data in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['location', 'date'],
+        update_fields=['rainfall_mm', 'temperature_avg', 'humidity_avg', 'sunshine_hours', 'fetched_at'],
+    )
+    cache.delete_many([_cache_key(location) for location in {location for location, _ in rows}])
@@ -0,0 +1,55 @@
+from django.conf import settings
+from ..models import Region
+from . import weather_api
+from .weather_cache import store_weather_rows
+
+# Defaults for settings.WEATHER_PREFETCH
+WEATHER_PREFETCH_DEFAULTS = {
+    'INTERVAL_SECONDS': 15 * 60,  # prefetch_weather --loop cadence; keep it under WEATHER_CACHE['TTL_SECONDS']
+    'FORECAST_DAYS': 7,
+    'LOCATIONS_PER_CALL': 50,     # coordinates per Open-Meteo request
+}
+
+
+def prefetch_config():
+    return {**WEATHER_PREFETCH_DEFAULTS, **getattr(settings, 'WEATHER_PREFETCH', {})}
+
+
+def prefetch_region_weather(regions=None):
+    """
+    Refresh today's conditions and the daily forecast of every Region (or the
+    given ones) and upsert them into WeatherData under the region names, in
+    one bulk write. Regions with coordinates are fetched from Open-Meteo
+    LOCATIONS_PER_CALL at a time; the others (current conditions only) from
+    OpenWeatherMap by name. Returns (rows written, regions that failed).
+    """
+    config = prefetch_config()
+    if regions is None:
+        regions = Region.objects.all()
+    located = [region for region in regions if region.latitude is not None and region.longitude is not None]
+    unlocated = [region for region in regions if region.latitude is None or region.longitude is None]
+    
+    rows = []
+    failed = []
+    chunk_size = max(1, config['LOCATIONS_PER_CALL'])
+    for start in range(0, len(located), chunk_size):
+        chunk = located[start:start + chunk_size]
+        forecasts = weather_api.fetch_open_meteo_many(
+            [(region.latitude, region.longitude) for region in chunk], days=config['FORECAST_DAYS']
+        )
+        for region, days_data in zip(chunk, forecasts):
+            if days_data is None:
+                failed.append(region.name)
+                continue
+            rows.extend((region.name, weather_data) for weather_data in days_data)
+    
+    for region in unlocated:
+        weather_data = weather_api.fetch_weather_data(region.name)
+        if weather_data is None:
+            failed.append(region.name)
+            continue
+        rows.append((region.name, weather_data))
+    
+    if rows:
+        store_weather_rows(rows)
+    return len(rows), failed
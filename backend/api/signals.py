@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Crop
+from .services.crop_catalog import crop_catalog
+
+
+@receiver(post_save, sender=Crop)
+@receiver(post_delete, sender=Crop)
+def invalidate_crop_catalog(sender, **kwargs):
+    crop_catalog.invalidate()
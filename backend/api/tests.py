@@ -1,3 +1,896 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+import joblib
+import numpy as np
+import requests
+import xgboost as xgb
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from geocoding import GeocodeCache
+from http_client import HTTPClient
+from model_store import ModelSnapshot, ModelStore, export_native, load_native
+from prediction_grid import (AXIS_INPUTS, GRID_RANGES, GRID_TOLERANCE, PredictionGrid, _within_tolerance,
+                             build_grid)
+from tree_ensemble import FlatTreeEnsemble
+from weather_archive import MonthlyArchiveCache
+from weather_service import WeatherService
+from .models import Crop, Farm, MarketData, Region, SoilData, WeatherData
+from .services.advice_jobs import get_advice_job, start_advice_job
+from .services.ai_advice_generator import AIAdviceGenerator
+from .services.crop_catalog import crop_catalog
+from .services import model_predictor
+from .services.model_predictor import ModelPredictor, get_model_predictor
+from .services.recommendation_cache import recommendation_cache_key
+from .services import scoring
+from .services.recommendation import ScoringContext, SmartProductionPlanningEngine
+from .services.weather_cache import get_weather, weather_coordinates, weather_location
+from .services.warmup import warm_up_server
+from .services.weather_prefetch import prefetch_region_weather
 
-# Create your tests here.
+MODEL_PATH = os.path.join(settings.BASE_DIR, 'models', 'agri_advisor_v5.pkl')
+SCORING_FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'scoring_regression.json')
+
+
+class FlatTreeEnsembleParityTests(SimpleTestCase):
+    """The NumPy tree evaluator must match Booster.inplace_predict"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cls.snapshot = ModelSnapshot(joblib.load(MODEL_PATH), 'test')
+        encoder = cls.snapshot.encoder
+        rng = np.random.default_rng(7)
+        crops = encoder.known_crops()
+        regions = list(encoder.region_index)
+        soils = list(encoder.soil_index)
+        blocks = []
+        for _ in range(100):
+            rows = encoder.encode(
+                crops, rng.choice(regions), rng.choice(soils),
+                int(rng.integers(2015, 2030)), int(rng.integers(1, 13)),
+                float(rng.uniform(0.1, 200)), float(rng.uniform(-5, 45)), float(rng.uniform(0, 900)),
+            )
+            blocks.append(rows.copy())
+        cls.rows = np.vstack(blocks)
+
+    def test_every_head_matches_xgboost(self):
+        for booster, X in zip(self.snapshot.boosters, self.snapshot.encoder.scale_heads(self.rows)):
+            expected = booster.inplace_predict(X)
+            actual = FlatTreeEnsemble.from_booster(booster).predict(X)
+            np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+
+    def test_numpy_engine_snapshot_matches_xgboost(self):
+        numpy_snapshot = ModelSnapshot(self.snapshot.artifacts, 'test', engine='numpy')
+        for actual, expected in zip(numpy_snapshot.predict(self.rows), self.snapshot.predict(self.rows)):
+            np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+
+    def test_memory_mapped_export_matches_xgboost(self):
+        with tempfile.TemporaryDirectory() as directory:
+            artifacts = load_native(export_native(self.snapshot.artifacts, directory), engine='numpy')
+            self.assertIsInstance(artifacts['rfc'], FlatTreeEnsemble)
+            mapped = ModelSnapshot(artifacts, 'test', engine='numpy')
+            for actual, expected in zip(mapped.predict(self.rows), self.snapshot.predict(self.rows)):
+                np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+            del artifacts, mapped
+
+    def test_missing_values_follow_default_direction(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(400, 6)).astype(np.float32)
+        X[rng.random(X.shape) < 0.2] = np.nan
+        y = (np.nan_to_num(X[:, 0]) + np.nan_to_num(X[:, 1]) > 0).astype(np.float32)
+        booster = xgb.train({'objective': 'binary:logistic', 'max_depth': 4}, xgb.DMatrix(X, label=y), num_boost_round=20)
+
+        np.testing.assert_allclose(FlatTreeEnsemble.from_booster(booster).predict(X),
+                                   booster.inplace_predict(X), rtol=1e-5, atol=1e-6)
+
+    def test_unknown_engine_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ModelSnapshot(self.snapshot.artifacts, 'test', engine='onnx')
+
+
+@override_settings(PREDICTION_GRID_ENABLED=False)
+class ModelPredictorCacheTests(SimpleTestCase):
+    """The prediction cache only buckets its keys; the model always sees the farm's own inputs"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cls.snapshot = ModelSnapshot(joblib.load(MODEL_PATH), 'test')
+        encoder = cls.snapshot.encoder
+        cls.inputs = (encoder.known_crops()[:3], next(iter(encoder.region_index)), next(iter(encoder.soil_index)))
+
+    def test_small_farm_prediction_is_the_same_with_cache_on_and_off(self):
+        crops, region, soil = self.inputs
+        cached = ModelPredictor(self.snapshot)
+        with override_settings(PREDICTION_CACHE={'MAX_ENTRIES': 0}):
+            uncached = ModelPredictor(self.snapshot)
+
+        expected = uncached.predict_crops(crops, region, soil, 0.2, 21.3, 42.0, 2025, 5)
+        self.assertEqual(cached.predict_crops(crops, region, soil, 0.2, 21.3, 42.0, 2025, 5), expected)
+        # Second call is a cache hit, and still the 0.2 ha answer
+        self.assertEqual(cached.predict_crops(crops, region, soil, 0.2, 21.3, 42.0, 2025, 5), expected)
+        self.assertEqual(cached.cache_stats()['hits'], len(crops))
+
+        risk, price, crop_yield = self.snapshot.predict(
+            self.snapshot.encoder.encode(crops, region, soil, 2025, 5, 0.2, 21.3, 42.0))
+        self.assertEqual([expected[crop]['risk'] for crop in crops], [float(r) * 100 for r in risk])
+        self.assertEqual([expected[crop]['yield'] for crop in crops], [abs(float(y)) for y in crop_yield])
+
+
+@override_settings(PREDICTION_GRID_ENABLED=False, MODEL_RELOAD_INTERVAL_SECONDS=0)
+class ModelStoreTests(SimpleTestCase):
+    """A changed artifact on disk is swapped in as a new snapshot; snapshots already handed out keep working"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cls.artifacts = joblib.load(MODEL_PATH)
+        # Price and yield heads swapped: a "retrained" model with visibly different outputs
+        cls.retrained = dict(cls.artifacts, lr_price=cls.artifacts['lr_yield'], lr_yield=cls.artifacts['lr_price'])
+        encoder = ModelSnapshot(cls.artifacts, 'test').encoder
+        cls.inputs = (encoder.known_crops()[:3], next(iter(encoder.region_index)), next(iter(encoder.soil_index)))
+        cls.rows = encoder.encode(*cls.inputs, 2025, 5, 5.0, 21.0, 40.0).copy()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'model.pkl')
+        self.writes = 0
+        self._write(self.artifacts)
+        self.store = ModelStore(self.path)
+        self.addCleanup(self.store.stop)
+        self.enterContext(warnings.catch_warnings())
+        warnings.simplefilter('ignore')
+
+    def _write(self, artifacts=None, content=None):
+        # Replaced atomically like train_pipeline does, with a distinct mtime every time
+        tmp_path = self.path + '.tmp'
+        if content is None:
+            joblib.dump(artifacts, tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+        os.replace(tmp_path, self.path)
+        self.writes += 1
+        stamp = time.time_ns() + self.writes * 10 ** 9
+        os.utime(self.path, ns=(stamp, stamp))
+
+    def test_refresh_swaps_in_a_changed_artifact(self):
+        before = self.store.current()
+        expected = before.predict(self.rows)
+        self.assertFalse(self.store.refresh())
+
+        self._write(self.retrained)
+        self.assertTrue(self.store.refresh())
+        after = self.store.current()
+        self.assertIsNot(after, before)
+        self.assertNotEqual(after.version, before.version)
+        self.assertEqual(self.store.version, after.version)
+
+        # A request holding the old snapshot still predicts with the old model
+        for old, kept in zip(expected, before.predict(self.rows)):
+            np.testing.assert_array_equal(kept, old)
+        self.assertFalse(np.allclose(after.predict(self.rows)[1], expected[1]))
+
+    def test_unchanged_or_corrupt_artifact_keeps_the_snapshot(self):
+        before = self.store.current()
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        self._write(content=content)
+        self.assertFalse(self.store.refresh())
+        self.assertIs(self.store.current(), before)
+
+        self._write(content=content[:len(content) // 2])
+        self.assertFalse(self.store.refresh())
+        self.assertIs(self.store.current(), before)
+
+        # Once the file is whole again it loads as usual
+        self._write(self.retrained)
+        self.assertTrue(self.store.refresh())
+
+    def test_publish_and_watch(self):
+        published = self.store.publish(self.retrained, version='in-memory')
+        self.assertIs(self.store.current(), published)
+        self.assertEqual(self.store.version, 'in-memory')
+
+        self.store.watch(0.05)
+        self._write(self.artifacts)
+        deadline = time.monotonic() + 10
+        while self.store.current() is published and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertIsNot(self.store.current(), published)
+        self.assertNotEqual(self.store.version, 'in-memory')
+
+    def test_get_model_predictor_follows_the_store(self):
+        crops, region, soil = self.inputs
+        with mock.patch.object(model_predictor, '_model_store', self.store), \
+                mock.patch.object(model_predictor, '_model_predictor', None):
+            before = get_model_predictor()
+            self.assertIs(get_model_predictor(), before)
+            before.predict_crops(crops, region, soil, 5.0, 21.0, 40.0, 2025, 5)
+            self.assertEqual(before.cache_stats()['entries'], len(crops))
+
+            self._write(self.retrained)
+            self.store.refresh()
+            after = get_model_predictor()
+            self.assertIsNot(after, before)
+            self.assertIs(after.snapshot, self.store.current())
+            self.assertEqual(after.cache_stats(), {'entries': 0, 'hits': 0, 'misses': 0,
+                                                   'model_version': self.store.version})
+            self.assertNotEqual(after.model_version, before.model_version)
+
+
+@override_settings(PREDICTION_GRID_ENABLED=False)
+class WarmUpTests(SimpleTestCase):
+    """Server warm-up loads and exercises the model without touching what requests will see"""
+
+    def setUp(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.predictor = ModelPredictor(ModelSnapshot(joblib.load(MODEL_PATH), 'test'))
+        patcher = mock.patch('api.services.warmup.get_model_predictor', return_value=self.predictor)
+        self.get_model_predictor = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(MODEL_WARMUP_ON_STARTUP=False)
+    def test_disabled_warm_up_loads_nothing(self):
+        self.assertIsNone(warm_up_server())
+        self.get_model_predictor.assert_not_called()
+
+    @override_settings(MODEL_WARMUP_ON_STARTUP=True)
+    def test_warm_up_returns_timings_and_leaves_the_cache_empty(self):
+        timings = warm_up_server()
+        self.assertEqual(set(timings), {'load_ms', 'predict_ms', 'advice_ms', 'total_ms'})
+        self.assertTrue(all(value >= 0 for value in timings.values()))
+        self.assertGreaterEqual(timings['total_ms'], timings['predict_ms'])
+        # Synthetic inputs never reach the prediction cache
+        self.assertEqual(self.predictor.cache_stats(), {'entries': 0, 'hits': 0, 'misses': 0, 'model_version': 'test'})
+
+    @override_settings(MODEL_WARMUP_ON_STARTUP=True)
+    def test_failed_warm_up_does_not_stop_the_server(self):
+        self.get_model_predictor.side_effect = OSError('model file missing')
+        self.assertIsNone(warm_up_server())
+
+
+class PredictionGridTests(SimpleTestCase):
+    """Grid answers stay within GRID_TOLERANCE of the model, and anything the grid can't vouch for goes to the model"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cls.snapshot = ModelSnapshot(joblib.load(MODEL_PATH), 'test')
+        encoder = cls.snapshot.encoder
+        cls.crops = encoder.known_crops()[:2]
+        cls.directory = tempfile.TemporaryDirectory()
+        build_grid(cls.snapshot, cls.directory.name, year=2025, crops=cls.crops)
+        cls.grid = PredictionGrid.load(cls.directory.name, cls.snapshot)
+        cls.regions = list(encoder.region_index) + [None]
+        cls.soils = list(encoder.soil_index) + [None]
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.grid
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def _direct(self, region, soil, month, area, temp, rain):
+        rows = self.snapshot.encoder.encode(self.crops, region, soil, 2025, month, area, temp, rain)
+        return np.stack(self.snapshot.predict(rows), axis=-1)
+
+    def _answered(self):
+        """(region, soil, month) the grid answers for every test crop"""
+        for i, region in enumerate(self.regions):
+            for j, soil in enumerate(self.soils):
+                for month in range(1, 13):
+                    if np.isfinite(self.grid.values[i, j, :, month - 1]).all():
+                        return region, soil, month
+        self.fail('grid answers nothing for the test crops')
+
+    def test_edges_are_split_thresholds(self):
+        trees = [FlatTreeEnsemble.from_booster(b) for b in self.snapshot.boosters]
+        encoder = self.snapshot.encoder
+        for name, edges in zip(AXIS_INPUTS, self.grid.edges):
+            self.assertEqual((edges[0], edges[-1]), GRID_RANGES[name])
+            numeric = encoder.numerical_cols.index(name)
+            raw = np.concatenate([
+                tree.threshold[tree.feature == encoder.feature_cols.index(name)] * encoder.head_scale[h, numeric]
+                + encoder.head_mean[h, numeric] for h, tree in enumerate(trees)])
+            for edge in edges[1:-1]:
+                self.assertLess(np.min(np.abs(raw - edge)), 1e-3)
+
+    def test_answers_are_within_tolerance_of_the_model(self):
+        # Fresh random points (not the ones build_grid checked) across the whole grid; the build-time
+        # check is a sample, so a small share of answers may still miss (see GRID_CHECK_SAMPLES)
+        rng = np.random.default_rng(12345)
+        answered = within = 0
+        for _ in range(400):
+            region = self.regions[rng.integers(len(self.regions))]
+            soil = self.soils[rng.integers(len(self.soils))]
+            month = int(rng.integers(1, 13))
+            inputs = [float(rng.uniform(*GRID_RANGES[name])) for name in AXIS_INPUTS]
+            out = self.grid.lookup(self.crops, region, soil, 2025, month, *inputs)
+            if out is None:
+                continue
+            answered += len(self.crops)
+            within += _within_tolerance(np.stack(out, axis=-1), self._direct(region, soil, month, *inputs),
+                                        GRID_TOLERANCE).sum()
+        self.assertGreater(answered, 100)
+        self.assertGreaterEqual(within / answered, 0.97)
+
+    def test_a_grid_over_tolerance_is_not_written(self):
+        with tempfile.TemporaryDirectory() as directory:
+            exact = {head: (0.0, 0.0) for head in GRID_TOLERANCE}
+            self.assertIsNone(build_grid(self.snapshot, directory, year=2025, crops=self.crops[:1],
+                                         tolerance=exact, min_coverage=1.0))
+            self.assertEqual(os.listdir(directory), [])
+            self.assertIsNone(PredictionGrid.load(directory, self.snapshot))
+
+    def test_inputs_the_grid_does_not_answer_fall_back_to_the_model(self):
+        region, soil, month = self._answered()
+        self.assertIsNone(self.grid.lookup(self.crops, region, soil, 2025, month, 600.0, 20.0, 50.0))
+        self.assertIsNone(self.grid.lookup(self.crops, region, soil, 2024, month, 5.0, 20.0, 50.0))
+        # A combination that failed the build-time check is left to the model everywhere
+        i, j, _, month_slot = np.argwhere(np.isnan(self.grid.values[..., 0, 0, 0, 0]))[0]
+        self.assertIsNone(self.grid.lookup(self.crops, self.regions[i], self.soils[j], 2025, month_slot + 1,
+                                           5.0, 20.0, 50.0))
+
+        predictor = ModelPredictor(self.snapshot)
+        predictor.grid = self.grid
+        with mock.patch.object(ModelSnapshot, 'predict', autospec=True, side_effect=ModelSnapshot.predict) as predict:
+            inside = predictor.predict_crops(self.crops, region, soil, 5.0, 20.0, 50.0, 2025, month)
+            predict.assert_not_called()
+            outside = predictor.predict_crops(self.crops, region, soil, 600.0, 20.0, 50.0, 2025, month)
+            predict.assert_called_once()
+        risk = self._direct(region, soil, month, 600.0, 20.0, 50.0)[:, 0]
+        self.assertEqual([outside[crop]['risk'] for crop in self.crops], [float(r) * 100 for r in risk])
+        self.assertEqual(set(inside), set(self.crops))
+
+    def test_a_grid_built_after_the_model_is_picked_up(self):
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(model_predictor, 'GRID_DIR', directory):
+            before = get_model_predictor()
+            self.assertIsNone(before.grid)
+            self.assertIs(get_model_predictor(), before)
+
+            build_grid(before.snapshot, directory, year=2025, crops=self.crops[:1], min_coverage=0.0)
+            after = get_model_predictor()
+            self.assertIsNot(after, before)
+            self.assertIs(after.snapshot, before.snapshot)
+            self.assertIsNotNone(after.grid)
+            del before, after
+
+    def test_grid_from_another_model_is_rejected(self):
+        # Price and yield heads swapped: same crops and encoder, different outputs
+        artifacts = dict(self.snapshot.artifacts, lr_price=self.snapshot.artifacts['lr_yield'],
+                         lr_yield=self.snapshot.artifacts['lr_price'])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            other = ModelSnapshot(artifacts, 'retrained')
+        self.assertIsNone(PredictionGrid.load(self.directory.name, other))
+
+
+class ScoringKernelRegressionTests(SimpleTestCase):
+    """The vectorized scoring kernel reproduces the old per-crop scalar scores exactly"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(SCORING_FIXTURE, encoding='utf-8') as f:
+            cls.cases = json.load(f)['cases']
+
+    def _engine(self, case):
+        farm = SimpleNamespace(region=None, soil_type='Loam', **case['farm'])
+        engine = SmartProductionPlanningEngine(farm, SimpleNamespace(**case['weather']), None)
+        engine.scoring_context = ScoringContext(SimpleNamespace(**case['soil']))
+        return engine
+
+    def assertRowsEqual(self, columns, expected):
+        rows = scoring.rows(columns, len(expected))
+        for row, expected_row in zip(rows, expected):
+            # Exact equality: the kernel must not drift by even one ulp
+            self.assertEqual({name: row[name] for name in expected_row}, expected_row)
+
+    def test_soil_and_market_scores(self):
+        for i, case in enumerate(self.cases):
+            with self.subTest(case=i):
+                engine = self._engine(case)
+                crops = [SimpleNamespace(**crop) for crop in case['crops']]
+                self.assertEqual(engine._soil_scores(crops).tolist(), case['expected']['soil'])
+                markets = [SimpleNamespace(crop=crop, **market) for crop, market in zip(crops, case['markets'])]
+                self.assertRowsEqual(engine._score_market_rows(markets, engine.scoring_context.soil_data, scoring.RANKING_WEIGHTS),
+                                     case['expected']['market'])
+
+    def test_model_prediction_scores(self):
+        for i, case in enumerate(self.cases):
+            with self.subTest(case=i):
+                engine = self._engine(case)
+                scored = [(SimpleNamespace(**crop), prediction) for crop, prediction in zip(case['crops'], case['predictions'])]
+                self.assertRowsEqual(engine._score_predictions(scored, scoring.RANKING_WEIGHTS, penalize=True),
+                                     case['expected']['ranking'])
+                self.assertRowsEqual(engine._score_predictions(scored, scoring.INTENDED_CROP_WEIGHTS, penalize=False),
+                                     case['expected']['intended'])
+
+    def test_alternative_scores(self):
+        for i, case in enumerate(self.cases):
+            with self.subTest(case=i):
+                columns = [np.array([prediction[name] for prediction in case['predictions']], dtype=float)
+                           for name in ('yield', 'price', 'risk')]
+                self.assertRowsEqual(scoring.score_alternatives(np.array(case['expected']['soil']), *columns),
+                                     case['expected']['alternatives'])
+
+
+class HTTPClientRetryTests(SimpleTestCase):
+    def setUp(self):
+        self.client = HTTPClient(max_retries=2, backoff_base=0.01, backoff_max=0.01)
+        patcher = mock.patch('http_client.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_transient_failures_are_retried(self):
+        unavailable, ok = mock.Mock(status_code=503, headers={'Retry-After': '0'}), mock.Mock(status_code=200)
+        with mock.patch.object(self.client.session, 'get',
+                               side_effect=[requests.ConnectionError('reset'), unavailable, ok]) as get:
+            self.assertIs(self.client.get('https://example.invalid/weather', timeout=5), ok)
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_retries_stop_at_the_limit(self):
+        unavailable = mock.Mock(status_code=503, headers={})
+        with mock.patch.object(self.client.session, 'get', return_value=unavailable) as get:
+            self.assertIs(self.client.get('https://example.invalid/weather', timeout=5), unavailable)
+        self.assertEqual(get.call_count, 3)
+
+        with mock.patch.object(self.client.session, 'get', side_effect=requests.Timeout('slow')) as get:
+            with self.assertRaises(requests.Timeout):
+                self.client.get('https://example.invalid/weather', timeout=5)
+        self.assertEqual(get.call_count, 3)
+
+
+class HTTPClientPoolTests(SimpleTestCase):
+    def setUp(self):
+        release = self.release = threading.Event()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if self.path == '/slow':
+                    release.wait(3)
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(release.set)
+        self.base = f"http://127.0.0.1:{server.server_port}"
+
+    def _start_slow_call(self, client):
+        slow = threading.Thread(target=client.get, args=(self.base + '/slow',), kwargs={'timeout': 10})
+        slow.start()
+        self.addCleanup(slow.join)
+        self.addCleanup(self.release.set)
+        time.sleep(0.2)
+
+    def test_full_pool_does_not_block_past_the_budget(self):
+        client = HTTPClient(pool_maxsize=1)
+        # The only pooled connection is busy with a slow call...
+        self._start_slow_call(client)
+        # ...so this one opens its own instead of waiting for it
+        started = time.monotonic()
+        self.assertEqual(client.get(self.base + '/fast', timeout=2).status_code, 200)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_per_host_limit_waits_only_within_the_budget(self):
+        client = HTTPClient(pool_maxsize=1, max_connections_per_host=1)
+        self._start_slow_call(client)
+        # The host's only slot is taken: the call gives up when its budget runs out
+        started = time.monotonic()
+        with self.assertRaises(requests.Timeout):
+            client.get(self.base + '/fast', timeout=0.5)
+        self.assertLess(time.monotonic() - started, 1.5)
+
+        # A call with budget to spare gets the slot as soon as the slow one frees it
+        threading.Timer(0.2, self.release.set).start()
+        self.assertEqual(client.get(self.base + '/fast', timeout=5).status_code, 200)
+
+
+class AdviceBatchTests(SimpleTestCase):
+    """Concurrent AI advice keeps request order, and crops past the deadline get rule-based advice"""
+
+    def setUp(self):
+        self.generator = AIAdviceGenerator('en')
+        self.generator.ai_enabled = True
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+        def generate(crop_name, *args):
+            if crop_name == 'Slow':
+                self.release.wait(5)
+            return [{'title': f"ai {crop_name}"}]
+
+        for name, side_effect in (('generate_crop_advice', generate),
+                                  ('_generate_rule_based', lambda crop_name, *args: [{'title': f"rule {crop_name}"}])):
+            patcher = mock.patch.object(self.generator, name, side_effect=side_effect)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.requests = [(name, {}, {}, {}, {}, True) for name in ('Olive', 'Slow', 'Barley', 'Tomato')]
+
+    def test_late_crops_fall_back_in_order(self):
+        started = time.monotonic()
+        advice = self.generator.generate_advice_batch(self.requests, max_workers=4, deadline_seconds=0.3)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual([items[0]['title'] for items in advice], ['ai Olive', 'rule Slow', 'ai Barley', 'ai Tomato'])
+
+    def test_iter_yields_ready_crops_first(self):
+        pairs = list(self.generator.iter_advice_batch(self.requests, max_workers=4, deadline_seconds=0.3))
+        self.assertEqual(pairs[-1], (1, [{'title': 'rule Slow'}]))
+        self.assertEqual(sorted(index for index, _ in pairs[:-1]), [0, 2, 3])
+
+    def test_a_single_request_still_has_a_deadline(self):
+        started = time.monotonic()
+        advice = self.generator.generate_advice_batch(self.requests[1:2], max_workers=4, deadline_seconds=0.3)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(advice, [[{'title': 'rule Slow'}]])
+
+    def test_a_single_worker_still_has_a_deadline(self):
+        started = time.monotonic()
+        advice = self.generator.generate_advice_batch(self.requests, max_workers=1, deadline_seconds=0.3)
+        self.assertLess(time.monotonic() - started, 2)
+        # Crops queued behind the slow one miss the deadline with it
+        self.assertEqual([items[0]['title'] for items in advice], ['ai Olive', 'rule Slow', 'rule Barley', 'rule Tomato'])
+
+
+class MonthlyArchiveCacheTests(SimpleTestCase):
+    def test_complete_months_never_expire(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = MonthlyArchiveCache(os.path.join(tmp, 'archive.sqlite3'), recent_ttl_seconds=0)
+            today = date.today()
+            archive.put_many(36.4712, 2.8277, {(2020, 5): (21.5, 30.2), (today.year, today.month): (18.0, 4.0)})
+            # Nearby coordinates share the entry
+            self.assertEqual(archive.get(36.47, 2.83, 2020, 5), (21.5, 30.2))
+            self.assertEqual(archive.cached_months(36.4712, 2.8277), {(2020, 5)})
+            # The current month is still changing: past its TTL it's fetched again
+            self.assertIsNone(archive.get(36.4712, 2.8277, today.year, today.month))
+
+            service = WeatherService('missing.csv', geocode_cache_path=os.path.join(tmp, 'geocode.json'),
+                                     archive_path=archive.path)
+            with mock.patch('weather_service.fetch_monthly_archive') as fetch:
+                self.assertEqual(service._fetch_history({'lat': 36.4712, 'lon': 2.8277}, 2020, 5), (21.5, 30.2))
+            fetch.assert_not_called()
+
+
+class RecommendationQueryCountTests(TestCase):
+    """A recommendation request runs a fixed number of queries, however many crops are scored"""
+
+    CROPS = ('Olive', 'Barley', 'Tomato', 'Potato', 'Date Palm', 'Onion', 'Garlic', 'Lentils', 'Citrus', 'Watermelon')
+
+    @classmethod
+    def setUpTestData(cls):
+        crops = [
+            Crop.objects.create(name=name, ideal_ph_min=6.0, ideal_ph_max=7.5, water_requirement_mm=400 + 50 * i,
+                                growing_days=90 + 10 * i, base_yield_per_ha=10.0 + i)
+            for i, name in enumerate(cls.CROPS)
+        ]
+        for i, crop in enumerate(crops):
+            MarketData.objects.create(crop=crop, date=date(2025, 1, 1), price_per_kg=50.0 + i,
+                                      demand_index=1.0, supply_volume_tons=1000)
+        user = User.objects.create_user('farmer', password='x')
+        cls.farm = Farm.objects.create(user=user, name='Test farm', location='Blida', size_hectares=5.0,
+                                       soil_type='Loam', intended_crop=crops[0])
+        SoilData.objects.create(farm=cls.farm, date_tested=date(2025, 1, 1), ph_level=6.8, nitrogen=1.5,
+                                phosphorus=0.8, potassium=1.0, organic_matter=2.0, salinity=0.5, texture='Loam')
+        cls.weather = WeatherData.objects.create(location='Blida', date=date(2025, 1, 1), rainfall_mm=30.0,
+                                                 temperature_avg=22.0, humidity_avg=60.0, sunshine_hours=8.0)
+
+    def setUp(self):
+        crop_catalog.invalidate()
+        self.market = MarketData.objects.select_related('crop')
+        self.engine = SmartProductionPlanningEngine(self.farm, self.weather, self.market)
+        # Rule-based advice only, no network (the generator is shared process-wide, so patch it back afterwards)
+        patcher = mock.patch.object(self.engine.ai_advice_generator, 'ai_enabled', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_recommendations_query_count(self):
+        # Latest soil sample + the crop catalog
+        with self.assertNumQueries(2):
+            recommendations = self.engine.get_recommendations()
+        self.assertGreater(len(recommendations), 3)
+
+        # Catalog is warm now: a new request only loads its soil sample
+        engine = SmartProductionPlanningEngine(self.farm, self.weather, self.market)
+        with self.assertNumQueries(1):
+            engine.get_recommendations()
+
+    def test_intended_crop_query_count(self):
+        self.engine.get_recommendations()
+        # Market rows with their crops joined; the soil sample and predictions come from the scoring context
+        with self.assertNumQueries(1), mock.patch.object(self.engine.model_predictor, 'predict_crops') as predict_crops:
+            analysis = self.engine.analyze_intended_crop(self.farm.intended_crop, self.market)
+        self.assertEqual(analysis['crop_name'], 'Olive')
+        predict_crops.assert_not_called()
+
+    def test_region_climate_class_drives_climate_constraints(self):
+        crops = list(Crop.objects.all())
+        soil = SoilData.objects.get(farm=self.farm)
+        tell_scores = self.engine.calculate_soil_scores(crops, soil)
+
+        # The stored class wins over the free-text location
+        region = Region.objects.create(name='Biskra', soil_type='Sand', climate_class='desert')
+        Farm.objects.filter(id=self.farm.id).update(region=region)
+        farm = Farm.objects.select_related('region').get(id=self.farm.id)
+        engine = SmartProductionPlanningEngine(farm, self.weather, self.market)
+        with self.assertNumQueries(0):
+            self.assertEqual(engine._farm_climate_class(), 'desert')
+        self.assertLess(min(engine.calculate_soil_scores(crops, soil) - tell_scores), 0)
+
+    def test_batch_recommendations_stream_one_line_per_farm(self):
+        other = Farm.objects.create(user=self.farm.user, name='Second farm', location='Blida', size_hectares=12.0,
+                                    soil_type='Clay')
+        client = APIClient()
+        client.force_authenticate(self.farm.user)
+        predictor = self.engine.model_predictor
+        with mock.patch('api.services.weather_api.fetch_weather_data', return_value=None) as weather, \
+                mock.patch.object(predictor, 'predict_batch', wraps=predictor.predict_batch) as predict_batch:
+            response = client.post('/api/recommendations/batch/', {'farm_ids': [other.id, 999, self.farm.id]},
+                                   format='json')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        # One weather lookup for the shared location, one model call for both farms
+        self.assertEqual(weather.call_count, 1)
+        self.assertEqual(predict_batch.call_count, 1)
+
+        self.assertEqual([line['farm_id'] for line in lines], [other.id, 999, self.farm.id])
+        self.assertEqual(lines[1]['error'], 'Farm not found')
+        expected = self.engine.get_recommendations(ai_crops=set())
+        self.assertEqual([r['crop'] for r in lines[2]['recommendations']], [r['crop'] for r in expected])
+        self.assertTrue(all(r['advice_source'] == 'rule_based' for line in (lines[0], lines[2]) for r in line['recommendations']))
+        self.assertEqual(lines[2]['intended_crop_analysis']['crop_name'], 'Olive')
+
+    def test_weather_reads_through_cache_and_fresh_rows(self):
+        fetched = {'location': 'Setif', 'date': datetime.now().date(), 'rainfall_mm': 12.0,
+                   'temperature_avg': 18.0, 'humidity_avg': 55.0, 'sunshine_hours': 9.0}
+        with mock.patch('api.services.weather_api.fetch_weather_data', return_value=fetched) as fetch:
+            weather = get_weather('Setif')
+            with self.assertNumQueries(0):
+                self.assertEqual(get_weather('Setif').id, weather.id)
+            # Another worker (empty cache) finds the fresh row instead of calling the API
+            cache.clear()
+            with self.assertNumQueries(1):
+                self.assertEqual(get_weather('Setif').id, weather.id)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(weather.temperature_avg, 18.0)
+
+        # Past its TTL the row is refreshed
+        cache.clear()
+        with override_settings(WEATHER_CACHE={'LOCATION_TTL_SECONDS': {'Setif': 0}}), \
+                mock.patch('api.services.weather_api.fetch_weather_data', return_value={**fetched, 'temperature_avg': 21.0}):
+            self.assertEqual(get_weather('Setif').temperature_avg, 21.0)
+        self.assertEqual(WeatherData.objects.filter(location='Setif').count(), 1)
+
+    def test_weather_outage_falls_back_to_latest_past_row(self):
+        today = datetime.now().date()
+        for offset, temperature in ((-2, 15.0), (-1, 16.0), (1, 30.0), (3, 32.0)):
+            WeatherData.objects.create(location='Setif', date=today + timedelta(days=offset), rainfall_mm=0.0,
+                                       temperature_avg=temperature, humidity_avg=50.0, sunshine_hours=9.0)
+        with mock.patch('api.services.weather_api.fetch_weather_data', return_value=None) as fetch:
+            weather = get_weather('Setif')
+            # Requests queued behind the failed call reuse its stand-in instead of calling again
+            with self.assertNumQueries(0):
+                self.assertEqual(get_weather('Setif').id, weather.id)
+        self.assertEqual((weather.date, weather.temperature_avg), (today - timedelta(days=1), 16.0))
+        self.assertEqual(fetch.call_count, 1)
+
+        cache.clear()
+        with override_settings(WEATHER_CACHE={'FAILURE_TTL_SECONDS': 0}), \
+                mock.patch('api.services.weather_api.fetch_weather_data', return_value=None) as fetch:
+            get_weather('Setif')
+            get_weather('Setif')
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_prefetch_upserts_region_weather_in_bulk(self):
+        Region.objects.create(name='Tiaret', soil_type='Clay', latitude=35.37, longitude=1.32)
+        Region.objects.create(name='Relizane', soil_type='Loam')
+        today = datetime.now().date()
+        day = lambda offset, temperature: {'date': today + timedelta(days=offset), 'rainfall_mm': 0.0,
+                                           'temperature_avg': temperature, 'humidity_avg': 50.0, 'sunshine_hours': 9.0}
+        with mock.patch('api.services.weather_api.fetch_open_meteo_many',
+                        return_value=[[day(0, 17.0), day(1, 19.0)]]) as many, \
+                mock.patch('api.services.weather_api.fetch_weather_data',
+                           return_value={**day(0, 23.0), 'location': 'Relizane'}):
+            # The regions, then one bulk upsert
+            with self.assertNumQueries(2):
+                self.assertEqual(prefetch_region_weather(), (3, []))
+            prefetch_region_weather()
+        many.assert_called_with([(35.37, 1.32)], days=7)
+        self.assertEqual(WeatherData.objects.filter(location='Tiaret').count(), 2)
+
+        # Requests now read the prefetched rows
+        with mock.patch('api.services.weather_api.fetch_weather_data') as fetch:
+            self.assertEqual(get_weather('Tiaret').temperature_avg, 17.0)
+            self.assertEqual(get_weather('Relizane').temperature_avg, 23.0)
+        fetch.assert_not_called()
+
+    def test_geocoded_regions_fetch_weather_by_coordinates(self):
+        region = Region.objects.create(name='Tiaret', soil_type='Clay')
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, 'geocode_cache.json')
+            with mock.patch('api.management.commands.geocode_regions.GeocodeCache', lambda: GeocodeCache(cache_path)), \
+                    mock.patch('geocoding.geocode', return_value=(35.37, 1.32)) as geocode:
+                call_command('geocode_regions', stdout=io.StringIO())
+                call_command('geocode_regions', stdout=io.StringIO())
+            self.assertEqual(geocode.call_count, 1)
+            # Persisted for the next process (no geocoding call left to make)
+            self.assertEqual(GeocodeCache(cache_path).get('Tiaret'), (35.37, 1.32))
+
+        Farm.objects.filter(id=self.farm.id).update(region=region)
+        farm = Farm.objects.select_related('region').get(id=self.farm.id)
+        with mock.patch('api.services.weather_api.fetch_weather_data', return_value=None) as fetch:
+            get_weather(weather_location(farm), weather_coordinates(farm))
+        fetch.assert_called_once_with('Tiaret', (35.37, 1.32))
+
+    def test_crop_writes_invalidate_catalog(self):
+        self.assertIsNone(crop_catalog.get('Pepper'))
+        Crop.objects.create(name='Pepper', ideal_ph_min=6.0, ideal_ph_max=7.0, water_requirement_mm=500,
+                            growing_days=100, base_yield_per_ha=20.0)
+        self.assertIsNotNone(crop_catalog.get('Pepper'))
+
+    @override_settings(AI_ADVICE={'TOP_K': 2})
+    def test_ai_advice_limited_to_top_k_and_intended_crop(self):
+        recommendations = self.engine.get_recommendations()
+        ai_crops = {r['crop'] for r in recommendations if r['advice_source'] == 'ai'}
+        self.assertEqual(ai_crops, {r['crop'] for r in recommendations[:2]} | {'Olive'})
+        self.assertTrue(all(r['advice'] for r in recommendations))
+
+    def test_on_demand_advice_scores_only_the_requested_crop(self):
+        # The advice request get_recommendations would have made for the lowest-ranked crop
+        self.engine.get_recommendations(defer_advice=True, ai_crops=set(self.CROPS))
+        crop_name = self.engine.get_recommendations(ai_crops=set())[-1]['crop']
+        expected = dict((key[1], request) for key, request, _ in self.engine.deferred_advice)[crop_name]
+
+        engine = SmartProductionPlanningEngine(self.farm, self.weather, self.market)
+        generator = engine.ai_advice_generator
+        with mock.patch.object(engine.model_predictor, 'predict_crops', wraps=engine.model_predictor.predict_crops) as predict_crops, \
+                mock.patch.object(generator, 'generate_crop_advice', wraps=generator.generate_crop_advice) as advice:
+            self.assertTrue(engine.generate_ai_advice(crop_name))
+            self.assertIsNone(engine.generate_ai_advice('Pepper'))
+        predict_crops.assert_called_once()
+        self.assertEqual(predict_crops.call_args.args[0], [crop_name])
+        advice.assert_called_once_with(*expected)
+
+    def _stream_events(self, client, job_id):
+        response = client.get(f'/api/recommendations/advice/{job_id}/', {'stream': '1'})
+        blocks = b''.join(response.streaming_content).decode().strip().split('\n\n')
+        return [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):])) for block in blocks]
+
+    def test_advice_job_completes_for_its_owner_only(self):
+        client = APIClient()
+        client.force_authenticate(self.farm.user)
+        self.engine.get_recommendations(defer_advice=True)
+        crops = {crop_name for (section, crop_name), _, _ in self.engine.deferred_advice if section == 'recommendations'}
+        job_id = start_advice_job(self.engine, self.farm.user.id)
+        deadline = time.monotonic() + 10
+        while get_advice_job(job_id, self.farm.user.id)['status'] == 'running' and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        data = client.get(f'/api/recommendations/advice/{job_id}/').json()
+        self.assertEqual((data['status'], data['pending']), ('done', []))
+        self.assertEqual(set(data['recommendations']), crops)
+        self.assertTrue(all(data['recommendations'].values()))
+        events = self._stream_events(client, job_id)
+        self.assertEqual({payload['crop'] for event, payload in events if event == 'advice'}, crops)
+        self.assertEqual(events[-1], ('done', {'status': 'done'}))
+
+        # Someone else's job is not found, nor is one past its TTL
+        other = User.objects.create_user('neighbour', password='x')
+        self.assertIsNone(get_advice_job(job_id, other.id))
+        client.force_authenticate(other)
+        self.assertEqual(client.get(f'/api/recommendations/advice/{job_id}/').status_code, 404)
+        cache.clear()
+        client.force_authenticate(self.farm.user)
+        self.assertEqual(client.get(f'/api/recommendations/advice/{job_id}/').status_code, 404)
+
+    def test_advice_job_from_another_worker_is_not_reported_as_expired(self):
+        client = APIClient()
+        client.force_authenticate(self.farm.user)
+        self.engine.get_recommendations(defer_advice=True)
+        with mock.patch('api.services.advice_jobs.threading.Thread'), \
+                mock.patch('api.services.advice_jobs._worker_id', 'elsewhere'):
+            job_id = start_advice_job(self.engine, self.farm.user.id)
+        # This process never saw the job: the per-process cache is the problem, not its TTL
+        cache.clear()
+        response = client.get(f'/api/recommendations/advice/{job_id}/')
+        self.assertEqual(response.status_code, 421)
+        self.assertIn('shared cache', response.json()['error'])
+
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            self.assertEqual(client.get(f'/api/recommendations/advice/{job_id}/').status_code, 404)
+
+    @override_settings(ADVICE_STREAM_MAX_SECONDS=0)
+    def test_advice_stream_hands_over_to_polling(self):
+        client = APIClient()
+        client.force_authenticate(self.farm.user)
+        self.engine.get_recommendations(defer_advice=True)
+        # A job that makes no progress
+        with mock.patch('api.services.advice_jobs.threading.Thread'):
+            job_id = start_advice_job(self.engine, self.farm.user.id)
+        pending = [crop_name for (_, crop_name), _, _ in self.engine.deferred_advice]
+        self.assertEqual(self._stream_events(client, job_id), [('resume', {'status': 'running', 'pending': pending})])
+
+    def test_recommendation_view_serves_repeat_requests_from_the_cache(self):
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.farm.user)
+        url = f'/api/recommendations/{self.farm.id}/'
+        with mock.patch('api.services.weather_api.fetch_weather_data', return_value=None):
+            first, second = client.get(url), client.get(url)
+            soil = SoilData.objects.get(farm=self.farm)
+            soil.ph_level = 6.2
+            soil.save()
+            after_soil = client.get(url)
+            # Deferred responses carry a job id and no advice yet: never cached, never served from the cache
+            with mock.patch('api.services.advice_jobs.threading.Thread'):
+                deferred = [client.get(url, {'advice': 'deferred'}) for _ in range(2)]
+            again = client.get(url)
+
+        self.assertEqual([r['X-Cache'] for r in (first, second, after_soil)], ['MISS', 'HIT', 'MISS'])
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual([r['X-Cache'] for r in deferred], ['MISS', 'MISS'])
+        self.assertNotEqual(deferred[0].json()['advice_job_id'], deferred[1].json()['advice_job_id'])
+        self.assertEqual(again['X-Cache'], 'HIT')
+        self.assertNotIn('advice_job_id', again.json())
+
+    def test_recommendation_cache_key_tracks_inputs(self):
+        key = recommendation_cache_key(self.farm, self.weather, 'v1', 'en')
+        self.assertEqual(key, recommendation_cache_key(self.farm, self.weather, 'v1', 'en'))
+        self.assertNotEqual(key, recommendation_cache_key(self.farm, self.weather, 'v2', 'en'))
+        self.assertNotEqual(key, recommendation_cache_key(self.farm, self.weather, 'v1', 'fr'))
+
+        # New soil sample -> this farm's results are stale
+        SoilData.objects.create(farm=self.farm, date_tested=date(2025, 6, 1), ph_level=7.2, nitrogen=1.0,
+                                phosphorus=0.5, potassium=1.0, organic_matter=1.5, salinity=0.5, texture='Loam')
+        soil_key = recommendation_cache_key(self.farm, self.weather, 'v1', 'en')
+        self.assertNotEqual(key, soil_key)
+
+        # Market prices move -> every farm's results are stale
+        market = MarketData.objects.first()
+        market.price_per_kg += 1
+        market.save()
+        self.assertNotEqual(soil_key, recommendation_cache_key(self.farm, self.weather, 'v1', 'en'))
+
+        # Bulk updates send no signals, like writes from another worker with its own cache
+        key = recommendation_cache_key(self.farm, self.weather, 'v1', 'en')
+        for queryset, change in ((SoilData.objects.filter(farm=self.farm), {'ph_level': 6.1}),
+                                 (Crop.objects.filter(name='Olive'), {'base_yield_per_ha': 9.0}),
+                                 (MarketData.objects.all(), {'demand_index': 1.7})):
+            queryset.update(**change)
+            new_key = recommendation_cache_key(self.farm, self.weather, 'v1', 'en')
+            self.assertNotEqual(key, new_key)
+            key = new_key
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import RecommendationView, FarmViewSet, RegisterView, UserProfileView, RegionListView, CropListView, SaveModelResultView, ChatbotView
+from .views import RecommendationView, RecommendationBatchView, RecommendationAdviceView, CropAdviceView, FarmViewSet, RegisterView, UserProfileView, RegionListView, CropListView, SaveModelResultView, ChatbotView
 
 router = DefaultRouter()
 router.register(r'farms', FarmViewSet, basename='farm')
@@ -9,6 +9,9 @@ router.register(r'farms', FarmViewSet, basename='farm')
 urlpatterns = [
     path('', include(router.urls)),
     path('recommendations/<int:farm_id>/', RecommendationView.as_view(), name='recommendations'),
+    path('recommendations/batch/', RecommendationBatchView.as_view(), name='recommendations_batch'),
+    path('recommendations/<int:farm_id>/advice/<str:crop_name>/', CropAdviceView.as_view(), name='crop_advice'),
+    path('recommendations/advice/<str:job_id>/', RecommendationAdviceView.as_view(), name='recommendation_advice'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -2,13 +2,22 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
 from .models import Farm, MarketData, WeatherData, Crop, SoilData, Region
 from .services.recommendation import SmartProductionPlanningEngine
-from .serializers import RecommendationSerializer, FarmSerializer, SoilDataSerializer, UserSerializer, RegisterSerializer, RegionSerializer, CropSerializer
+from .services.advice_jobs import start_advice_job, get_advice_job, advice_job_elsewhere
+from .services.model_predictor import get_model_predictor
+from .services.weather_cache import get_weather, weather_coordinates, weather_location
+from .services.recommendation_cache import recommendation_cache_key, get_cached_recommendations, cache_recommendations
+from .serializers import RecommendationSerializer, AdviceItemSerializer, FarmSerializer, SoilDataSerializer, UserSerializer, RegisterSerializer, RegionSerializer, CropSerializer
 import csv
+import json
 import os
+import time
 import requests
 from datetime import datetime
 from pathlib import Path
@@ -139,12 +148,16 @@ class FarmViewSet(viewsets.ModelViewSet):
 class RecommendationView(APIView):
     permission_classes = [IsAuthenticated]
     
-    def get(self, request, farm_id):
+    @staticmethod
+    def _load_inputs(request, farm_id):
+        """
+        (farm, language, weather, market_data) for the engine, or an error Response
+        """
         try:
             # Only allow access to user's own farms
-            farm = Farm.objects.get(id=farm_id, user=request.user)
+            farm = Farm.objects.select_related('intended_crop', 'region').get(id=farm_id, user=request.user)
         except Farm.DoesNotExist:
-            return Response({"error": "Farm not found"}, status=status.HTTP_404_NOT_FOUND)
+            return None, Response({"error": "Farm not found"}, status=status.HTTP_404_NOT_FOUND)
         
         # Get language from query parameter (default to 'en')
         language = request.query_params.get('language', 'en')
@@ -152,51 +165,255 @@ class RecommendationView(APIView):
         if language not in ['en', 'fr', 'ar']:
             language = 'en'
 
-        # Fetch weather data from API based on farm location
-        from .services.weather_api import get_weather_data
+        weather = get_weather(weather_location(farm), weather_coordinates(farm))
+        if not weather:
+            return None, Response({"error": "Weather data unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         
-        try:
-            weather_data = get_weather_data(farm.location)
-            # Create or update WeatherData entry
-            weather, created = WeatherData.objects.update_or_create(
-                location=farm.location,
-                date=weather_data['date'],
-                defaults={
-                    'rainfall_mm': weather_data['rainfall_mm'],
-                    'temperature_avg': weather_data['temperature_avg'],
-                    'humidity_avg': weather_data['humidity_avg'],
-                    'sunshine_hours': weather_data.get('sunshine_hours', 8.0)
-                }
-            )
-        except Exception as e:
-            # Fallback to latest weather data if API fails
-            print(f"Weather API error: {e}")
-            weather = WeatherData.objects.filter(location=farm.location).first()
-            if not weather:
-                weather = WeatherData.objects.first()
-            if not weather:
-                return Response({"error": "Weather data unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
-        # Get market data
-        market_data = MarketData.objects.all()
+        # Get market data (with its crops joined in, so the engine never queries them one by one)
+        market_data = MarketData.objects.select_related('crop')
         if not market_data:
-            return Response({"error": "Insufficient market data for analysis"}, status=status.HTTP_400_BAD_REQUEST)
+            return None, Response({"error": "Insufficient market data for analysis"}, status=status.HTTP_400_BAD_REQUEST)
 
+        return (farm, language, weather, market_data), None
+    
+    def get(self, request, farm_id):
+        inputs, error = self._load_inputs(request, farm_id)
+        if error is not None:
+            return error
+        farm, language, weather, market_data = inputs
+        
+        # ?advice=deferred: return the ranked scores now and generate the advice in a
+        # background job, served by RecommendationAdviceView as it completes
+        defer_advice = request.query_params.get('advice') == 'deferred'
+        
+        # Unchanged inputs (farm, soil sample, weather, market data, model version,
+        # language) are answered from the recommendation cache. Deferred requests
+        # always get a fresh advice job, so they bypass it
+        model_version = get_model_predictor().model_version
+        cache_key = None if defer_advice else recommendation_cache_key(farm, weather, model_version, language, market_data)
+        cached = get_cached_recommendations(cache_key) if cache_key else None
+        if cached is not None:
+            response = Response(cached)
+            response['X-Cache'] = 'HIT'
+            return response
+        
         print(f"DEBUG: Generating recommendations for Farm ID: {farm.id}, Location: {farm.location}, Soil Type: {farm.soil_type}, Language: {language}")
         engine = SmartProductionPlanningEngine(farm, weather, market_data, language=language)
-        recommendations = engine.get_recommendations()
+        recommendations = engine.get_recommendations(defer_advice=defer_advice)
         
         # Analyze intended crop if farmer specified one
         intended_crop_analysis = None
         if farm.intended_crop:
-            intended_crop_analysis = engine.analyze_intended_crop(farm.intended_crop, market_data)
+            intended_crop_analysis = engine.analyze_intended_crop(farm.intended_crop, market_data, defer_advice=defer_advice)
         
         serializer = RecommendationSerializer(recommendations, many=True)
         response_data = {
             'recommendations': serializer.data,
-            'intended_crop_analysis': intended_crop_analysis
+            'intended_crop_analysis': intended_crop_analysis,
+            'model_version': engine.model_version
         }
-        return Response(response_data)
+        if defer_advice:
+            response_data['advice_job_id'] = start_advice_job(engine, request.user.id)
+        elif engine.model_version is not None and engine.model_version == model_version:
+            # Only complete model results are cached (deferred ones have no advice yet).
+            # The key was taken before computing, so a write that landed meanwhile
+            # has already orphaned it.
+            cache_recommendations(cache_key, response_data)
+        response = Response(response_data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class RecommendationBatchView(APIView):
+    """
+    Recommendations for many of the user's farms in one request:
+    POST {"farm_ids": [...], "language": "en", "advice": "rule_based" | "ai"}
+    Weather is fetched once per location, every farm's crops are predicted in
+    one batched model call, and the results stream back as JSON lines, one
+    {"farm_id", "recommendations", "intended_crop_analysis", "model_version"}
+    (or {"farm_id", "error"}) object per farm, in request order.
+    Advice is rule-based unless "advice": "ai" (top-ranked crops, as in RecommendationView).
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        farm_ids = request.data.get('farm_ids')
+        max_farms = getattr(settings, 'RECOMMENDATION_BATCH_MAX_FARMS', 500)
+        if (not isinstance(farm_ids, list) or not farm_ids
+                or not all(isinstance(farm_id, int) and not isinstance(farm_id, bool) for farm_id in farm_ids)):
+            return Response({"error": "farm_ids must be a non-empty list of farm ids"}, status=status.HTTP_400_BAD_REQUEST)
+        farm_ids = list(dict.fromkeys(farm_ids))
+        if len(farm_ids) > max_farms:
+            return Response({"error": f"At most {max_farms} farms per batch"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        language = request.data.get('language', 'en')
+        if language not in ['en', 'fr', 'ar']:
+            language = 'en'
+        use_ai = request.data.get('advice') == 'ai'
+        
+        # Get market data once for the whole batch (its crops joined in)
+        market_data = list(MarketData.objects.select_related('crop'))
+        if not market_data:
+            return Response({"error": "Insufficient market data for analysis"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Only the user's own farms; ids that aren't get an error line
+        farms = Farm.objects.select_related('intended_crop', 'region').filter(id__in=farm_ids, user=request.user)
+        farms_by_id = {farm.id: farm for farm in farms}
+        
+        response = StreamingHttpResponse(
+            self._lines(farm_ids, farms_by_id, market_data, language, use_ai),
+            content_type='application/x-ndjson'
+        )
+        response['X-Accel-Buffering'] = 'no'  # let nginx pass lines through unbuffered
+        return response
+    
+    @staticmethod
+    def _lines(farm_ids, farms_by_id, market_data, language, use_ai):
+        # Latest soil sample of every farm, in one query (the same sample farm.soil_samples.last() picks)
+        soil_samples = {soil.farm_id: soil for soil in SoilData.objects.filter(farm_id__in=farms_by_id).order_by('pk')}
+        
+        # Weather once per location
+        weather_by_location = {}
+        for farm in farms_by_id.values():
+            location = weather_location(farm)
+            if location not in weather_by_location:
+                weather_by_location[location] = get_weather(location, weather_coordinates(farm))
+        
+        engines = {}
+        for farm_id, farm in farms_by_id.items():
+            weather = weather_by_location[weather_location(farm)]
+            if weather:
+                engine = SmartProductionPlanningEngine(farm, weather, market_data, language=language)
+                engine.use_soil_sample(soil_samples.get(farm_id))
+                engines[farm_id] = engine
+        
+        # Every farm x crop pair in one model call; farms sharing a location, soil
+        # texture, size and weather are predicted once
+        SmartProductionPlanningEngine.predict_many(list(engines.values()))
+        
+        for farm_id in farm_ids:
+            if farm_id not in farms_by_id:
+                line = {'farm_id': farm_id, 'error': 'Farm not found'}
+            elif farm_id not in engines:
+                line = {'farm_id': farm_id, 'error': 'Weather data unavailable'}
+            else:
+                engine = engines.pop(farm_id)  # done with it after this line
+                farm = engine.farm
+                try:
+                    recommendations = engine.get_recommendations(ai_crops=None if use_ai else set())
+                    intended_crop_analysis = None
+                    if farm.intended_crop:
+                        intended_crop_analysis = engine.analyze_intended_crop(farm.intended_crop, market_data, use_ai=use_ai)
+                    line = {
+                        'farm_id': farm_id,
+                        'recommendations': RecommendationSerializer(recommendations, many=True).data,
+                        'intended_crop_analysis': intended_crop_analysis,
+                        'model_version': engine.model_version
+                    }
+                except Exception as e:
+                    print(f"Batch recommendation error for farm {farm_id}: {e}")
+                    line = {'farm_id': farm_id, 'error': 'Recommendation failed'}
+            yield json.dumps(line, cls=JSONEncoder) + "\n"
+
+
+class RecommendationAdviceView(APIView):
+    """
+    Advice for a deferred recommendation (see RecommendationView ?advice=deferred).
+    Polling returns everything generated so far; ?stream=1 sends it as
+    Server-Sent Events, one 'advice' event per crop, then a 'done' event.
+    A stream is held open for at most ADVICE_STREAM_MAX_SECONDS; if the job is
+    still running then, it ends with a 'resume' event and the client polls for
+    the rest. Under the default per-process cache, a job started by another
+    worker answers 421 rather than 404.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, job_id):
+        job = get_advice_job(job_id, request.user.id)
+        if job is None and advice_job_elsewhere(job_id):
+            # Jobs live in the default cache, which is per-process unless CACHES configures a shared one
+            return Response(
+                {"error": "Advice job is held by another server process; the default cache is per-process, "
+                          "so configure a shared cache (CACHES) or route a client to one worker"},
+                status=status.HTTP_421_MISDIRECTED_REQUEST,
+            )
+        if job is None:
+            return Response({"error": "Advice job not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        if request.query_params.get('stream') != '1':
+            intended = job['intended_crop']
+            return Response({
+                'job_id': job_id,
+                'status': job['status'],
+                'recommendations': {crop_name: self._serialize(advice) for crop_name, advice in job['recommendations'].items()},
+                'intended_crop': {'crop': intended['crop'], 'advice': self._serialize(intended['advice'])} if intended else None,
+                'pending': [crop_name for _, crop_name in job['pending']],
+            })
+        
+        response = StreamingHttpResponse(self._events(job_id, request.user.id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # let nginx pass events through unbuffered
+        return response
+    
+    @staticmethod
+    def _serialize(advice):
+        # Same shape as the advice embedded by RecommendationSerializer
+        return AdviceItemSerializer(advice, many=True).data
+    
+    @classmethod
+    def _events(cls, job_id, user_id, poll_seconds=0.5):
+        sent = set()
+        # Each open stream holds a worker, so it gets a short cap rather than the job's whole TTL
+        deadline = time.monotonic() + getattr(settings, 'ADVICE_STREAM_MAX_SECONDS', 30)
+        while True:
+            job = get_advice_job(job_id, user_id)
+            if job is None:
+                yield "event: done\ndata: {\"status\": \"expired\"}\n\n"
+                return
+            
+            finished = [('recommendations', crop_name, advice) for crop_name, advice in job['recommendations'].items()]
+            intended = job['intended_crop']
+            if intended is not None:
+                finished.append(('intended_crop', intended['crop'], intended['advice']))
+            for section, crop_name, advice in finished:
+                if (section, crop_name) not in sent:
+                    sent.add((section, crop_name))
+                    payload = {'section': section, 'crop': crop_name, 'advice': cls._serialize(advice)}
+                    yield f"event: advice\ndata: {json.dumps(payload)}\n\n"
+            
+            if job['status'] != 'running':
+                yield f"event: done\ndata: {json.dumps({'status': job['status']})}\n\n"
+                return
+            if time.monotonic() + poll_seconds >= deadline:
+                pending = [crop_name for _, crop_name in job['pending']]
+                yield f"event: resume\ndata: {json.dumps({'status': 'running', 'pending': pending})}\n\n"
+                return
+            time.sleep(poll_seconds)
+
+class CropAdviceView(APIView):
+    """
+    OpenAI advice for one recommended crop, on demand. Recommendations only get
+    AI advice for the top AI_ADVICE['TOP_K'] crops (and the intended crop); the
+    rest come with rule-based advice and advice_source 'rule_based'.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, farm_id, crop_name):
+        inputs, error = RecommendationView._load_inputs(request, farm_id)
+        if error is not None:
+            return error
+        farm, language, weather, market_data = inputs
+        
+        engine = SmartProductionPlanningEngine(farm, weather, market_data, language=language)
+        advice = engine.generate_ai_advice(crop_name)
+        if advice is None:
+            return Response({"error": "Crop not found in recommendations"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'crop': crop_name,
+            'advice': AdviceItemSerializer(advice, many=True).data,
+            'model_version': engine.model_version
+        })
+
 
 class SaveModelResultView(APIView):
     permission_classes = [IsAuthenticated]
@@ -206,7 +423,7 @@ class SaveModelResultView(APIView):
         Save model prediction results to CSV file for future training
         """
         try:
-            farm = Farm.objects.get(id=farm_id, user=request.user)
+            farm = Farm.objects.select_related('region').get(id=farm_id, user=request.user)
         except Farm.DoesNotExist:
             return Response({"error": "Farm not found"}, status=status.HTTP_404_NOT_FOUND)
         
@@ -246,8 +463,11 @@ class SaveModelResultView(APIView):
         year = now.year
         month = now.month
         
-        # Get weather data
-        weather = WeatherData.objects.filter(location=farm.location).first()
+        # Latest weather stored for the farm (under its region, like the recommendation views), no forecast days
+        weather = (WeatherData.objects
+                   .filter(location=weather_location(farm), date__lte=now.date())
+                   .order_by('-date', '-id')
+                   .first())
         temperature_c = weather.temperature_avg if weather else 20.0
         rainfall_mm = weather.rainfall_mm if weather else 300.0
         
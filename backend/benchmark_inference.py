@@ -0,0 +1,69 @@
+"""
+Compare model artifact formats and inference engines: load time and
+per-call prediction latency.
+
+    python benchmark_inference.py            # pickle vs native vs numpy (exports native if missing)
+    python benchmark_inference.py --rounds 500
+"""
+import argparse
+import os
+import time
+import warnings
+import joblib
+from model_store import ModelSnapshot, export_native, load_native, NATIVE_META
+from train_model import ARTIFACTS_PATH, NATIVE_ARTIFACTS_DIR
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def legacy_predict(artifacts, encoder, rows):
+    """Pre-native path: sklearn wrappers (predict_proba / predict)"""
+    X_cls, X_price, X_yield = encoder.scale_heads(rows)
+    return (artifacts['rfc'].predict_proba(X_cls)[:, 1],
+            artifacts['lr_price'].predict(X_price),
+            artifacts['lr_yield'].predict(X_yield))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    meta_path = os.path.join(NATIVE_ARTIFACTS_DIR, NATIVE_META)
+    if not os.path.exists(meta_path):
+        export_native(joblib.load(ARTIFACTS_PATH), NATIVE_ARTIFACTS_DIR)
+
+    load_ms = {
+        'pickle': timed(lambda: joblib.load(ARTIFACTS_PATH), 5),
+        'native': timed(lambda: load_native(meta_path), 5),
+        'numpy': timed(lambda: load_native(meta_path, engine='numpy'), 5),
+    }
+    pickled = joblib.load(ARTIFACTS_PATH)
+    native = ModelSnapshot(load_native(meta_path), 'native')
+    flat = ModelSnapshot(load_native(meta_path, engine='numpy'), 'numpy', engine='numpy')
+    encoder = native.encoder
+    crops = encoder.known_crops()
+
+    single = encoder.encode(crops[:1], 'Biskra', 'Loam', 2025, 5, 5.0, 22.0, 300.0).copy()
+    batch = encoder.encode(crops, 'Biskra', 'Loam', 2025, 5, 5.0, 22.0, 300.0).copy()
+
+    print(f"{'path':<8} {'load ms':>9} {'1 row ms':>9} {len(crops):>3} rows ms")
+    print(f"{'pickle':<8} {load_ms['pickle']:>9.2f} "
+          f"{timed(lambda: legacy_predict(pickled, encoder, single), args.rounds):>9.3f} "
+          f"{timed(lambda: legacy_predict(pickled, encoder, batch), args.rounds):>10.3f}")
+    print(f"{'native':<8} {load_ms['native']:>9.2f} "
+          f"{timed(lambda: native.predict(single), args.rounds):>9.3f} "
+          f"{timed(lambda: native.predict(batch), args.rounds):>10.3f}")
+    print(f"{'numpy':<8} {load_ms['numpy']:>9.2f} "
+          f"{timed(lambda: flat.predict(single), args.rounds):>9.3f} "
+          f"{timed(lambda: flat.predict(batch), args.rounds):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Serving processes only (uvicorn, daphne, ...): load the model before the first request
+from api.services.warmup import warm_up_server  # noqa: E402
+
+warm_up_server()
@@ -142,3 +142,102 @@ SIMPLE_JWT = {
 }
 
 
+# In-process cache for ML model predictions (see api/services/model_predictor.py).
+# Area, temperature and rainfall are bucketed to these widths for the cache key only (the model sees raw values).
+PREDICTION_CACHE = {
+    'MAX_ENTRIES': 4096,
+    'TTL_SECONDS': 6 * 60 * 60,
+    'AREA_BUCKET_HA': 0.5,
+    'TEMPERATURE_BUCKET_C': 0.5,
+    'RAINFALL_BUCKET_MM': 5.0,
+}
+
+# Seconds between checks of models/agri_advisor_v5.pkl for a retrained artifact (0 disables hot reload)
+MODEL_RELOAD_INTERVAL_SECONDS = 30
+
+# Which model artifact to serve: 'native' (XGBoost UBJ boosters + meta.json),
+# 'pickle' (joblib) or 'auto' (native when exported next to the pickle)
+MODEL_ARTIFACT_FORMAT = 'auto'
+
+# How boosters are evaluated: 'xgboost' (Booster.inplace_predict) or 'numpy'
+# (flattened tree arrays, lower per-call overhead for small batches; with the
+# native export the arrays are memory-mapped and shared by all workers on a host)
+MODEL_INFERENCE_ENGINE = 'xgboost'
+
+# Answer predictions from the precomputed grid (models/agri_advisor_v5_grid, built
+# by train_model.py) when one matching the loaded model exists; inputs outside it
+# still go to the live model
+PREDICTION_GRID_ENABLED = True
+
+# Load the model and run a synthetic prediction batch when a serving process starts
+# (core/wsgi.py and core/asgi.py), so the first request in each worker doesn't pay
+# for it. Tests and other manage.py commands never load the WSGI/ASGI module.
+MODEL_WARMUP_ON_STARTUP = True
+
+# Seconds the recommendation engine's in-process Crop catalog is trusted; local
+# Crop writes invalidate it immediately, this bounds staleness from other processes
+CROP_CATALOG_TTL_SECONDS = 300
+
+# AI advice generation per recommendation request: only the TOP_K crops by
+# final_score (plus the farm's intended crop) are sent to OpenAI, concurrently
+# on up to MAX_WORKERS threads; whatever isn't back within DEADLINE_SECONDS
+# (for the whole batch) falls back to rule-based advice. Other crops get
+# rule-based advice, with AI advice available per crop on demand
+AI_ADVICE = {
+    'MAX_WORKERS': 4,
+    'DEADLINE_SECONDS': 20.0,
+    'TOP_K': 3,
+}
+
+# Seconds a deferred-advice job (RecommendationView ?advice=deferred) stays readable.
+# Jobs live in the default cache: use a shared backend (e.g. Redis) when running
+# several workers without sticky sessions. With the default per-process cache, a poll
+# that reaches another worker gets a 421 naming this, not a 404
+ADVICE_JOB_TTL_SECONDS = 600
+
+# Longest an advice stream (?stream=1) stays open; a job still running after it
+# ends the stream with a 'resume' event and the client switches to polling
+ADVICE_STREAM_MAX_SECONDS = 30
+
+# Seconds a farm's computed recommendations are served from the default cache.
+# The key is read from the database on every request (api/services/recommendation_cache.py),
+# so a Farm, SoilData, Crop, MarketData or Region write from any process misses it, as
+# does a different weather row, model version or language. With the default per-process
+# cache each worker just computes its own copy
+RECOMMENDATION_CACHE_TTL_SECONDS = 900
+
+# Weather read-through cache (api/services/weather_cache.py): API results are
+# served from the default cache and their WeatherData row for TTL_SECONDS
+# (LOCATION_TTL_SECONDS overrides it per farm location) before the API is called again.
+# A failed call's stand-in row is cached for FAILURE_TTL_SECONDS (0: retry on every request)
+WEATHER_CACHE = {
+    'TTL_SECONDS': 30 * 60,
+    'LOCATION_TTL_SECONDS': {},
+    'FAILURE_TTL_SECONDS': 60,
+}
+
+# Background weather refresh for every Region (manage.py prefetch_weather, from
+# cron or with --loop every INTERVAL_SECONDS): today's conditions plus
+# FORECAST_DAYS of daily forecast, bulk-upserted into WeatherData. Keep the
+# interval under WEATHER_CACHE['TTL_SECONDS'] so requests only read local rows
+WEATHER_PREFETCH = {
+    'INTERVAL_SECONDS': 15 * 60,
+    'FORECAST_DAYS': 7,
+    'LOCATIONS_PER_CALL': 50,
+}
+
+# Shared outbound HTTP client for the weather providers (http_client.py):
+# keep-alive connections kept per host, requests in flight per host (waited for only within each
+# call's time budget), retries with jittered exponential backoff (inside that budget too), and the
+# connect timeout per attempt
+HTTP_CLIENT = {
+    'POOL_MAXSIZE': 10,
+    'MAX_CONNECTIONS_PER_HOST': 10,
+    'MAX_RETRIES': 2,
+    'BACKOFF_BASE_SECONDS': 0.25,
+    'BACKOFF_MAX_SECONDS': 2.0,
+    'CONNECT_TIMEOUT_SECONDS': 3.05,
+}
+
+# Most farms one POST /api/recommendations/batch/ request may ask for
+RECOMMENDATION_BATCH_MAX_FARMS = 500
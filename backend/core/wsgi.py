@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Serving processes only (runserver, gunicorn, uwsgi, ...): load the model before the first request
+from api.services.warmup import warm_up_server  # noqa: E402
+
+warm_up_server()
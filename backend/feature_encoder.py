@@ -0,0 +1,106 @@
+import threading
+import numpy as np
+
+# Raw numeric inputs in the order encode() receives them
+NUMERIC_INPUTS = ('month', 'year', 'planted_area', 'temperature_c', 'rainfall_mm')
+
+# (artifact key, head name) for the scaler that feeds each model
+SCALER_HEADS = (('scaler_cls', 'cls'), ('scaler_price', 'price'), ('scaler_yield', 'yield'))
+
+
+class FeatureEncoder:
+    """
+    Encodes (crop, region, soil, date, area, weather) inputs into model-ready rows.
+
+    Built once per loaded artifact: every one-hot column position is resolved up
+    front, so encoding a request is plain NumPy indexing into a reused buffer
+    instead of building and copying DataFrames.
+    """
+
+    def __init__(self, feature_cols, numerical_cols, scaling=None):
+        self.feature_cols = list(feature_cols)
+        self.numerical_cols = list(numerical_cols)
+        self.n_features = len(self.feature_cols)
+
+        col_index = {col: i for i, col in enumerate(self.feature_cols)}
+        self.input_index = np.array([col_index[col] for col in NUMERIC_INPUTS])
+        self.numeric_index = np.array([col_index[col] for col in self.numerical_cols])
+        self.region_index = self._prefix_index(col_index, 'region_')
+        self.soil_index = self._prefix_index(col_index, 'soil_type_')
+        self.crop_index = self._prefix_index(col_index, 'crop_')
+
+        # StandardScaler parameters (head -> (mean, scale)) folded into
+        # (n_heads, n_numeric) arrays, one row per model head in SCALER_HEADS order
+        scaling = scaling or {}
+        self.heads = tuple(head for _, head in SCALER_HEADS if head in scaling)
+        self.head_mean = np.array([scaling[head][0] for head in self.heads], dtype=np.float64)
+        self.head_scale = np.array([scaling[head][1] for head in self.heads], dtype=np.float64)
+
+        self._local = threading.local()
+
+    @classmethod
+    def from_artifacts(cls, artifacts):
+        """
+        Build the encoder for a loaded artifacts dict: either the pickle from
+        train_pipeline (fitted scalers) or native artifacts ('scaling' params)
+        """
+        scaling = artifacts.get('scaling')
+        if scaling is None:
+            scaling = {head: (artifacts[key].mean_, artifacts[key].scale_)
+                       for key, head in SCALER_HEADS if key in artifacts}
+        return cls(artifacts['feature_cols'], artifacts['numerical_cols'], scaling)
+
+    def scaling_params(self):
+        """head -> {'mean': [...], 'scale': [...]}, JSON-serializable"""
+        return {head: {'mean': self.head_mean[i].tolist(), 'scale': self.head_scale[i].tolist()}
+                for i, head in enumerate(self.heads)}
+
+    @staticmethod
+    def _prefix_index(col_index, prefix):
+        return {col[len(prefix):]: i for col, i in col_index.items() if col.startswith(prefix)}
+
+    def has_crop(self, crop):
+        return crop in self.crop_index
+
+    def known_crops(self):
+        return list(self.crop_index)
+
+    def _rows(self, n_rows):
+        """Zeroed (n_rows, n_features) view into this thread's reusable buffer"""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.shape[0] < n_rows:
+            buffer = np.zeros((max(n_rows, 32), self.n_features), dtype=np.float64)
+            self._local.buffer = buffer
+        rows = buffer[:n_rows]
+        rows.fill(0.0)
+        return rows
+
+    def encode(self, crops, region, soil, year, month, area, temp, rain):
+        """
+        Encode one row per crop sharing the same farm inputs.
+        Every crop must be known to the model (see has_crop). The returned array
+        is a view into a per-thread buffer and is only valid until the next call.
+        """
+        rows = self._rows(len(crops))
+        rows[:, self.input_index] = (month, year, area, temp, rain)
+
+        region_col = self.region_index.get(region)
+        if region_col is not None:
+            rows[:, region_col] = 1.0
+        soil_col = self.soil_index.get(soil)
+        if soil_col is not None:
+            rows[:, soil_col] = 1.0
+        crop_cols = [self.crop_index[crop] for crop in crops]
+        rows[np.arange(len(crops)), crop_cols] = 1.0
+        return rows
+
+    def scale_heads(self, rows):
+        """
+        Standardize rows for every model head in one vectorized step.
+        Returns an (n_heads, n_rows, n_features) array; unpack it as
+        X_cls, X_price, X_yield = encoder.scale_heads(rows).
+        """
+        scaled = np.broadcast_to(rows, (len(self.heads),) + rows.shape).copy()
+        numeric = rows[:, self.numeric_index]
+        scaled[:, :, self.numeric_index] = (numeric - self.head_mean[:, None, :]) / self.head_scale[:, None, :]
+        return scaled
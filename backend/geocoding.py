@@ -0,0 +1,75 @@
+import json
+import os
+import tempfile
+import threading
+from http_client import get_http_client
+
+GEOCODING_URL = 'https://geocoding-api.open-meteo.com/v1/search'
+
+# Shared by the API's geocode_regions command and the FastAPI WeatherService
+GEOCODE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'geocode_cache.json')
+
+
+def geocode(name, country_code='DZ', timeout=3):
+    """
+    (latitude, longitude) of the best Open-Meteo match for a place name, or None.
+    country_code restricts the search (None: anywhere), so a wilaya isn't
+    resolved to a namesake abroad.
+    """
+    params = {'name': name, 'count': 1, 'language': 'en', 'format': 'json'}
+    if country_code:
+        params['countryCode'] = country_code
+    try:
+        data = get_http_client().get(GEOCODING_URL, params=params, timeout=timeout).json()
+    except Exception as e:
+        print(f"Geocoding error for {name}: {e}")
+        return None
+    results = data.get('results') or []
+    if not results:
+        return None
+    return results[0]['latitude'], results[0]['longitude']
+
+
+class GeocodeCache:
+    """
+    Place name -> (latitude, longitude), persisted as JSON so every place is
+    geocoded once rather than on every cold start. Failed lookups aren't
+    stored and are retried on the next get().
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, country_code='DZ'):
+        self.path = path
+        self.country_code = country_code
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._coordinates = {name: tuple(coords) for name, coords in json.load(f).items()}
+        except (OSError, ValueError):
+            self._coordinates = {}
+
+    def get(self, name):
+        coordinates = self._coordinates.get(name)
+        if coordinates is None:
+            coordinates = geocode(name, self.country_code)
+            if coordinates is not None:
+                self.update({name: coordinates})
+        return coordinates
+
+    def update(self, coordinates):
+        """Store several name -> (latitude, longitude) pairs, in one write"""
+        with self._lock:
+            self._coordinates.update(coordinates)
+            self._save()
+
+    def _save(self):
+        # Write a temp file and rename it over the cache, so readers never see half a file
+        try:
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._coordinates, f, indent=1, sort_keys=True, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # Still cached in memory for this process
+            print(f"Could not save geocode cache {self.path}: {e}")
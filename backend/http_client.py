@@ -0,0 +1,160 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# Defaults for HTTPClient (settings.HTTP_CLIENT overrides them under Django, see api/apps.py)
+HTTP_CLIENT_DEFAULTS = {
+    'POOL_MAXSIZE': 10,        # keep-alive connections kept per host; callers beyond it open a short-lived one
+    'MAX_CONNECTIONS_PER_HOST': 10,  # concurrent requests per host; callers beyond it wait within their budget
+    'MAX_RETRIES': 2,          # retries after the first attempt
+    'BACKOFF_BASE_SECONDS': 0.25,
+    'BACKOFF_MAX_SECONDS': 2.0,
+    'CONNECT_TIMEOUT_SECONDS': 3.05,
+}
+
+# Responses worth another attempt: rate limiting and transient server errors
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class HTTPClient:
+    """
+    Outbound HTTP for the weather providers: one keep-alive requests.Session
+    with a bounded pool per host, at most max_connections_per_host requests in
+    flight per host, and GETs retried with jittered exponential backoff inside
+    a per-call time budget.
+    """
+
+    def __init__(self, pool_maxsize=10, max_retries=2, backoff_base=0.25, backoff_max=2.0, connect_timeout=3.05,
+                 max_connections_per_host=10):
+        self.max_connections_per_host = max_connections_per_host
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.session = requests.Session()
+        # Retries are ours (they need the time budget). The pool doesn't block: waiting for a
+        # free connection has no timeout in requests, so the per-host limit is enforced by
+        # _host_slot instead, which waits no longer than the caller's remaining budget
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, pool_block=False, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _host_slot(self, url):
+        """The semaphore bounding concurrent requests to url's host"""
+        parts = urlsplit(url)
+        host = (parts.scheme, parts.netloc)
+        slot = self._host_slots.get(host)
+        if slot is None:
+            with self._host_slots_lock:
+                slot = self._host_slots.setdefault(host, threading.BoundedSemaphore(self.max_connections_per_host))
+        return slot
+
+    def _backoff(self, attempt, response=None):
+        """Seconds to wait before retry number attempt (1-based): full jitter, or the server's Retry-After"""
+        if response is not None:
+            retry_after = _retry_after_seconds(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return retry_after
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, params=None, timeout=10.0):
+        """
+        GET url within a budget of timeout seconds for all attempts together.
+        Connection errors, timeouts and RETRY_STATUSES are retried while the budget
+        allows; the last response is returned whatever its status (check it like
+        requests.get's), and the last error is raised if no attempt got a response.
+        """
+        deadline = time.monotonic() + timeout
+        slot = self._host_slot(url)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            response = error = None
+            # Each attempt holds one of the host's slots; backoff sleeps don't
+            if slot.acquire(timeout=max(remaining, 0)):
+                try:
+                    remaining = deadline - time.monotonic()
+                    response = self.session.get(
+                        url, params=params, timeout=(min(self.connect_timeout, remaining), max(remaining, 0.001))
+                    )
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                finally:
+                    slot.release()
+            else:
+                error = requests.Timeout(f"No connection to {urlsplit(url).netloc} free within {timeout:.1f}s")
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+
+            attempt += 1
+            delay = self._backoff(attempt, response)
+            if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                if response is not None:
+                    return response
+                raise error
+            if response is not None:
+                response.close()  # hand the connection back to the pool
+            time.sleep(delay)
+
+
+def _retry_after_seconds(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Process-wide client, built on first use
+_client = None
+_client_options = dict(HTTP_CLIENT_DEFAULTS)
+_client_lock = threading.Lock()
+
+
+def configure_http_client(options):
+    """Override HTTP_CLIENT_DEFAULTS (same keys); the shared client is rebuilt on next use"""
+    global _client
+    with _client_lock:
+        _client_options.update(options)
+        _client = None
+
+
+def get_http_client():
+    """The process-wide HTTPClient, shared so its connections are reused across calls"""
+    global _client
+    client = _client
+    if client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HTTPClient(
+                    pool_maxsize=_client_options['POOL_MAXSIZE'],
+                    max_retries=_client_options['MAX_RETRIES'],
+                    backoff_base=_client_options['BACKOFF_BASE_SECONDS'],
+                    backoff_max=_client_options['BACKOFF_MAX_SECONDS'],
+                    connect_timeout=_client_options['CONNECT_TIMEOUT_SECONDS'],
+                    max_connections_per_host=_client_options['MAX_CONNECTIONS_PER_HOST'],
+                )
+            client = _client
+    return client
+
+
+def _reset_client_after_fork():
+    # A forked worker must not share the parent's sockets
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_client_after_fork)
@@ -1,31 +1,50 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from pydantic import BaseModel, Field
-import pandas as pd
-import joblib
 import os
 import csv
+import time
+import threading
+from datetime import datetime
 from contextlib import asynccontextmanager
-from train_model import train_pipeline, ARTIFACTS_PATH, DATA_PATH
+from train_model import train_pipeline, rebuild_grid, ARTIFACTS_PATH, DATA_PATH
 from weather_service import WeatherService
+from model_store import ModelStore, artifact_source
 
-models = {}
+# Current model snapshot; swapped atomically on retrain or when the artifact changes on disk
+INFERENCE_ENGINE = os.environ.get('MODEL_INFERENCE_ENGINE', 'xgboost')
+model_store = ModelStore(
+    *artifact_source(ARTIFACTS_PATH, artifact_format=os.environ.get('MODEL_ARTIFACT_FORMAT', 'auto'),
+                     engine=INFERENCE_ENGINE),
+    engine=INFERENCE_ENGINE,
+)
 weather_engine = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Load or Train
-    if os.path.exists(ARTIFACTS_PATH):
+    if os.path.exists(model_store.path):
         print("Loading models...")
-        models.update(joblib.load(ARTIFACTS_PATH))
+        model_store.refresh()
     else:
         print("Training models...")
-        models.update(train_pipeline())
+        artifacts = train_pipeline()
+        model_store.publish(artifacts)
+        # The grid takes about a minute; serve from the model until it is there
+        threading.Thread(target=rebuild_grid, args=(artifacts,), name='grid-rebuild', daemon=True).start()
+    model_store.watch(float(os.environ.get('MODEL_RELOAD_INTERVAL_SECONDS', 30)))
     
     # Startup: Weather
     global weather_engine
     weather_engine = WeatherService(DATA_PATH)
+    
+    # Startup: Warm-up, so the first request doesn't pay for lazy initialization
+    if os.environ.get('MODEL_WARMUP_ON_STARTUP', '1') == '1':
+        try:
+            warm_up(model_store.current())
+        except Exception as e:
+            print(f"Model warm-up failed: {e}")
     yield
-    models.clear()
+    model_store.stop()
 
 app = FastAPI(title="Agri-Advisor V5", lifespan=lifespan)
 
@@ -46,47 +65,50 @@ class ConfirmationInput(BaseModel):
     predicted_price: float
     predicted_risk_prob: float
 
-def score(crop, region, soil, year, month, area, temp, rain):
-    df = pd.DataFrame(0, index=[0], columns=models['feature_cols'])
-    df['year'] = year; df['month'] = month; df['planted_area'] = area
-    df['temperature_c'] = temp; df['rainfall_mm'] = rain
+def score(models, crop, region, soil, year, month, area, temp, rain):
+    encoder = models.encoder
+    if not encoder.has_crop(crop): return None
+    X = encoder.encode([crop], region, soil, year, month, area, temp, rain)
+    risk, price, yld = models.predict(X)
     
-    if f"region_{region}" in models['feature_cols']: df[f"region_{region}"] = 1
-    if f"soil_type_{soil}" in models['feature_cols']: df[f"soil_type_{soil}"] = 1
-    if f"crop_{crop}" in models['feature_cols']: df[f"crop_{crop}"] = 1
-    else: return None
+    return float(risk[0]), float(price[0]), float(yld[0])
 
-    cols = models['numerical_cols']
-    X_cls = df.copy(); X_cls[cols] = models['scaler_cls'].transform(X_cls[cols])
-    risk = models['rfc'].predict_proba(X_cls)[:, 1][0]
-    
-    X_reg = df.copy(); X_reg[cols] = models['scaler_price'].transform(X_reg[cols])
-    price = models['lr_price'].predict(X_reg)[0]
-    
-    X_reg[cols] = models['scaler_yield'].transform(X_reg[cols])
-    yld = models['lr_yield'].predict(X_reg)[0]
-    
-    return risk, price, yld
+def warm_up(models):
+    """Score every crop once (single rows, like the endpoints) and report the timings"""
+    if models is None:
+        return
+    started = time.perf_counter()
+    region, soil = next(iter(models['region_soil_map'].items()))
+    now = datetime.now()
+    crops = models.encoder.known_crops()
+    for crop in crops:
+        score(models, crop, region, soil, now.year, now.month, 5.0, 25.0, 25.0)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"Warm-up (model {models.version}): {len(crops)} crops scored in {elapsed_ms:.1f} ms")
 
 def background_retrain():
     try:
-        new_artifacts = train_pipeline()
-        models.update(new_artifacts)
+        artifacts = train_pipeline()
+        model_store.publish(artifacts)
         global weather_engine
         weather_engine = WeatherService(DATA_PATH)
-    except: pass
+    except: return
+    # Still off the request path; the old grid is rejected until this replaces it
+    rebuild_grid(artifacts)
 
 @app.post("/predict_optimization")
 def predict_optimization(data: CropInput):
+    models = model_store.current()  # one snapshot for the whole request
     soil = models['region_soil_map'].get(data.region, 'Loamy')
     temp, rain = weather_engine.get_weather(data.region, data.year, data.month)
     
-    res = score(data.crop, data.region, soil, data.year, data.month, data.planted_area, temp, rain)
+    res = score(models, data.crop, data.region, soil, data.year, data.month, data.planted_area, temp, rain)
     if not res: raise HTTPException(400, "Crop not supported")
     risk, price, yld = res
 
     response = {
         "status": "PROCEED",
+        "model_version": models.version,
         "weather": {"temp": temp, "rain": rain},
         "soil": soil,
         "prediction": {"risk": round(risk, 2), "price": round(price, 2), "yield": round(yld, 2)}
@@ -104,7 +126,7 @@ def predict_optimization(data: CropInput):
             if not wr or not (wr['T_min'] <= temp <= wr['T_max'] and wr['R_min'] <= rain <= wr['R_max']):
                 continue
             
-            alt_res = score(alt, data.region, soil, data.year, data.month, data.planted_area, temp, rain)
+            alt_res = score(models, alt, data.region, soil, data.year, data.month, data.planted_area, temp, rain)
             if alt_res:
                 a_risk, a_price, a_yld = alt_res
                 a_rev = a_price * a_yld * data.planted_area
@@ -118,6 +140,7 @@ def predict_optimization(data: CropInput):
 
 @app.post("/confirm_advice")
 def confirm_advice(fb: ConfirmationInput, background_tasks: BackgroundTasks):
+    models = model_store.current()
     soil = models['region_soil_map'].get(fb.region, 'Loamy')
     temp, rain = weather_engine.get_weather(fb.region, fb.year, fb.month)
     
@@ -129,4 +152,4 @@ def confirm_advice(fb: ConfirmationInput, background_tasks: BackgroundTasks):
         csv.writer(f).writerow(row)
     
     background_tasks.add_task(background_retrain)
-    return {"message": "Data saved. Retraining started."}
\ No newline at end of file
+    return {"message": "Data saved. Retraining started.", "model_version": models.version}
\ No newline at end of file
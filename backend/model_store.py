@@ -0,0 +1,305 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from types import MappingProxyType
+import joblib
+import numpy as np
+from feature_encoder import FeatureEncoder
+from tree_ensemble import FlatTreeEnsemble
+
+# (artifact key, head) for the three boosters, in FeatureEncoder.SCALER_HEADS order
+MODEL_HEADS = (('rfc', 'cls'), ('lr_price', 'price'), ('lr_yield', 'yield'))
+
+# Non-model artifacts copied verbatim into the native metadata sidecar
+META_KEYS = ('feature_cols', 'numerical_cols', 'region_soil_map', 'soil_crop_pool', 'weather_ranges', 'risk_threshold')
+
+NATIVE_META = 'meta.json'
+
+# Inference engines a snapshot can run its boosters with:
+# 'xgboost' calls Booster.inplace_predict, 'numpy' walks FlatTreeEnsemble arrays
+INFERENCE_ENGINES = ('xgboost', 'numpy')
+
+
+def file_version(path):
+    """Short content hash identifying one artifact file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _booster(model):
+    """Raw xgboost Booster behind an sklearn wrapper (or the Booster itself)"""
+    return model.get_booster() if hasattr(model, 'get_booster') else model
+
+
+def export_native(artifacts, directory):
+    """
+    Write artifacts in XGBoost's native UBJ format plus a JSON metadata sidecar.
+
+    Every booster is also written flattened (see FlatTreeEnsemble.save) as a
+    .npy the 'numpy' engine memory-maps, so all workers on a host share its pages.
+
+    Each export writes its files under a new generation stamp and then
+    atomically replaces meta.json, which names the files to load; readers
+    therefore always see one complete generation. Older generations are
+    pruned, keeping the previous one for readers still loading it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%d%H%M%S') + f"-{os.getpid()}"
+
+    boosters, flat_trees = {}, {}
+    for key, head in MODEL_HEADS:
+        booster = _booster(artifacts[key])
+        filename = f"{key}.{stamp}.ubj"
+        booster.save_model(os.path.join(directory, filename))
+        boosters[head] = filename
+
+        flat_name = f"{key}.{stamp}.npy"
+        params = FlatTreeEnsemble.from_booster(booster).save(os.path.join(directory, flat_name))
+        flat_trees[head] = {'file': flat_name, **params}
+
+    meta = {key: artifacts[key] for key in META_KEYS if key in artifacts}
+    meta['scaling'] = FeatureEncoder.from_artifacts(artifacts).scaling_params()
+    meta['boosters'] = boosters
+    meta['flat_trees'] = flat_trees
+    meta['generation'] = stamp
+
+    meta_path = os.path.join(directory, NATIVE_META)
+    previous = set()
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            previous_meta = json.load(f)
+        previous = set(previous_meta.get('boosters', {}).values())
+        previous |= {flat['file'] for flat in previous_meta.get('flat_trees', {}).values()}
+
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, default=_to_json)
+    os.replace(tmp_path, meta_path)
+
+    keep = previous | set(boosters.values()) | {flat['file'] for flat in flat_trees.values()}
+    for path in glob.glob(os.path.join(directory, '*.ubj')) + glob.glob(os.path.join(directory, '*.npy')):
+        if os.path.basename(path) not in keep:
+            os.remove(path)
+    return meta_path
+
+
+def load_native(meta_path, engine='xgboost'):
+    """
+    Load an artifacts dict written by export_native (boosters instead of sklearn wrappers).
+    For the 'numpy' engine the memory-mapped flat trees are loaded instead and
+    XGBoost is never touched.
+    """
+    directory = os.path.dirname(meta_path)
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    artifacts = {key: meta[key] for key in META_KEYS if key in meta}
+    artifacts['scaling'] = {head: (params['mean'], params['scale']) for head, params in meta['scaling'].items()}
+    flat_trees = meta.get('flat_trees') if engine == 'numpy' else None
+    for key, head in MODEL_HEADS:
+        if flat_trees:
+            artifacts[key] = FlatTreeEnsemble.load(os.path.join(directory, flat_trees[head]['file']), flat_trees[head])
+        else:
+            # Imported here so 'numpy'-engine workers never pay for (or map) XGBoost itself
+            import xgboost as xgb
+            booster = xgb.Booster()
+            booster.load_model(os.path.join(directory, meta['boosters'][head]))
+            artifacts[key] = booster
+    return artifacts
+
+
+def artifact_source(pickle_path, native_dir=None, artifact_format='auto', engine='xgboost'):
+    """
+    (path, loader) for a ModelStore: the native meta.json when requested (or, with
+    'auto', when present), otherwise the joblib pickle
+    """
+    if native_dir is None:
+        native_dir = os.path.splitext(str(pickle_path))[0]
+    meta_path = os.path.join(native_dir, NATIVE_META)
+    if artifact_format == 'native' or (artifact_format == 'auto' and os.path.exists(meta_path)):
+        print(f"Model artifacts: native export {meta_path} (format={artifact_format})")
+        try:
+            if os.path.getmtime(meta_path) < os.path.getmtime(pickle_path):
+                print(f"WARNING: {meta_path} is older than {pickle_path}; re-export it or set MODEL_ARTIFACT_FORMAT='pickle'")
+        except OSError:
+            pass
+        return meta_path, functools.partial(load_native, engine=engine)
+    print(f"Model artifacts: pickle {pickle_path} (format={artifact_format})")
+    return str(pickle_path), joblib.load
+
+
+def _reset_after_fork(store_ref):
+    store = store_ref()
+    if store is not None:
+        store._after_fork()
+
+
+class ModelSnapshot:
+    """
+    One loaded model artifact, never mutated after construction.
+    Request handlers grab a snapshot once and use it for the whole request,
+    so a reload swapping in a new one can never produce a torn read.
+    """
+
+    __slots__ = ('artifacts', 'encoder', 'boosters', 'engine', 'predictors', 'version', 'loaded_at')
+
+    def __init__(self, artifacts, version, engine='xgboost'):
+        if engine not in INFERENCE_ENGINES:
+            raise ValueError(f"Unknown inference engine: {engine}")
+        artifacts = dict(artifacts)
+        self.artifacts = MappingProxyType(artifacts)
+        self.encoder = FeatureEncoder.from_artifacts(artifacts)
+        self.boosters = tuple(_booster(artifacts[key]) for key, _ in MODEL_HEADS)
+        self.engine = engine
+        if engine == 'numpy':
+            self.predictors = tuple(
+                (b if isinstance(b, FlatTreeEnsemble) else FlatTreeEnsemble.from_booster(b)).predict
+                for b in self.boosters
+            )
+        elif any(isinstance(b, FlatTreeEnsemble) for b in self.boosters):
+            raise ValueError("Flat tree artifacts can only be served by the 'numpy' engine")
+        else:
+            self.predictors = tuple(b.inplace_predict for b in self.boosters)
+        self.version = version
+        self.loaded_at = time.time()
+
+    def __setattr__(self, name, value):
+        if hasattr(self, 'loaded_at'):
+            raise AttributeError('ModelSnapshot is immutable')
+        object.__setattr__(self, name, value)
+
+    def __getitem__(self, key):
+        return self.artifacts[key]
+
+    def get(self, key, default=None):
+        return self.artifacts.get(key, default)
+
+    def predict(self, rows):
+        """
+        Run the three heads on encoded rows (see FeatureEncoder.encode).
+        Returns (risk probability, price per ton, yield per ha) arrays.
+        """
+        X_cls, X_price, X_yield = self.encoder.scale_heads(rows)
+        rfc, lr_price, lr_yield = self.predictors
+        return rfc(X_cls), lr_price(X_price), lr_yield(X_yield)
+
+
+class ModelStore:
+    """
+    Holds the current ModelSnapshot for an artifact file and hot-swaps it.
+
+    refresh() stats the file and only re-hashes/re-loads it when the mtime or
+    size moved; a changed content hash produces a new snapshot that replaces
+    the old one in a single reference assignment. watch() runs refresh() on a
+    daemon thread so loading never happens on the request path.
+
+    The store is fork-safe: a child forked from a preloading server keeps the
+    parent's snapshot (and its shared pages) but gets a fresh lock and no
+    watcher, and starts its own on the next watch() call.
+    """
+
+    def __init__(self, path, loader=joblib.load, engine='xgboost'):
+        self.path = str(path)
+        self.loader = loader
+        self.engine = engine
+        self._snapshot = None
+        self._stat = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=functools.partial(_reset_after_fork, weakref.ref(self)))
+
+    def _after_fork(self):
+        # The parent's watcher thread does not exist here and its lock may have been held mid-fork
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def current(self):
+        """Latest snapshot (loads synchronously the first time), or None"""
+        snapshot = self._snapshot
+        if snapshot is None and self._stat is None:
+            self.refresh()
+            snapshot = self._snapshot
+        return snapshot
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    def refresh(self):
+        """Load the artifact if it changed on disk. Returns True when a new snapshot was swapped in"""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self._stat is None:
+                    print(f"Model file not found: {self.path}")
+                self._stat = ()
+                return False
+
+            stat_key = (st.st_mtime_ns, st.st_size)
+            if stat_key == self._stat:
+                return False
+            self._stat = stat_key
+
+            try:
+                version = file_version(self.path)
+                if self._snapshot is not None and version == self._snapshot.version:
+                    return False
+                snapshot = ModelSnapshot(self.loader(self.path), version, self.engine)
+            except Exception as e:
+                # Keep serving the previous snapshot; a half-written file is retried on the next change
+                print(f"Error loading model from {self.path}: {e}")
+                return False
+
+            self._snapshot = snapshot
+            print(f"Model {version} loaded from {self.path}")
+            return True
+
+    def publish(self, artifacts, version=None):
+        """Swap in artifacts that are already in memory (e.g. straight after training)"""
+        with self._lock:
+            if version is None:
+                version = file_version(self.path) if os.path.exists(self.path) else f"mem-{int(time.time())}"
+            try:
+                st = os.stat(self.path)
+                self._stat = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                pass
+            self._snapshot = ModelSnapshot(artifacts, version, self.engine)
+            return self._snapshot
+
+    def watch(self, interval=30.0):
+        """Start a daemon thread polling the artifact for changes every interval seconds"""
+        if interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.refresh()
+
+        self._watcher = threading.Thread(target=run, name='model-store-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,296 @@
+import glob
+import json
+import os
+import time
+from datetime import datetime
+import numpy as np
+from tree_ensemble import FlatTreeEnsemble
+
+GRID_META = 'grid.json'
+GRID_LOOKUP = 'cells'  # grid.json written by an older (interpolating) build_grid is ignored
+
+# Range covered for each continuous input; lookups outside it go to the live model
+GRID_RANGES = {
+    'planted_area': (0.5, 500.0),
+    'temperature_c': (0.0, 50.0),
+    'rainfall_mm': (0.0, 400.0),
+}
+AXIS_INPUTS = ('planted_area', 'temperature_c', 'rainfall_mm')
+
+# Cell edges per input: the split thresholds the trees use most often inside
+# the range. The models are step functions, so a cell bounded by splits holds
+# one value instead of interpolating across a jump.
+GRID_SPLITS = {'planted_area': 5, 'temperature_c': 6, 'rainfall_mm': 6}
+
+# Most a grid answer may differ from the model, per head: (absolute, relative).
+# Risk is a probability, so 0.01 is one percentage point.
+GRID_TOLERANCE = {'risk': (0.01, 0.0), 'price': (0.0, 0.02), 'yield': (0.01, 0.02)}
+
+# Random points checked against the model per region x soil x crop x month;
+# a combination that misses the tolerance at any of them is left to the model.
+# The check is statistical: about 1% of grid answers still miss the tolerance.
+GRID_CHECK_SAMPLES = 32
+
+# A grid answering fewer combinations than this is not written at all
+GRID_MIN_COVERAGE = 0.25
+
+
+def split_edges(snapshot, ranges=None, splits=None):
+    """
+    Cell edges per input: the range ends plus the most frequent split
+    thresholds (in raw units, over all three heads) strictly inside the range
+    """
+    ranges = ranges or GRID_RANGES
+    splits = GRID_SPLITS if splits is None else splits
+    encoder = snapshot.encoder
+    trees = [b if isinstance(b, FlatTreeEnsemble) else FlatTreeEnsemble.from_booster(b) for b in snapshot.boosters]
+    edges = {}
+    for name in AXIS_INPUTS:
+        col = encoder.feature_cols.index(name)
+        numeric = encoder.numerical_cols.index(name)
+        thresholds = []
+        for head, tree in enumerate(trees):
+            # Leaves point at themselves (see FlatTreeEnsemble); the rest are splits
+            is_split = (tree.left != np.arange(len(tree.left))) & (tree.feature == col)
+            scaled = tree.threshold[is_split].astype(np.float64)
+            thresholds.append(scaled * encoder.head_scale[head, numeric] + encoder.head_mean[head, numeric])
+        low, high = map(float, ranges[name])
+        values, counts = np.unique(np.round(np.concatenate(thresholds), 3), return_counts=True)
+        inside = (values > low) & (values < high)
+        values, counts = values[inside], counts[inside]
+        chosen = np.sort(values[np.argsort(-counts, kind='stable')[:splits[name]]])
+        edges[name] = (low, *map(float, chosen), high)
+    return edges
+
+
+def _cells(edges, values):
+    """Cell index of each value along one input (values must lie within the edges)"""
+    return np.minimum(np.searchsorted(edges, values, side='right') - 1, len(edges) - 2)
+
+
+def _within_tolerance(approx, exact, tolerance):
+    """(..., 3) grid answers vs model outputs -> (...) bool, all three heads inside tolerance"""
+    atol = np.array([tolerance[head][0] for head in ('risk', 'price', 'yield')])
+    rtol = np.array([tolerance[head][1] for head in ('risk', 'price', 'yield')])
+    return (np.abs(approx - exact) <= atol + rtol * np.abs(exact)).all(axis=-1)
+
+
+def build_grid(snapshot, directory, year=None, edges=None, crops=None, tolerance=None,
+               samples=GRID_CHECK_SAMPLES, min_coverage=GRID_MIN_COVERAGE, seed=0):
+    """
+    Evaluate the three heads of a ModelSnapshot over every
+    region x soil x crop x month, at the centre of each cell of edges
+    (default: split_edges).
+
+    Every combination is then checked at samples random points against the
+    model; those over tolerance (default GRID_TOLERANCE) are stored as NaN so
+    lookups fall back to the model. If less than min_coverage of them pass, no
+    grid is written and None is returned.
+
+    Otherwise writes a generation-stamped float32 .npy of shape
+    (regions+1, soils+1, crops, 12, areas, temps, rains, 3) and atomically
+    replaces grid.json, which names it; older generations are pruned like
+    export_native does. Returns grid.json's path.
+    """
+    encoder = snapshot.encoder
+    edges = {name: tuple(map(float, (edges or split_edges(snapshot))[name])) for name in AXIS_INPUTS}
+    tolerance = tolerance or GRID_TOLERANCE
+    year = int(year or datetime.now().year)
+    # Each category gets an extra last slot for 'none of them' (the drop_first baseline or unknown)
+    regions = list(encoder.region_index)
+    soils = list(encoder.soil_index)
+    crops = list(crops or encoder.known_crops())
+    axis_edges = [np.asarray(edges[name]) for name in AXIS_INPUTS]
+    centres = [(axis[:-1] + axis[1:]) / 2 for axis in axis_edges]
+
+    # One block of rows per (region, soil): every crop x month x cell combination
+    crop_col = np.array([encoder.crop_index[crop] for crop in crops])
+    c, m, a, t, r = np.meshgrid(np.arange(len(crops)), np.arange(1, 13), *centres, indexing='ij')
+    cell_shape = c.shape
+    block = np.zeros((c.size, encoder.n_features), dtype=np.float64)
+    block[:, encoder.input_index] = np.column_stack([m.ravel(), np.full(c.size, year), a.ravel(), t.ravel(), r.ravel()])
+    block[np.arange(c.size), crop_col[c.ravel()]] = 1.0
+
+    # And the random check points, samples per crop x month
+    rng = np.random.default_rng(seed)
+    check_c, check_m = np.meshgrid(np.arange(len(crops)), np.arange(12), indexing='ij')
+    check_c, check_m = np.repeat(check_c.ravel(), samples), np.repeat(check_m.ravel(), samples)
+    points = np.column_stack([rng.uniform(axis[0], axis[-1], check_c.size) for axis in axis_edges])
+    point_cells = [_cells(axis, points[:, k]) for k, axis in enumerate(axis_edges)]
+    check_block = np.zeros((check_c.size, encoder.n_features), dtype=np.float64)
+    check_block[:, encoder.input_index] = np.column_stack([check_m + 1, np.full(check_c.size, year), points])
+    check_block[np.arange(check_c.size), crop_col[check_c]] = 1.0
+
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%d%H%M%S') + f"-{os.getpid()}"
+    filename = f"grid.{stamp}.npy"
+    path = os.path.join(directory, filename)
+    shape = (len(regions) + 1, len(soils) + 1) + cell_shape + (3,)
+    values = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=shape)
+
+    started = time.perf_counter()
+    region_cols = [encoder.region_index[name] for name in regions] + [None]
+    soil_cols = [encoder.soil_index[name] for name in soils] + [None]
+    covered = 0
+    for i, region_col in enumerate(region_cols):
+        for j, soil_col in enumerate(soil_cols):
+            rows, check_rows = block.copy(), check_block.copy()
+            for one_hot in (region_col, soil_col):
+                if one_hot is not None:
+                    rows[:, one_hot] = 1.0
+                    check_rows[:, one_hot] = 1.0
+            cells = np.stack(snapshot.predict(rows), axis=-1).reshape(cell_shape + (3,))
+            exact = np.stack(snapshot.predict(check_rows), axis=-1)
+            ok = _within_tolerance(cells[(check_c, check_m, *point_cells)], exact, tolerance)
+            passed = ok.reshape(len(crops), 12, samples).all(axis=-1)
+            cells[~passed] = np.nan
+            covered += int(passed.sum())
+            values[i, j] = cells
+    values.flush()
+    del values
+
+    coverage = covered / (len(region_cols) * len(soil_cols) * len(crops) * 12)
+    print(f"--- [GRID] {np.prod(shape[:-1]):,} cells evaluated in {time.perf_counter() - started:.1f}s, "
+          f"{coverage:.0%} of combinations within tolerance ---")
+    if coverage < min_coverage:
+        os.remove(path)
+        print(f"--- [GRID] Coverage under {min_coverage:.0%}, grid not written; predictions use the model ---")
+        return None
+
+    meta = {
+        'file': filename,
+        'lookup': GRID_LOOKUP,
+        'model_version': snapshot.version,
+        'year': year,
+        'regions': regions,
+        'soils': soils,
+        'crops': crops,
+        'edges': edges,
+        'tolerance': tolerance,
+        'coverage': coverage,
+    }
+    meta_path = os.path.join(directory, GRID_META)
+    previous = set()
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            previous = {json.load(f).get('file')}
+
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+    keep = previous | {filename}
+    for old_path in glob.glob(os.path.join(directory, 'grid.*.npy')):
+        if os.path.basename(old_path) not in keep:
+            os.remove(old_path)
+    return meta_path
+
+
+class PredictionGrid:
+    """
+    Precomputed model outputs (see build_grid), memory-mapped read-only.
+    lookup() reads the one cell each input falls in, so a prediction is a
+    handful of page reads instead of three model calls.
+    """
+
+    def __init__(self, values, meta):
+        self.values = values
+        self.year = meta['year']
+        self.model_version = meta.get('model_version')
+        self.edges = tuple(np.asarray(meta['edges'][name], dtype=np.float64) for name in AXIS_INPUTS)
+        self.region_slot = {name: i for i, name in enumerate(meta['regions'])}
+        self.soil_slot = {name: i for i, name in enumerate(meta['soils'])}
+        self.crop_slot = {name: i for i, name in enumerate(meta['crops'])}
+
+    @staticmethod
+    def stamp(directory):
+        """Change marker of the grid in directory (grid.json's mtime), None if there is none"""
+        try:
+            return os.stat(os.path.join(directory, GRID_META)).st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def load(cls, directory, snapshot=None, samples=32):
+        """
+        Memory-map the grid in directory, or None if there is none.
+        With a snapshot, a grid stamped with another version is spot-checked
+        (see matches) and rejected if it disagrees, e.g. one left over from
+        before a retrain.
+        """
+        meta_path = os.path.join(directory, GRID_META)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('lookup') != GRID_LOOKUP:
+                print(f"Prediction grid in {directory} is from an older build_grid, ignoring it (rebuild it)")
+                return None
+            values = np.load(os.path.join(directory, meta['file']), mmap_mode='r')
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error loading prediction grid from {directory}: {e}")
+            return None
+
+        grid = cls(values, meta)
+        # Same version means the very pickle the grid was built from; anything else
+        # (a retrain, or the native export of it) is checked against the model
+        if snapshot is not None and grid.model_version != snapshot.version and not grid.matches(snapshot, samples):
+            print(f"Prediction grid in {directory} does not match model {snapshot.version}, ignoring it")
+            return None
+        return grid
+
+    def matches(self, snapshot, samples=32, seed=0):
+        """
+        Spot-check grid cells against the live model at their centres. The cells
+        come from a seeded generator, so a given grid and model always get the
+        same verdict, and they are predicted in one batch. Cells left to the
+        model (NaN) are skipped.
+        """
+        if not set(self.crop_slot) <= set(snapshot.encoder.known_crops()):
+            return False
+        rng = np.random.default_rng(seed)
+        regions, soils, crops = list(self.region_slot), list(self.soil_slot), list(self.crop_slot)
+        cells, blocks = [], []
+        for _ in range(samples):
+            i, j = int(rng.integers(len(regions) + 1)), int(rng.integers(len(soils) + 1))
+            c, month = int(rng.integers(len(crops))), int(rng.integers(1, 13))
+            ks = [int(rng.integers(len(edges) - 1)) for edges in self.edges]
+            region = regions[i] if i < len(regions) else None
+            soil = soils[j] if j < len(soils) else None
+            inputs = [float((edges[k] + edges[k + 1]) / 2) for edges, k in zip(self.edges, ks)]
+            # encode() reuses one buffer, so each row is copied out before stacking
+            blocks.append(snapshot.encoder.encode([crops[c]], region, soil, self.year, month, *inputs).copy())
+            cells.append((i, j, c, month - 1, *ks))
+        expected = np.stack(snapshot.predict(np.concatenate(blocks)), axis=-1)
+        stored = np.array([self.values[cell] for cell in cells])
+        answered = np.isfinite(stored).all(axis=-1)
+        if not answered.any():
+            return False
+        return bool(np.allclose(stored[answered], expected[answered], rtol=1e-4, atol=1e-4))
+
+    def lookup(self, crops, region, soil, year, month, area, temp, rain):
+        """
+        (risk, price per ton, yield) arrays for crops, or None when the inputs
+        fall outside the grid (or in a combination it leaves to the model) and
+        the live model has to answer
+        """
+        if year != self.year or not 1 <= month <= 12:
+            return None
+        try:
+            crop_slots = [self.crop_slot[crop] for crop in crops]
+        except KeyError:
+            return None
+
+        cells = []
+        for edges, value in zip(self.edges, (area, temp, rain)):
+            if not edges[0] <= value <= edges[-1]:
+                return None
+            cells.append(int(_cells(edges, value)))
+
+        i = self.region_slot.get(region, len(self.region_slot))
+        j = self.soil_slot.get(soil, len(self.soil_slot))
+        out = self.values[i, j, crop_slots, month - 1, cells[0], cells[1], cells[2]]
+        if np.isnan(out).any():
+            return None
+        return out[:, 0], out[:, 1], out[:, 2]
@@ -1,12 +1,18 @@
 import pandas as pd
 import joblib
 import os
+import sys
+import threading
+from model_store import ModelSnapshot, export_native, file_version
+from prediction_grid import build_grid
 # --- CHANGED: Import XGBoost instead of Sklearn models ---
 from xgboost import XGBClassifier, XGBRegressor 
 from sklearn.preprocessing import StandardScaler
 
 DATA_PATH = 'data/agri_dataset.csv'
 ARTIFACTS_PATH = 'models/agri_advisor_v5.pkl'
+NATIVE_ARTIFACTS_DIR = 'models/agri_advisor_v5'  # native XGBoost boosters + meta.json
+PREDICTION_GRID_DIR = 'models/agri_advisor_v5_grid'  # precomputed predictions (see prediction_grid.py)
 
 def train_pipeline():
     print(f"--- [TRAINER] Training on {DATA_PATH} ---")
@@ -97,9 +103,41 @@ def train_pipeline():
     }
     
     os.makedirs('models', exist_ok=True)
-    joblib.dump(artifacts, ARTIFACTS_PATH)
+    # Write to a temp file and rename so running services never load a half-written artifact
+    tmp_path = f"{ARTIFACTS_PATH}.tmp"
+    joblib.dump(artifacts, tmp_path)
+    os.replace(tmp_path, ARTIFACTS_PATH)
+    
+    # Same models in XGBoost's native format (faster to load, not tied to pickle versions)
+    export_native(artifacts, NATIVE_ARTIFACTS_DIR)
     print("--- [TRAINER] Success. XGBoost Models Saved. ---")
+    # The prediction grid takes about a minute, so callers rebuild it separately (rebuild_grid);
+    # until then serving rejects the old grid and predicts with the model
     return artifacts
 
+_grid_lock = threading.Lock()
+
+def rebuild_grid(artifacts=None):
+    """Rebuild the prediction grid for the model saved at ARTIFACTS_PATH; errors are reported, not raised"""
+    with _grid_lock:
+        try:
+            if artifacts is None:
+                artifacts = joblib.load(ARTIFACTS_PATH)
+            meta_path = build_grid(ModelSnapshot(artifacts, file_version(ARTIFACTS_PATH)), PREDICTION_GRID_DIR)
+        except Exception as e:
+            print(f"--- [TRAINER] Prediction grid not rebuilt: {e} ---")
+            return None
+        if meta_path:
+            print(f"--- [TRAINER] Prediction grid written to {PREDICTION_GRID_DIR} ---")
+        return meta_path
+
 if __name__ == "__main__":
-    train_pipeline()
\ No newline at end of file
+    if '--export-native' in sys.argv:
+        # Convert the existing pickle without retraining
+        export_native(joblib.load(ARTIFACTS_PATH), NATIVE_ARTIFACTS_DIR)
+        print(f"--- [TRAINER] Native artifacts written to {NATIVE_ARTIFACTS_DIR} ---")
+    elif '--build-grid' in sys.argv:
+        # Rebuild the prediction grid for the existing pickle without retraining
+        rebuild_grid()
+    else:
+        rebuild_grid(train_pipeline())
\ No newline at end of file
@@ -0,0 +1,154 @@
+import json
+import numpy as np
+
+# Objectives whose raw margin goes through a sigmoid (everything else is used as-is)
+LOGISTIC_OBJECTIVES = ('binary:logistic', 'reg:logistic')
+
+
+def _parse_base_score(value):
+    # XGBoost >= 2 stores it as a vector string, e.g. '[2.49975E-1]'
+    return float(str(value).strip('[]').split(',')[0])
+
+
+class FlatTreeEnsemble:
+    """
+    A trained XGBoost gbtree flattened into contiguous NumPy arrays.
+
+    All trees share one node table (feature, threshold, left, right,
+    default-left, leaf value); every row walks every tree at once, one depth
+    level per step, so a prediction is ~max_depth vectorized gathers instead
+    of a DMatrix round-trip. Only numerical splits on a single-target model
+    are supported, which is what train_pipeline produces.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots,
+                 base_margin, logistic, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.base_margin = base_margin
+        self.logistic = logistic
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_booster(cls, booster):
+        model = json.loads(booster.save_raw('json'))
+        learner = model['learner']
+        gbtree = learner['gradient_booster']
+        if gbtree['name'] != 'gbtree':
+            raise ValueError(f"Unsupported booster type: {gbtree['name']}")
+
+        features, thresholds, lefts, rights, defaults, roots = [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for tree in gbtree['model']['trees']:
+            if any(tree.get('split_type', [])):
+                raise ValueError("Categorical splits are not supported")
+            left = np.asarray(tree['left_children'], dtype=np.int32)
+            right = np.asarray(tree['right_children'], dtype=np.int32)
+            is_leaf = left == -1
+
+            # Leaves point at themselves so extra traversal steps are no-ops
+            own = np.arange(len(left), dtype=np.int32)
+            lefts.append(np.where(is_leaf, own, left) + offset)
+            rights.append(np.where(is_leaf, own, right) + offset)
+            features.append(np.where(is_leaf, 0, tree['split_indices']).astype(np.int32))
+            # For leaves split_conditions holds the leaf value
+            thresholds.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+            defaults.append(np.asarray(tree['default_left'], dtype=bool))
+            roots.append(offset)
+            max_depth = max(max_depth, cls._depth(left, right))
+            offset += len(left)
+
+        threshold = np.concatenate(thresholds)
+        left = np.concatenate(lefts)
+        is_leaf = left == np.arange(len(left), dtype=np.int32)
+
+        objective = learner['objective']['name']
+        base_score = _parse_base_score(learner['learner_model_param']['base_score'])
+        logistic = objective in LOGISTIC_OBJECTIVES
+        base_margin = float(np.log(base_score / (1.0 - base_score))) if logistic else base_score
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=threshold,
+            left=left,
+            right=np.concatenate(rights),
+            default_left=np.concatenate(defaults),
+            value=np.where(is_leaf, threshold, 0.0).astype(np.float32),
+            roots=np.asarray(roots, dtype=np.int32),
+            base_margin=base_margin,
+            logistic=logistic,
+            max_depth=max_depth,
+        )
+
+    def save(self, path):
+        """
+        Write the node table as one (6, n_nodes) int32 .npy (float columns stored
+        bit-for-bit) that load() can memory-map; returns the scalar fields, which
+        belong in a JSON sidecar
+        """
+        nodes = np.stack([
+            self.feature, self.threshold.view(np.int32), self.left, self.right,
+            self.default_left.astype(np.int32), self.value.view(np.int32),
+        ])
+        np.save(path, nodes)
+        return {
+            'roots': self.roots.tolist(),
+            'base_margin': self.base_margin,
+            'logistic': self.logistic,
+            'max_depth': self.max_depth,
+        }
+
+    @classmethod
+    def load(cls, path, params, mmap_mode='r'):
+        """
+        Inverse of save(). With mmap_mode the node arrays are read-only views of
+        the file, so every process serving the same model shares one copy of its pages
+        """
+        # Plain ndarray view of the mapping: np.memmap's subclass hooks would run on every gather
+        nodes = np.asarray(np.load(path, mmap_mode=mmap_mode))
+        return cls(
+            feature=nodes[0],
+            threshold=nodes[1].view(np.float32),
+            left=nodes[2],
+            right=nodes[3],
+            default_left=nodes[4],
+            value=nodes[5].view(np.float32),
+            roots=np.asarray(params['roots'], dtype=np.int32),
+            base_margin=params['base_margin'],
+            logistic=params['logistic'],
+            max_depth=params['max_depth'],
+        )
+
+    @staticmethod
+    def _depth(left, right):
+        depth, level = 0, [0]
+        while level:
+            level = [child for node in level for child in (left[node], right[node]) if child != -1]
+            depth += 1 if level else 0
+        return depth
+
+    def predict(self, X):
+        """Same output as Booster.inplace_predict: probabilities for logistic objectives, raw values otherwise"""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(x), self.default_left[nodes], x < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        # Accumulate base margin + leaves tree by tree in float32 like XGBoost does;
+        # cumsum is sequential (unlike sum's pairwise reduction), so this matches its rounding
+        leaves = np.empty((X.shape[0], len(self.roots) + 1), dtype=np.float32)
+        leaves[:, 0] = self.base_margin
+        leaves[:, 1:] = self.value[nodes]
+        margin = np.cumsum(leaves, axis=1, dtype=np.float32)[:, -1]
+        if self.logistic:
+            return 1.0 / (1.0 + np.exp(-margin))
+        return margin
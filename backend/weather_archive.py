@@ -0,0 +1,133 @@
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from http_client import get_http_client
+
+ARCHIVE_URL = 'https://archive-api.open-meteo.com/v1/archive'
+
+# Shared by the FastAPI WeatherService and the API's backfill_weather_archive command
+WEATHER_ARCHIVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'weather_archive.sqlite3')
+
+# Open-Meteo's archive lags a few days behind; a month counts as complete (and
+# is cached for good) once it ended this long ago
+ARCHIVE_DELAY_DAYS = 7
+
+
+def month_end(year, month):
+    if month == 12:
+        return datetime.date(year, 12, 31)
+    return datetime.date(year, month + 1, 1) - datetime.timedelta(days=1)
+
+
+def fetch_monthly_archive(lat, lon, first, last, timeout=5):
+    """
+    Monthly (mean temperature, rainfall total) from Open-Meteo's daily archive,
+    for every month from first to last ((year, month) pairs, inclusive), in one
+    call. Returns {(year, month): (temperature, rainfall)}; months without
+    temperature data are left out, and a failed call gives {}.
+    """
+    params = {
+        'latitude': lat, 'longitude': lon,
+        'start_date': datetime.date(first[0], first[1], 1).isoformat(),
+        'end_date': month_end(*last).isoformat(),
+        'daily': ['temperature_2m_mean', 'rain_sum'], 'timezone': 'auto'
+    }
+    try:
+        data = get_http_client().get(ARCHIVE_URL, params=params, timeout=timeout).json()
+        daily = data['daily']
+    except Exception:
+        return {}
+
+    temps, rains = {}, {}
+    for day, temp, rain in zip(daily['time'], daily['temperature_2m_mean'], daily['rain_sum']):
+        key = (int(day[:4]), int(day[5:7]))
+        if temp is not None:
+            temps.setdefault(key, []).append(temp)
+        if rain is not None:
+            rains.setdefault(key, []).append(rain)
+    return {
+        key: (round(sum(month_temps) / len(month_temps), 2), round(sum(rains.get(key, [])), 2))
+        for key, month_temps in temps.items()
+    }
+
+
+class MonthlyArchiveCache:
+    """
+    Persistent SQLite cache of monthly archive summaries, keyed by coordinates
+    rounded to ROUND_DIGITS (about 1 km) and the month. Complete months never
+    expire; the current month (and any month still inside ARCHIVE_DELAY_DAYS)
+    is refetched after recent_ttl_seconds.
+    """
+    ROUND_DIGITS = 2
+
+    def __init__(self, path=WEATHER_ARCHIVE_PATH, recent_ttl_seconds=6 * 60 * 60):
+        self.path = path
+        self.recent_ttl_seconds = recent_ttl_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS monthly_weather ('
+            ' lat REAL NOT NULL, lon REAL NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL,'
+            ' temperature REAL NOT NULL, rainfall REAL NOT NULL, fetched_at REAL NOT NULL,'
+            ' complete INTEGER NOT NULL, PRIMARY KEY (lat, lon, year, month))'
+        )
+
+    def _connection(self):
+        # One connection per thread; the pid check drops connections inherited through fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')  # readers never wait on the backfill
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _key(self, lat, lon):
+        return round(float(lat), self.ROUND_DIGITS), round(float(lon), self.ROUND_DIGITS)
+
+    @staticmethod
+    def is_complete(year, month, today=None):
+        today = today or datetime.date.today()
+        return month_end(year, month) + datetime.timedelta(days=ARCHIVE_DELAY_DAYS) < today
+
+    def get(self, lat, lon, year, month):
+        """(temperature, rainfall) for the month, or None if it isn't cached (or is stale)"""
+        row = self._connection().execute(
+            'SELECT temperature, rainfall, fetched_at, complete FROM monthly_weather'
+            ' WHERE lat = ? AND lon = ? AND year = ? AND month = ?',
+            (*self._key(lat, lon), year, month)
+        ).fetchone()
+        if row is None:
+            return None
+        temperature, rainfall, fetched_at, complete = row
+        if not complete and time.time() - fetched_at > self.recent_ttl_seconds:
+            return None
+        return temperature, rainfall
+
+    def cached_months(self, lat, lon):
+        """The complete months cached for these coordinates, as a set of (year, month)"""
+        rows = self._connection().execute(
+            'SELECT year, month FROM monthly_weather WHERE lat = ? AND lon = ? AND complete = 1',
+            self._key(lat, lon)
+        )
+        return set(rows)
+
+    def put_many(self, lat, lon, months):
+        """Store {(year, month): (temperature, rainfall)} for these coordinates, in one transaction"""
+        if not months:
+            return
+        lat, lon = self._key(lat, lon)
+        now = time.time()
+        today = datetime.date.today()
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT OR REPLACE INTO monthly_weather VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (lat, lon, year, month, temperature, rainfall, now, int(self.is_complete(year, month, today)))
+                    for (year, month), (temperature, rainfall) in months.items()
+                ]
+            )
@@ -1,9 +1,11 @@
-import requests
+from geocoding import GEOCODE_CACHE_PATH, GeocodeCache
+from weather_archive import WEATHER_ARCHIVE_PATH, MonthlyArchiveCache, fetch_monthly_archive
 import pandas as pd
 import datetime
 
 class WeatherService:
-    def __init__(self, dataset_path: str):
+    def __init__(self, dataset_path: str, geocode_cache_path: str = GEOCODE_CACHE_PATH,
+                 archive_path: str = WEATHER_ARCHIVE_PATH):
         try:
             self.df = pd.read_csv(dataset_path)
             # Create a lookup for historical averages (Climatology)
@@ -13,47 +15,24 @@ class WeatherService:
             self.climatology = {}
             print("   [Weather] Warning: Dataset not found. Relying on API/Defaults.")
         
-        self.coord_cache = {} 
+        # Persistent, so regions are geocoded once rather than on every cold start
+        self.coord_cache = GeocodeCache(geocode_cache_path)
+        self.archive = MonthlyArchiveCache(archive_path)
 
     def _get_coordinates(self, region_name: str):
-        if region_name in self.coord_cache:
-            return self.coord_cache[region_name]
-        try:
-            url = "https://geocoding-api.open-meteo.com/v1/search"
-            params = {"name": region_name, "count": 1, "language": "en", "format": "json"}
-            r = requests.get(url, params=params, timeout=3)
-            data = r.json()
-            if "results" in data and data["results"]:
-                res = data["results"][0]
-                coords = {'lat': res['latitude'], 'lon': res['longitude']}
-                self.coord_cache[region_name] = coords
-                return coords
-        except:
-            pass
-        return None
+        coords = self.coord_cache.get(region_name)
+        if coords is None:
+            return None
+        return {'lat': coords[0], 'lon': coords[1]}
 
     def _fetch_history(self, coords, year, month):
-        start = f"{year}-{month:02d}-01"
-        # Logic for end of month
-        if month == 12: end = f"{year}-12-31"
-        else: end = str(datetime.date(year, month + 1, 1) - datetime.timedelta(days=1))
-
-        url = "https://archive-api.open-meteo.com/v1/archive"
-        params = {
-            "latitude": coords['lat'], "longitude": coords['lon'],
-            "start_date": start, "end_date": end,
-            "daily": ["temperature_2m_mean", "rain_sum"], "timezone": "auto"
-        }
-        try:
-            r = requests.get(url, params=params, timeout=5)
-            data = r.json()
-            if 'daily' in data:
-                temps = [t for t in data['daily']['temperature_2m_mean'] if t is not None]
-                rains = [r for r in data['daily']['rain_sum'] if r is not None]
-                if temps: return round(sum(temps)/len(temps), 2), round(sum(rains), 2)
-        except:
-            pass
-        return None
+        # Past months never change: served from the on-disk archive cache once fetched
+        cached = self.archive.get(coords['lat'], coords['lon'], year, month)
+        if cached is not None:
+            return cached
+        months = fetch_monthly_archive(coords['lat'], coords['lon'], (year, month), (year, month))
+        self.archive.put_many(coords['lat'], coords['lon'], months)
+        return months.get((year, month))
 
     def get_weather(self, region: str, year: int, month: int):
         today = datetime.date.today()